@@ -0,0 +1,142 @@
+# collision_grid.py
+import hashlib
+import os
+import struct
+
+# Header of the bit-packed collision file: magic, format version, width, height (little endian)
+PACKED_FILE_MAGIC = b"CNCG"
+PACKED_FILE_VERSION = 1
+PACKED_HEADER = struct.Struct("<4sHII")
+
+# byte -> 0 if the byte is 0 (walkable) else 1 (wall)
+NORMALIZE_TABLE = bytes([0] + [1] * 255)
+# Per bit position k: 0/1 byte -> that bit set in the packed byte, and the reverse
+_BIT_TO_PACKED_TABLES = [bytes([(1 << k) if value else 0 for value in range(256)]) for k in range(8)]
+_PACKED_TO_BIT_TABLES = [bytes([(value >> k) & 1 for value in range(256)]) for k in range(8)]
+
+class CollisionGrid:
+    """
+    Walkability grid stored as one byte per tile in a flat bytearray, row by row
+    (cell (x, y) lives at index y * width + x). 0 means walkable, anything else is a wall.
+    An empty grid (0x0) treats every tile as a wall, like a missing collision layer.
+    """
+    def __init__(self, width=0, height=0, cells=None):
+        self.width = width
+        self.height = height
+        if cells is None:
+            cells = bytearray(width * height)
+        if len(cells) != width * height:
+            raise ValueError(f"Collision grid data has {len(cells)} cells, expected {width}x{height}.")
+        self.cells = cells
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Builds a grid from the nested-list form stored in map_meta.json ("collision_grid_data")."""
+        if not rows:
+            return cls()
+        width = len(rows[0])
+        cells = bytearray()
+        for row in rows:
+            if len(row) != width:
+                raise ValueError("Collision grid rows have different lengths.")
+            cells.extend(1 if value else 0 for value in row)
+        return cls(width, len(rows), cells)
+
+    @classmethod
+    def from_metadata(cls, metadata, tile_directory):
+        """
+        Returns the grid described by map_meta.json. "collision_grid_data" (the nested lists)
+        is the source of truth; the bit-packed file named by "collision_grid_file" (written by
+        tiled_importer.py) is only used when the lists are missing or it has the same size and
+        content hash, so a hand-edited map_meta.json is never silently overridden.
+        """
+        rows_grid = cls.from_rows(metadata.get("collision_grid_data") or [])
+        collision_file = metadata.get("collision_grid_file")
+        if not collision_file:
+            return rows_grid
+        collision_path = os.path.join(tile_directory, collision_file)
+        try:
+            packed_grid = cls.load_packed(collision_path)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not load packed collision grid '{collision_path}': {e}. Using 'collision_grid_data'.")
+            return rows_grid
+        if rows_grid and ((packed_grid.width, packed_grid.height) != (rows_grid.width, rows_grid.height) or
+                          packed_grid.content_hash() != rows_grid.content_hash()):
+            print(f"Warning: '{collision_path}' does not match 'collision_grid_data' (was map_meta.json edited?). "
+                  f"Using 'collision_grid_data'; re-run tiled_importer.py to rewrite the packed file.")
+            return rows_grid
+        return packed_grid
+
+    def to_rows(self):
+        """Returns the grid as a list of lists of 0/1 ints (the JSON interchange form)."""
+        return [list(self.cells[y * self.width:(y + 1) * self.width]) for y in range(self.height)]
+
+    def __bool__(self):
+        return self.width > 0 and self.height > 0
+
+    def is_walkable(self, tile_x_idx, tile_y_idx):
+        """Single lookup; out-of-bounds tiles are not walkable."""
+        if 0 <= tile_x_idx < self.width and 0 <= tile_y_idx < self.height:
+            return self.cells[tile_y_idx * self.width + tile_x_idx] == 0
+        return False
+
+    def walkable_many(self, coords):
+        """Batched lookup: returns a list of booleans for an iterable of (tile_x, tile_y) pairs."""
+        width, height, cells = self.width, self.height, self.cells
+        return [0 <= x < width and 0 <= y < height and cells[y * width + x] == 0 for x, y in coords]
+
+    def set_walkable(self, tile_x_idx, tile_y_idx, walkable):
+        """Sets one cell. Returns False if the coordinates are outside the grid."""
+        if 0 <= tile_x_idx < self.width and 0 <= tile_y_idx < self.height:
+            self.cells[tile_y_idx * self.width + tile_x_idx] = 0 if walkable else 1
+            return True
+        return False
+
+    def content_hash(self):
+        """SHA-1 hex digest of the grid size and walls; keys caches derived from the grid."""
+        digest = hashlib.sha1(struct.pack("<II", self.width, self.height))
+        digest.update(self.cells.translate(NORMALIZE_TABLE))
+        return digest.hexdigest()
+
+    def to_packed_bytes(self):
+        """Packs the grid to one bit per cell (LSB first, row-major), 1 = wall."""
+        normalized = self.cells.translate(NORMALIZE_TABLE)
+        normalized += bytes(-len(normalized) % 8) # Pad to whole bytes
+        packed_length = len(normalized) // 8
+        packed_value = 0
+        # Bit k of packed byte i is cell 8*i + k. Each bit plane is shifted into place with a
+        # lookup table, and the planes never overlap, so OR-ing them as integers packs the grid.
+        for k in range(8):
+            plane = normalized[k::8].translate(_BIT_TO_PACKED_TABLES[k])
+            packed_value |= int.from_bytes(plane, "little")
+        return packed_value.to_bytes(packed_length, "little")
+
+    @classmethod
+    def from_packed_bytes(cls, width, height, packed):
+        """Inverse of to_packed_bytes."""
+        cell_count = width * height
+        if len(packed) * 8 < cell_count:
+            raise ValueError(f"Packed collision data is too short for a {width}x{height} grid.")
+        cells = bytearray(len(packed) * 8)
+        for k in range(8):
+            cells[k::8] = packed.translate(_PACKED_TO_BIT_TABLES[k])
+        del cells[cell_count:]
+        return cls(width, height, cells)
+
+    def save_packed(self, path):
+        """Writes the grid as a small header followed by the bit-packed cells."""
+        with open(path, 'wb') as f:
+            f.write(PACKED_HEADER.pack(PACKED_FILE_MAGIC, PACKED_FILE_VERSION, self.width, self.height))
+            f.write(self.to_packed_bytes())
+
+    @classmethod
+    def load_packed(cls, path):
+        """Reads a file written by save_packed. Raises ValueError if it isn't one."""
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < PACKED_HEADER.size:
+            raise ValueError(f"Collision file '{path}' is truncated.")
+        magic, version, width, height = PACKED_HEADER.unpack_from(data)
+        if magic != PACKED_FILE_MAGIC or version != PACKED_FILE_VERSION:
+            raise ValueError(f"'{path}' is not a version {PACKED_FILE_VERSION} collision grid file.")
+        return cls.from_packed_bytes(width, height, data[PACKED_HEADER.size:])
@@ -1,13 +1,304 @@
 # convert_map_to_tiles.py
 from PIL import Image
 import os
+import sys
 import json
+import math
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 
-def slice_map_into_visual_tiles(map_image_path, tile_width, tile_height, output_dir="tiles", meta_file_name="map_meta.json"):
+from collision_grid import CollisionGrid
+from map_binary import MAP_BINARY_FILENAME, MIN_ZOOM_LEVEL, save_map_binary
+
+# Largest atlas image side in pixels when tiles are packed into atlases (output_format="atlas").
+# 2048 keeps each atlas page within the texture limits of the kiosk GPUs.
+ATLAS_MAX_SIDE = 2048
+
+# Written next to map_meta.json: a hash of every tile's pixels, so an incremental run can
+# rewrite only the tiles whose content changed, plus the changed/removed names of that run.
+TILE_MANIFEST_FILENAME = "tile_manifest.json"
+TILE_MANIFEST_VERSION = 1
+MAX_CHANGED_TILES_PRINTED = 20
+
+def tile_content_hash(tile_crop_pil):
+    """SHA-1 of a tile's mode, size, palette and raw pixel data (independent of PNG encoding)."""
+    digest = hashlib.sha1(f"{tile_crop_pil.mode} {tile_crop_pil.size[0]}x{tile_crop_pil.size[1]}".encode("ascii"))
+    if tile_crop_pil.mode in ("P", "PA"):
+        digest.update(bytes(tile_crop_pil.getpalette() or []))
+    digest.update(tile_crop_pil.tobytes())
+    return digest.hexdigest()
+
+class TileManifest:
+    """
+    Tile name -> content hash for the tiles of the previous run (previous) and of this run
+    (hashes), and the names this run actually wrote (written). With incremental set, tiles
+    whose hash matches the previous run and whose file still exists are not re-encoded.
+    """
+    def __init__(self, previous=None, incremental=False):
+        self.previous = previous or {}
+        self.incremental = incremental
+        self.hashes = {}
+        self.written = []
+
+    @classmethod
+    def load(cls, path, incremental=False):
+        """Reads the manifest of the previous run; an empty one if it is missing or unreadable."""
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            if data.get("version") == TILE_MANIFEST_VERSION:
+                return cls(data.get("tiles", {}), incremental)
+            print(f"Warning: '{path}' has an unknown version. All tiles will be rewritten.")
+        except FileNotFoundError:
+            pass
+        except (IOError, json.JSONDecodeError, AttributeError) as e:
+            print(f"Warning: Could not read tile manifest '{path}': {e}. All tiles will be rewritten.")
+        return cls(None, incremental)
+
+    def record(self, tile_filename, digest, written):
+        self.hashes[tile_filename] = digest
+        if written:
+            self.written.append(tile_filename)
+
+    def changed_tiles(self):
+        """Names of tiles that are new or whose content differs from the previous run, plus any rewritten."""
+        written = set(self.written)
+        return sorted(name for name, digest in self.hashes.items()
+                      if name in written or self.previous.get(name) != digest)
+
+    def removed_tiles(self):
+        """Names of tiles from the previous run that this run no longer produces."""
+        return sorted(name for name in self.previous if name not in self.hashes)
+
+    def save(self, path):
+        data = {
+            "version": TILE_MANIFEST_VERSION,
+            "tiles": self.hashes,
+            "changed_tiles": self.changed_tiles(), # Of the run that wrote this manifest
+            "removed_tiles": self.removed_tiles()
+        }
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=4, sort_keys=True)
+
+def save_tile(tile_crop_pil, tile_filename, output_dir, atlas_tiles=None):
+    """
+    Saves one tile as its own PNG, or, when atlas_tiles is a list, queues it for
+    pack_tiles_into_atlases instead. Returns the tile's name, or None if saving failed.
+    """
+    if atlas_tiles is not None:
+        atlas_tiles.append((tile_filename, tile_crop_pil))
+        return tile_filename
+
+    tile_path = os.path.join(output_dir, tile_filename)
+    try:
+        tile_crop_pil.save(tile_path, "PNG")
+    except Exception as e:
+        print(f"Error saving tile {tile_path}: {e}")
+        return None
+    return tile_filename
+
+def save_tile_strip(strip_image, y_idx, columns, tile_width, tile_height, filename_prefix, output_dir, atlas_tiles=None):
+    """
+    Slices the tiles at the given columns out of strip_image (an image exactly one tile row
+    tall) and saves them through save_tile as f"{filename_prefix}{y_idx}_{x_idx}.png".
+    Returns their names in the same order, None for a tile that failed. Runs in worker
+    processes in parallel mode.
+    """
+    saved_filenames = []
+    for x_idx in columns:
+        left = x_idx * tile_width
+        tile_crop_pil = strip_image.crop((left, 0, left + tile_width, tile_height))
+        tile_filename = f"{filename_prefix}{y_idx}_{x_idx}.png"
+        saved_filenames.append(save_tile(tile_crop_pil, tile_filename, output_dir, atlas_tiles))
+    return saved_filenames
+
+def save_tile_grid(image, grid_width_tiles, grid_height_tiles, tile_width, tile_height, filename_prefix, output_dir,
+                   atlas_tiles=None, executor=None, manifest=None, unique_tiles=None):
+    """
+    Slices image into a grid_width_tiles x grid_height_tiles grid of tiles, one row strip at
+    a time, and returns the grid of tile names.
+    Every tile is hashed first. With unique_tiles (a dict of content hash -> tile name,
+    shared between calls), a tile identical to one already saved reuses that name instead of
+    being written again. With an incremental manifest (a TileManifest), a tile whose hash
+    and file are unchanged since the last run is not re-encoded either.
+    The remaining tiles are saved per strip; with a process pool executor (and no atlas)
+    each strip goes to a worker and the results are assembled in row order, so the output
+    is the same as a serial run.
+    """
+    strips = [image.crop((0, y_idx * tile_height, grid_width_tiles * tile_width, (y_idx + 1) * tile_height))
+              for y_idx in range(grid_height_tiles)]
+    filenames_grid = []
+    write_columns = [] # Per row: the columns whose tiles must be encoded
+    new_tiles = [] # (name, hash, written) of the tiles saved under their own name
+    for y_idx, strip in enumerate(strips):
+        row_filenames = []
+        row_write_columns = []
+        for x_idx in range(grid_width_tiles):
+            left = x_idx * tile_width
+            digest = tile_content_hash(strip.crop((left, 0, left + tile_width, tile_height)))
+            if unique_tiles is not None and digest in unique_tiles:
+                row_filenames.append(unique_tiles[digest]) # Duplicate: share the first copy
+                continue
+            tile_filename = f"{filename_prefix}{y_idx}_{x_idx}.png"
+            if unique_tiles is not None:
+                unique_tiles[digest] = tile_filename
+            unchanged = atlas_tiles is None and manifest is not None and manifest.incremental and \
+                        manifest.previous.get(tile_filename) == digest and \
+                        os.path.exists(os.path.join(output_dir, tile_filename))
+            if not unchanged:
+                row_write_columns.append(x_idx)
+            row_filenames.append(tile_filename)
+            new_tiles.append((tile_filename, digest, not unchanged))
+        filenames_grid.append(row_filenames)
+        write_columns.append(row_write_columns)
+
+    if executor is None or atlas_tiles is not None:
+        saved_rows = [save_tile_strip(strip, y_idx, write_columns[y_idx], tile_width, tile_height, filename_prefix,
+                                      output_dir, atlas_tiles)
+                      for y_idx, strip in enumerate(strips)]
+    else:
+        count = len(strips)
+        saved_rows = list(executor.map(save_tile_strip, strips, range(count), write_columns, [tile_width] * count,
+                                       [tile_height] * count, [filename_prefix] * count, [output_dir] * count))
+
+    failed = set()
+    for y_idx, saved_filenames in enumerate(saved_rows):
+        for x_idx, saved_filename in zip(write_columns[y_idx], saved_filenames):
+            if saved_filename is None:
+                failed.add(f"{filename_prefix}{y_idx}_{x_idx}.png")
+    for tile_filename, digest, written in new_tiles:
+        if tile_filename in failed:
+            if unique_tiles is not None:
+                del unique_tiles[digest]
+        elif manifest is not None:
+            manifest.record(tile_filename, digest, written)
+    if failed:
+        # None is kept as a placeholder for a failed tile (and every duplicate of it)
+        filenames_grid = [[None if name in failed else name for name in row] for row in filenames_grid]
+    return filenames_grid
+
+def tile_id_grid(filenames_grid, tile_files, tile_ids):
+    """
+    Converts a grid of tile names into a grid of indices into tile_files, appending names
+    not seen yet (tile_ids maps name -> index). Failed tiles (None) stay None.
+    """
+    id_grid = []
+    for row in filenames_grid:
+        id_row = []
+        for tile_filename in row:
+            if tile_filename is not None and tile_filename not in tile_ids:
+                tile_ids[tile_filename] = len(tile_files)
+                tile_files.append(tile_filename)
+            id_row.append(None if tile_filename is None else tile_ids[tile_filename])
+        id_grid.append(id_row)
+    return id_grid
+
+def pack_tiles_into_atlases(atlas_tiles, tile_width, tile_height, output_dir):
+    """
+    Packs the queued (tile_name, image) pairs row by row into as few atlas images as fit in
+    ATLAS_MAX_SIDE x ATLAS_MAX_SIDE. Returns (atlas_filenames, atlas_index), where atlas_index
+    maps each tile name to [atlas_number, x, y, width, height].
+    """
+    tiles_per_row = max(1, ATLAS_MAX_SIDE // tile_width)
+    rows_per_atlas = max(1, ATLAS_MAX_SIDE // tile_height)
+    tiles_per_atlas = tiles_per_row * rows_per_atlas
+
+    atlas_filenames = []
+    atlas_index = {}
+    for atlas_number, first_tile in enumerate(range(0, len(atlas_tiles), tiles_per_atlas)):
+        page_tiles = atlas_tiles[first_tile:first_tile + tiles_per_atlas]
+        used_rows = (len(page_tiles) + tiles_per_row - 1) // tiles_per_row
+        used_cols = min(len(page_tiles), tiles_per_row)
+        atlas_image = Image.new("RGBA", (used_cols * tile_width, used_rows * tile_height), (0, 0, 0, 0))
+
+        for slot, (tile_name, tile_image) in enumerate(page_tiles):
+            x = (slot % tiles_per_row) * tile_width
+            y = (slot // tiles_per_row) * tile_height
+            atlas_image.paste(tile_image.convert("RGBA"), (x, y))
+            atlas_index[tile_name] = [atlas_number, x, y, tile_width, tile_height]
+
+        atlas_filename = f"tile_atlas_{atlas_number}.png"
+        atlas_path = os.path.join(output_dir, atlas_filename)
+        try:
+            atlas_image.save(atlas_path, "PNG")
+        except Exception as e:
+            print(f"Error saving atlas {atlas_path}: {e}")
+            return None, None
+        atlas_filenames.append(atlas_filename)
+        print(f"Saved atlas {atlas_filename} with {len(page_tiles)} tiles")
+    return atlas_filenames, atlas_index
+
+def build_pyramid_levels(map_image_pil, tile_width, tile_height, grid_width_tiles, grid_height_tiles, output_dir, num_levels=None,
+                         atlas_tiles=None, executor=None, manifest=None, unique_tiles=None):
+    """
+    Generates downscaled copies of the tiled map area (1/2, 1/4, 1/8 ...) and slices each
+    one into tiles of the same pixel size as the full-resolution tiles.
+    With num_levels=None, levels are added until the whole map fits in a single tile or the
+    next level would be coarser than MIN_ZOOM_LEVEL (Map can't zoom out far enough to use it).
+    Tiles are written through save_tile, so passing atlas_tiles queues them for the atlas.
+    With a process pool executor the tiles are encoded in parallel, and with unique_tiles
+    duplicates of already saved tiles are shared (see save_tile_grid).
+    Returns the list of level descriptions to store under "pyramid_levels" in the metadata.
+    """
+    # Only the area covered by full-resolution tiles is part of the map
+    base_image = map_image_pil.crop((0, 0, grid_width_tiles * tile_width, grid_height_tiles * tile_height))
+    # RGBA so that the partial tiles along the right/bottom edge are padded with transparency
+    base_image = base_image.convert("RGBA")
+
+    levels = []
+    level = 1
+    while True:
+        if num_levels is not None and level > num_levels:
+            break
+        if num_levels is None and (1.0 / 2 ** level < MIN_ZOOM_LEVEL - 1e-9 or (levels and
+           levels[-1]["grid_width_in_tiles"] <= 1 and levels[-1]["grid_height_in_tiles"] <= 1)):
+            break
+
+        downscale = 2 ** level
+        level_w = max(1, math.ceil(base_image.width / downscale))
+        level_h = max(1, math.ceil(base_image.height / downscale))
+        level_image = base_image.resize((level_w, level_h), Image.LANCZOS)
+        level_grid_w = math.ceil(level_w / tile_width)
+        level_grid_h = math.ceil(level_h / tile_height)
+
+        level_filenames = save_tile_grid(level_image, level_grid_w, level_grid_h, tile_width, tile_height,
+                                         f"tile_L{level}_", output_dir, atlas_tiles, executor, manifest, unique_tiles)
+
+        levels.append({
+            "level": level,
+            "scale": 1.0 / downscale,
+            "grid_width_in_tiles": level_grid_w,
+            "grid_height_in_tiles": level_grid_h,
+            "tile_filenames_grid": level_filenames
+        })
+        print(f"Pyramid level {level} (1/{downscale}): {level_grid_w}x{level_grid_h} tiles")
+        level += 1
+    return levels
+
+def slice_map_into_visual_tiles(map_image_path, tile_width, tile_height, output_dir="tiles", meta_file_name="map_meta.json",
+                                build_pyramid=True, pyramid_levels=None, output_format="files", workers=1,
+                                incremental=False, dedupe=True):
     """
     Slices a map image into individual visual tiles and saves basic metadata.
     Collision data is NOT generated here; it will come from Tiled.
+    If build_pyramid is set, downscaled tile levels for zoomed-out rendering are written too
+    (see build_pyramid_levels; pyramid_levels=None generates as many levels as useful).
+    output_format is "files" for one PNG per tile, or "atlas" to pack all tiles into a few
+    atlas images; the metadata then lists the atlases and each tile's rect inside them.
+    workers > 1 encodes the tile PNGs on that many processes (None = one per CPU); the
+    files and metadata are identical to a serial run. Atlas output is always serial.
+    Every run writes a TILE_MANIFEST_FILENAME with each tile's content hash. With incremental
+    set, old tiles are kept and only those whose content changed since the manifest was
+    written are re-encoded; the manifest then lists the changed and removed tiles.
+    With dedupe set, identical tiles (on any level) are saved once: the metadata then has
+    "tile_files", the unique tile names, and every level has a "tile_id_grid" of indices
+    into it instead of a "tile_filenames_grid".
     """
+    if output_format not in ("files", "atlas"):
+        print(f"Error: Unknown output format '{output_format}'. Use 'files' or 'atlas'.")
+        return None
+    atlas_tiles = [] if output_format == "atlas" else None
+
     try:
         map_image_pil = Image.open(map_image_path)
         print(f"Successfully opened image: {map_image_path}")
@@ -29,7 +320,7 @@ def slice_map_into_visual_tiles(map_image_path, tile_width, tile_height, output_
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
         print(f"Created output directory: {output_dir}")
-    else: # Clear out old tiles if directory exists, to prevent mix-ups
+    elif not incremental: # Clear out old tiles if directory exists, to prevent mix-ups
         for f_name in os.listdir(output_dir):
             if f_name.startswith("tile_") and f_name.endswith(".png"):
                 try:
@@ -37,30 +328,53 @@ def slice_map_into_visual_tiles(map_image_path, tile_width, tile_height, output_
                 except OSError as e:
                     print(f"Could not remove old tile {f_name}: {e}")
         print(f"Cleaned old visual tiles from {output_dir}")
+    manifest_path = os.path.join(output_dir, TILE_MANIFEST_FILENAME)
+    manifest = TileManifest.load(manifest_path, incremental) if incremental else TileManifest()
+
+    executor = None
+    if atlas_tiles is None and (workers is None or workers > 1):
+        executor = ProcessPoolExecutor(max_workers=workers)
+        print(f"Encoding tiles on {workers or os.cpu_count()} worker processes")
+    unique_tiles = {} if dedupe else None
+    try:
+        generated_tile_filenames = save_tile_grid(map_image_pil, grid_width_tiles, grid_height_tiles, tile_width, tile_height,
+                                                  "tile_", output_dir, atlas_tiles, executor, manifest, unique_tiles)
 
+        pyramid = []
+        if build_pyramid:
+            pyramid = build_pyramid_levels(map_image_pil, tile_width, tile_height, grid_width_tiles, grid_height_tiles,
+                                           output_dir, pyramid_levels, atlas_tiles, executor, manifest, unique_tiles)
+    finally:
+        if executor is not None:
+            executor.shutdown()
 
-    generated_tile_filenames = []
-    for y_idx in range(grid_height_tiles):
-        row_filenames = []
-        for x_idx in range(grid_width_tiles):
-            left = x_idx * tile_width
-            top = y_idx * tile_height
-            right = left + tile_width
-            bottom = top + tile_height
-
-            tile_crop_pil = map_image_pil.crop((left, top, right, bottom))
-            tile_filename = f"tile_{y_idx}_{x_idx}.png"
-            tile_path = os.path.join(output_dir, tile_filename)
-            
-            try:
-                tile_crop_pil.save(tile_path, "PNG")
-            except Exception as e:
-                print(f"Error saving tile {tile_path}: {e}")
-                row_filenames.append(None) # Placeholder for failed tile
-                continue
-            row_filenames.append(tile_filename)
-            
-        generated_tile_filenames.append(row_filenames)
+    atlas_filenames, atlas_index = [], {}
+    if atlas_tiles is not None:
+        atlas_filenames, atlas_index = pack_tiles_into_atlases(atlas_tiles, tile_width, tile_height, output_dir)
+        if atlas_filenames is None:
+            return None
+
+    if incremental:
+        # Tiles (or atlases) this run no longer produces, e.g. after the map or tile size changed
+        current_files = set(manifest.hashes) | set(atlas_filenames)
+        for f_name in os.listdir(output_dir):
+            if f_name.startswith("tile_") and f_name.endswith(".png") and f_name not in current_files:
+                try:
+                    os.remove(os.path.join(output_dir, f_name))
+                except OSError as e:
+                    print(f"Could not remove old tile {f_name}: {e}")
+        changed_tiles = manifest.changed_tiles()
+        print(f"Incremental slicing: {len(changed_tiles)} tiles changed, {len(manifest.removed_tiles())} removed, "
+              f"{len(manifest.hashes) - len(manifest.written)} unchanged tiles kept")
+        if len(changed_tiles) <= MAX_CHANGED_TILES_PRINTED:
+            for tile_name in changed_tiles:
+                print(f"  changed: {tile_name}")
+        else:
+            print(f"  (see 'changed_tiles' in {manifest_path} for the full list)")
+    try:
+        manifest.save(manifest_path)
+    except IOError as e:
+        print(f"Warning: Could not write tile manifest {manifest_path}: {e}")
 
     # Basic metadata: visual tile info. Collision grid will be added later.
     metadata = {
@@ -69,9 +383,38 @@ def slice_map_into_visual_tiles(map_image_path, tile_width, tile_height, output_
         "grid_width_in_tiles": grid_width_tiles,
         "grid_height_in_tiles": grid_height_tiles,
         "tile_filenames_grid": generated_tile_filenames,
+        "pyramid_levels": pyramid, # Downscaled tile levels, coarsest last
+        "tile_atlases": atlas_filenames, # Only used with output_format="atlas"
+        "tile_atlas_index": atlas_index, # Tile name -> [atlas_number, x, y, width, height]
         "collision_grid_data": [] # Placeholder - to be populated by tiled_importer.py
     }
+    if dedupe:
+        # Cells reference shared tiles by index: level 0 first, then the pyramid levels in order
+        tile_files, tile_ids = [], {}
+        del metadata["tile_filenames_grid"]
+        metadata["tile_id_grid"] = tile_id_grid(generated_tile_filenames, tile_files, tile_ids)
+        for level in pyramid:
+            level["tile_id_grid"] = tile_id_grid(level.pop("tile_filenames_grid"), tile_files, tile_ids)
+        metadata["tile_files"] = tile_files
+        total_cells = grid_width_tiles * grid_height_tiles + \
+                      sum(level["grid_width_in_tiles"] * level["grid_height_in_tiles"] for level in pyramid)
+        print(f"Deduplicated tiles: {len(tile_files)} unique tiles for {total_cells} cells")
     meta_file_path = os.path.join(output_dir, meta_file_name)
+    if incremental:
+        # Keep what tiled_importer.py added (collision grid) as long as the grid is unchanged
+        try:
+            with open(meta_file_path, 'r') as f:
+                old_metadata = json.load(f)
+        except (IOError, json.JSONDecodeError):
+            old_metadata = {}
+        same_grid = all(old_metadata.get(key) == metadata[key] for key in
+                        ("tile_pixel_width", "tile_pixel_height", "grid_width_in_tiles", "grid_height_in_tiles"))
+        if same_grid:
+            for key in ("tile_filenames_grid", "tile_id_grid", "tile_files"): # Replaced by this run's tile layout
+                old_metadata.pop(key, None)
+            metadata = {**old_metadata, **metadata, "collision_grid_data": old_metadata.get("collision_grid_data", [])}
+        elif old_metadata.get("collision_grid_data"):
+            print("Warning: Tile grid changed, so the old collision grid was dropped. Re-run tiled_importer.py.")
     try:
         with open(meta_file_path, 'w') as f:
             json.dump(metadata, f, indent=4)
@@ -79,6 +422,13 @@ def slice_map_into_visual_tiles(map_image_path, tile_width, tile_height, output_
     except IOError as e:
         print(f"Error saving metadata file: {e}")
         return None
+    # Binary copy that Map loads without parsing the JSON (see map_binary.py)
+    binary_path = os.path.join(output_dir, MAP_BINARY_FILENAME)
+    try:
+        save_map_binary(metadata, binary_path, CollisionGrid.from_metadata(metadata, output_dir))
+        print(f"Saved binary map file to: {binary_path}")
+    except (IOError, ValueError) as e:
+        print(f"Warning: Could not write binary map file {binary_path}: {e}")
 
     print(f"Successfully sliced map into visual tiles. Total tiles: {grid_width_tiles * grid_height_tiles}")
     return metadata
@@ -92,6 +442,19 @@ if __name__ == "__main__":
     desired_tile_pixel_width = 32 
     desired_tile_pixel_height = 32
     output_tile_directory = "tiles" # Tiles and map_meta.json will be saved here
+    # Pass --atlas to pack the tiles into a few atlas images instead of one PNG per tile
+    tile_output_format = "atlas" if "--atlas" in sys.argv else "files"
+    # Pass --workers N to encode tiles on N processes (--workers 0 uses one per CPU)
+    tile_workers = 1
+    if "--workers" in sys.argv:
+        try:
+            tile_workers = int(sys.argv[sys.argv.index("--workers") + 1]) or None
+        except (IndexError, ValueError):
+            print("Warning: --workers expects a number. Slicing serially.")
+    # Pass --incremental to keep existing tiles and re-encode only those whose pixels changed
+    incremental_slicing = "--incremental" in sys.argv
+    # Pass --no-dedupe to write every tile, even ones identical to another tile
+    dedupe_tiles = "--no-dedupe" not in sys.argv
 
     if not os.path.exists(map_image_file_to_process):
         print(f"Error: The map image '{map_image_file_to_process}' was not found.")
@@ -101,7 +464,7 @@ if __name__ == "__main__":
         
         # Delete old metadata if it exists, as it's an initial generation
         meta_file_to_delete = os.path.join(output_tile_directory, "map_meta.json")
-        if os.path.exists(meta_file_to_delete):
+        if os.path.exists(meta_file_to_delete) and not incremental_slicing:
             try:
                 os.remove(meta_file_to_delete)
                 print(f"Deleted old metadata file: {meta_file_to_delete} for fresh generation.")
@@ -112,7 +475,11 @@ if __name__ == "__main__":
             map_image_file_to_process,
             desired_tile_pixel_width,
             desired_tile_pixel_height,
-            output_tile_directory
+            output_tile_directory,
+            output_format=tile_output_format,
+            workers=tile_workers,
+            incremental=incremental_slicing,
+            dedupe=dedupe_tiles
         )
         if result_meta:
             print("Visual tile slicing and initial metadata generation complete.")
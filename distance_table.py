@@ -0,0 +1,225 @@
+# distance_table.py
+import json
+import math
+import os
+import struct
+import sys
+from array import array
+
+from collision_grid import CollisionGrid
+from flow_field import FlowField
+from nearest_walkable import NearestWalkableField
+from pathfinding import GridPathfinder
+
+# Written next to map_meta.json. Header: magic, format version, flags, grid width, grid
+# height, destination count, SHA-1 of the collision grid. Then the destination ids (each
+# UTF-8 with a uint32 length prefix), their tiles (int32 x, y pairs; a destination off the
+# grid may have a negative tile), the distance matrix (float32, row = from, column = to)
+# and, if FLAG_FIRST_STEPS is set, one direction-code byte per grid cell per destination.
+DISTANCE_TABLE_FILENAME = "distance_table.bin"
+TABLE_FILE_MAGIC = b"CNDT"
+TABLE_FILE_VERSION = 2
+ID_LENGTH = struct.Struct("<I")
+TILE_COORDINATE_RANGE = range(-2 ** 31, 2 ** 31) # What fits in an int32
+TABLE_HEADER = struct.Struct("<4sHHIII40s")
+FLAG_FIRST_STEPS = 1
+
+def _little_endian(values):
+    """Returns a copy of an array in little-endian byte order (a no-op copy on most machines)."""
+    values = array(values.typecode, values)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+class DistanceTable:
+    """
+    Walking distances (in tiles) between every pair of destinations, from one Dijkstra per
+    destination over the collision grid, plus optionally that Dijkstra's first-step field
+    so a shortest route from any tile to any destination can be read off without a search.
+    """
+    def __init__(self, grid_hash, width, height, destination_ids, destination_tiles, distances, first_steps=None):
+        self.grid_hash = grid_hash
+        self.width = width
+        self.height = height
+        self.destination_ids = list(destination_ids)
+        self.destination_tiles = [tuple(tile) for tile in destination_tiles]
+        self.distances = distances # array('f'), len(ids) ** 2, inf where unreachable
+        self.first_steps = first_steps # bytes, len(ids) * width * height, or None
+        self.index_by_id = {dest_id: i for i, dest_id in enumerate(self.destination_ids)}
+
+    @classmethod
+    def build(cls, collision_grid, destination_ids, destination_tiles, include_first_steps=True):
+        pathfinder = GridPathfinder(collision_grid)
+        width = collision_grid.width
+        count = len(destination_ids)
+        distances = array('f', [math.inf]) * (count * count)
+        first_steps = bytearray() if include_first_steps else None
+        for from_idx, tile in enumerate(destination_tiles):
+            field_distances, field_first_steps = pathfinder.distance_field([tile])
+            for to_idx, (to_x, to_y) in enumerate(destination_tiles):
+                if 0 <= to_x < width and 0 <= to_y < collision_grid.height:
+                    # Moves are symmetric, so distance to the source is distance from it
+                    distances[to_idx * count + from_idx] = field_distances[to_y * width + to_x]
+            if include_first_steps:
+                first_steps.extend(field_first_steps)
+        return cls(collision_grid.content_hash(), collision_grid.width, collision_grid.height,
+                   destination_ids, destination_tiles, distances,
+                   bytes(first_steps) if include_first_steps else None)
+
+    @classmethod
+    def load_or_build(cls, collision_grid, destination_ids, destination_tiles, directory, include_first_steps=True):
+        """
+        Returns the table for this grid and these destinations, read from the cache file in
+        directory when it matches, otherwise built now and written back to the cache.
+        """
+        table_path = os.path.join(directory, DISTANCE_TABLE_FILENAME)
+        try:
+            table = cls.load(table_path)
+            if table.matches(collision_grid, destination_ids, destination_tiles) and \
+               (table.first_steps is not None or not include_first_steps):
+                return table
+            print(f"'{table_path}' is out of date (collision grid or destinations changed). Rebuilding it.")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read '{table_path}': {e}. Rebuilding it.")
+
+        table = cls.build(collision_grid, destination_ids, destination_tiles, include_first_steps)
+        try:
+            table.save(table_path)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not write distance table '{table_path}': {e}")
+        return table
+
+    def matches(self, collision_grid, destination_ids, destination_tiles):
+        return self.grid_hash == collision_grid.content_hash() and \
+               self.destination_ids == list(destination_ids) and \
+               self.destination_tiles == [tuple(tile) for tile in destination_tiles]
+
+    def save(self, path):
+        """Writes the table. Raises ValueError (before touching the file) if a tile can't be stored."""
+        tile_values = [value for tile in self.destination_tiles for value in tile]
+        if not all(isinstance(value, int) and value in TILE_COORDINATE_RANGE for value in tile_values):
+            raise ValueError("destination tiles must be whole numbers that fit in 32 bits")
+        tiles = array('i', tile_values)
+        encoded_ids = [dest_id.encode("utf-8") for dest_id in self.destination_ids]
+        flags = FLAG_FIRST_STEPS if self.first_steps is not None else 0
+        with open(path, 'wb') as f:
+            f.write(TABLE_HEADER.pack(TABLE_FILE_MAGIC, TABLE_FILE_VERSION, flags, self.width, self.height,
+                                      len(self.destination_ids), self.grid_hash.encode("ascii")))
+            for encoded_id in encoded_ids:
+                f.write(ID_LENGTH.pack(len(encoded_id)))
+                f.write(encoded_id)
+            f.write(_little_endian(tiles).tobytes())
+            f.write(_little_endian(self.distances).tobytes())
+            if self.first_steps is not None:
+                f.write(self.first_steps)
+
+    @classmethod
+    def load(cls, path):
+        """Reads a file written by save. Raises ValueError if it isn't one."""
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < TABLE_HEADER.size:
+            raise ValueError("file is truncated")
+        magic, version, flags, width, height, count, grid_hash = TABLE_HEADER.unpack_from(data)
+        if magic != TABLE_FILE_MAGIC or version != TABLE_FILE_VERSION:
+            raise ValueError(f"not a version {TABLE_FILE_VERSION} distance table file")
+        position = TABLE_HEADER.size
+        destination_ids = []
+        for _ in range(count):
+            if position + ID_LENGTH.size > len(data):
+                raise ValueError("file is truncated")
+            (id_length,) = ID_LENGTH.unpack_from(data, position)
+            position += ID_LENGTH.size
+            if position + id_length > len(data):
+                raise ValueError("file is truncated")
+            destination_ids.append(data[position:position + id_length].decode("utf-8"))
+            position += id_length
+
+        tiles = array('i')
+        tiles.frombytes(data[position:position + 2 * count * tiles.itemsize])
+        position += 2 * count * tiles.itemsize
+        distances = array('f')
+        distances.frombytes(data[position:position + count * count * distances.itemsize])
+        position += count * count * distances.itemsize
+        if sys.byteorder == "big":
+            tiles.byteswap()
+            distances.byteswap()
+
+        first_steps = None
+        if flags & FLAG_FIRST_STEPS:
+            first_steps = data[position:position + count * width * height]
+            position += count * width * height
+        if len(destination_ids) != count or len(tiles) != 2 * count or \
+           len(distances) != count * count or position != len(data):
+            raise ValueError("sizes do not match the header")
+        destination_tiles = [(tiles[2 * i], tiles[2 * i + 1]) for i in range(count)]
+        return cls(grid_hash.decode("ascii"), width, height, destination_ids, destination_tiles, distances, first_steps)
+
+    def distance(self, from_id, to_id):
+        """Walking distance in tiles between two destinations, or None if unknown or unreachable."""
+        from_idx = self.index_by_id.get(from_id)
+        to_idx = self.index_by_id.get(to_id)
+        if from_idx is None or to_idx is None:
+            return None
+        distance = self.distances[from_idx * len(self.destination_ids) + to_idx]
+        return None if math.isinf(distance) else distance
+
+    def flow_field(self, to_id):
+        """
+        The FlowField toward a destination, viewing that destination's plane of first steps
+        (no search, no copy), or None if the destination is unknown or steps weren't stored.
+        """
+        to_idx = self.index_by_id.get(to_id)
+        if to_idx is None or self.first_steps is None:
+            return None
+        cell_count = self.width * self.height
+        first_steps = memoryview(self.first_steps)[to_idx * cell_count:(to_idx + 1) * cell_count]
+        return FlowField(self.width, self.height, self.destination_tiles[to_idx], first_steps)
+
+def destination_tiles_for(world_positions, tile_pixel_width, tile_pixel_height, nearest_walkable_field=None):
+    """
+    Tile of each (world_x, world_y) destination position, moved to the nearest walkable
+    tile when it is inside a wall (if a NearestWalkableField is given).
+    """
+    tiles = []
+    for world_x, world_y in world_positions:
+        tile = (math.floor(world_x / tile_pixel_width), math.floor(world_y / tile_pixel_height))
+        if nearest_walkable_field is not None:
+            tile = nearest_walkable_field.nearest(*tile) or tile
+        tiles.append(tile)
+    return tiles
+
+if __name__ == "__main__":
+    # Offline build: python distance_table.py [tiles_directory]
+    # Re-run after tiled_importer.py or after editing destinations_data.py.
+    from destinations_data import destinations_data
+
+    tile_directory = sys.argv[1] if len(sys.argv) > 1 else "tiles"
+    meta_path = os.path.join(tile_directory, "map_meta.json")
+    try:
+        with open(meta_path, 'r') as f:
+            metadata = json.load(f)
+    except (IOError, json.JSONDecodeError) as e:
+        print(f"Error reading metadata file {meta_path}: {e}")
+        sys.exit(1)
+
+    collision_grid = CollisionGrid.from_metadata(metadata, tile_directory)
+    if not collision_grid:
+        print(f"Error: {meta_path} has no collision grid. Run tiled_importer.py first.")
+        sys.exit(1)
+    located = [d for d in destinations_data if d.get("world_x") is not None and d.get("world_y") is not None]
+    field = NearestWalkableField.load_or_build(collision_grid, tile_directory)
+    tiles = destination_tiles_for([(d["world_x"], d["world_y"]) for d in located],
+                                  metadata["tile_pixel_width"], metadata["tile_pixel_height"], field)
+
+    table = DistanceTable.build(collision_grid, [d["id"] for d in located], tiles)
+    output_path = os.path.join(tile_directory, DISTANCE_TABLE_FILENAME)
+    try:
+        table.save(output_path)
+    except (OSError, ValueError) as e:
+        print(f"Error writing distance table {output_path}: {e}")
+        sys.exit(1)
+    unreachable = sum(1 for distance in table.distances if math.isinf(distance))
+    print(f"Wrote {output_path}: {len(located)} destinations, {unreachable} unreachable pairs.")
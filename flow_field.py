@@ -0,0 +1,75 @@
+# flow_field.py
+from collections import OrderedDict
+
+from pathfinding import STEP_DIRECTIONS, NO_STEP
+
+DEFAULT_MAX_FLOW_FIELDS = 4
+
+class FlowField:
+    """
+    Direction to walk from every tile toward one goal: one byte per tile (a STEP_DIRECTIONS
+    code, or NO_STEP at the goal, on walls and where the goal can't be reached), from a
+    single Dijkstra outward from the goal (see also DistanceTable.flow_field, which serves
+    the ones it already stores). Looking up the next step is O(1).
+    """
+    def __init__(self, width, height, goal_tile, first_steps):
+        self.width = width
+        self.height = height
+        self.goal_tile = goal_tile
+        self.first_steps = first_steps
+
+    def next_step(self, tile_x_idx, tile_y_idx):
+        """The (step_x, step_y) to take from a tile, or None (at the goal, off the grid or unreachable)."""
+        if not (0 <= tile_x_idx < self.width and 0 <= tile_y_idx < self.height):
+            return None
+        code = self.first_steps[tile_y_idx * self.width + tile_x_idx]
+        return None if code == NO_STEP else STEP_DIRECTIONS[code]
+
+    def trail(self, tile_x_idx, tile_y_idx, max_steps):
+        """Up to max_steps tiles followed from (but not including) the given tile toward the goal."""
+        tiles = []
+        for _ in range(max_steps):
+            step = self.next_step(tile_x_idx, tile_y_idx)
+            if step is None:
+                break
+            tile_x_idx += step[0]
+            tile_y_idx += step[1]
+            tiles.append((tile_x_idx, tile_y_idx))
+        return tiles
+
+    def route_from_tile(self, tile):
+        """
+        Follows the field from tile to the goal and returns the tiles visited (both ends
+        included), or None if the goal can't be reached from tile.
+        """
+        route = [tuple(tile)]
+        route.extend(self.trail(tile[0], tile[1], self.width * self.height))
+        return route if route[-1] == self.goal_tile else None
+
+class FlowFieldCache:
+    """
+    Small LRU cache of flow fields keyed by (goal tile, key), where key identifies the state
+    of the collision grid (e.g. Map.collision_grid_version) so edits never reuse a stale field.
+    """
+    def __init__(self, max_fields=DEFAULT_MAX_FLOW_FIELDS):
+        self.max_fields = max_fields
+        self.fields = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, pathfinder, goal_tile, key=None):
+        """Returns the FlowField toward goal_tile, running pathfinder.distance_field on a miss."""
+        cache_key = (tuple(goal_tile), key)
+        field = self.fields.get(cache_key)
+        if field is not None:
+            self.fields.move_to_end(cache_key) # Mark as most recently used
+            self.hits += 1
+            return field
+        self.misses += 1
+        _, first_steps = pathfinder.distance_field([goal_tile])
+        grid = pathfinder.grid
+        field = FlowField(grid.width, grid.height, tuple(goal_tile), first_steps)
+        self.fields[cache_key] = field
+        while len(self.fields) > self.max_fields:
+            self.fields.popitem(last=False)
+        return field
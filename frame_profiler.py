@@ -0,0 +1,133 @@
+# frame_profiler.py
+import csv
+import time
+from collections import deque
+
+import pygame
+
+# Frame phases timed in main(), in the order they run
+FRAME_PHASES = ["events", "player_update", "destinations", "map_draw", "sprites", "text", "flip"]
+# Per-frame counters reported alongside the timings
+FRAME_COUNTERS = ["blits", "tile_cache_hits", "tile_cache_misses", "chunk_cache_hits", "chunk_cache_misses"]
+
+OVERLAY_REFRESH_FRAMES = 30 # Re-render the overlay text twice a second at 60 fps
+OVERLAY_BACKGROUND = (0, 0, 0, 170)
+OVERLAY_TEXT_COLOR = (255, 255, 255)
+
+class FrameProfiler:
+    """
+    Lap timer for the phases of the main loop. Call begin_frame() at the top of the loop,
+    mark(phase) right after each phase finishes and end_frame() at the bottom. Keeps rolling
+    p50/p95/p99 per phase over the last window_size frames, can draw them as an overlay and
+    can write every frame's samples to a CSV file. When disabled every call returns at once.
+    """
+    def __init__(self, enabled=False, window_size=300, csv_path=None):
+        self.enabled = enabled or csv_path is not None
+        self.show_overlay = enabled
+        self.samples = {name: deque(maxlen=window_size) for name in FRAME_PHASES + ["frame"]}
+        self.counter_samples = {name: deque(maxlen=window_size) for name in FRAME_COUNTERS}
+        self.frame_number = 0
+
+        self._frame_start = 0.0
+        self._last_mark = 0.0
+        self._frame_times = {}
+        self._frame_counters = {}
+        self._overlay_surface = None
+        self._overlay_age = OVERLAY_REFRESH_FRAMES
+
+        self._csv_file = None
+        self._csv_writer = None
+        if csv_path is not None:
+            try:
+                self._csv_file = open(csv_path, 'w', newline='')
+                self._csv_writer = csv.writer(self._csv_file)
+                self._csv_writer.writerow(["frame", "frame_ms"] + [f"{name}_ms" for name in FRAME_PHASES] + FRAME_COUNTERS)
+                print(f"Writing per-frame profile samples to: {csv_path}")
+            except IOError as e:
+                print(f"Error opening profile CSV file {csv_path}: {e}")
+                self._csv_file = None
+                self._csv_writer = None
+
+    def toggle_overlay(self):
+        """Shows or hides the overlay. Timing is switched on while the overlay is visible."""
+        self.show_overlay = not self.show_overlay
+        self.enabled = self.show_overlay or self._csv_writer is not None
+        self._overlay_age = OVERLAY_REFRESH_FRAMES
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self._frame_start = self._last_mark = time.perf_counter()
+        self._frame_times = {}
+
+    def mark(self, phase):
+        """Records the time since the previous mark (or begin_frame) as the given phase."""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self._frame_times[phase] = self._frame_times.get(phase, 0.0) + (now - self._last_mark) * 1000.0
+        self._last_mark = now
+
+    def end_frame(self, counters=None):
+        """Closes the frame. counters is a dict of FRAME_COUNTERS values for this frame."""
+        if not self.enabled:
+            return
+        frame_ms = (time.perf_counter() - self._frame_start) * 1000.0
+        self.frame_number += 1
+        self.samples["frame"].append(frame_ms)
+        for name in FRAME_PHASES:
+            self.samples[name].append(self._frame_times.get(name, 0.0))
+        counters = counters or {}
+        for name in FRAME_COUNTERS:
+            self.counter_samples[name].append(counters.get(name, 0))
+
+        if self._csv_writer is not None:
+            self._csv_writer.writerow(
+                [self.frame_number, f"{frame_ms:.3f}"] +
+                [f"{self._frame_times.get(name, 0.0):.3f}" for name in FRAME_PHASES] +
+                [counters.get(name, 0) for name in FRAME_COUNTERS]
+            )
+
+    def percentiles(self, name, quantiles=(0.50, 0.95, 0.99)):
+        """Returns the requested percentiles (in ms) of a phase, or of "frame", over the rolling window."""
+        window = self.samples.get(name)
+        if not window:
+            return tuple(0.0 for _ in quantiles)
+        ordered = sorted(window)
+        last_index = len(ordered) - 1
+        return tuple(ordered[min(last_index, int(round(q * last_index)))] for q in quantiles)
+
+    def draw_overlay(self, surface, font, position=(10, 60)):
+        """Blits the overlay and returns its rect (or None when hidden)."""
+        if not self.show_overlay:
+            return None
+        self._overlay_age += 1
+        if self._overlay_surface is None or self._overlay_age >= OVERLAY_REFRESH_FRAMES:
+            self._overlay_surface = self._render_overlay(font)
+            self._overlay_age = 0
+        return surface.blit(self._overlay_surface, position)
+
+    def _render_overlay(self, font):
+        lines = ["phase            p50    p95    p99 ms"]
+        for name in FRAME_PHASES + ["frame"]:
+            p50, p95, p99 = self.percentiles(name)
+            lines.append(f"{name:<14}{p50:7.2f}{p95:7.2f}{p99:7.2f}")
+        for name in FRAME_COUNTERS:
+            window = self.counter_samples[name]
+            average = sum(window) / len(window) if window else 0.0
+            lines.append(f"{name:<20} {average:8.1f}/frame")
+
+        line_surfaces = [font.render(line, True, OVERLAY_TEXT_COLOR) for line in lines]
+        line_height = font.get_linesize()
+        width = max(line_surface.get_width() for line_surface in line_surfaces) + 12
+        overlay = pygame.Surface((width, line_height * len(lines) + 12), pygame.SRCALPHA)
+        overlay.fill(OVERLAY_BACKGROUND)
+        for i, line_surface in enumerate(line_surfaces):
+            overlay.blit(line_surface, (6, 6 + i * line_height))
+        return overlay
+
+    def close(self):
+        if self._csv_file is not None:
+            self._csv_file.close()
+            self._csv_file = None
+            self._csv_writer = None
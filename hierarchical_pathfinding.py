@@ -0,0 +1,306 @@
+# hierarchical_pathfinding.py
+import heapq
+import math
+
+from pathfinding import GRID_STEPS, cuts_corner, octile_distance
+
+DEFAULT_SECTOR_SIZE = 16 # Sector side in tiles
+# Border openings at least this long get an entrance at each end instead of one in the middle
+LONG_ENTRANCE_LENGTH = 6
+
+
+class HierarchicalPathfinder:
+    """
+    HPA* over a CollisionGrid. The grid is cut into square sectors; wherever two neighbouring
+    sectors share an open stretch of border there is an entrance (a pair of tiles, one on
+    each side). Walking costs between the entrances of each sector are precomputed, giving a
+    small abstract graph. A query connects its start and goal to the entrances of their
+    sectors, runs A* on the abstract graph, and then searches only inside the sectors along
+    that abstract path to produce the tile path.
+
+    Moves match GridPathfinder (8 directions, no cutting wall corners), so routes are close
+    to, but not always exactly, the shortest. After editing the grid, pass the changed tiles
+    to update_tiles() to rebuild only the sectors they touch.
+    """
+    def __init__(self, collision_grid, sector_size=DEFAULT_SECTOR_SIZE):
+        self.grid = collision_grid
+        self.sector_size = sector_size
+        self.sectors_x = math.ceil(collision_grid.width / sector_size)
+        self.sectors_y = math.ceil(collision_grid.height / sector_size)
+        # Border key ("v", sector_x, sector_y) is the border between (sector_x, sector_y) and the
+        # sector to its right; ("h", sector_x, sector_y) is the one with the sector below it.
+        # Each maps to the list of (tile_index, tile_index) entrance pairs across that border.
+        self.border_entrances = {}
+        # Sector -> {entrance tile index: [(other entrance tile index, cost), ...]} within the sector
+        self.sector_edges = {}
+        # Entrance tile index -> entrance tile indices directly across a border (cost 1)
+        self.crossings = {}
+        self.nodes_expanded = 0 # Abstract nodes expanded by the last query
+        self.rebuild()
+
+    # --- Building ---
+
+    def rebuild(self):
+        """Builds the whole abstract graph from scratch."""
+        self.border_entrances = {}
+        for sector_y in range(self.sectors_y):
+            for sector_x in range(self.sectors_x):
+                for border_key in self._own_borders(sector_x, sector_y):
+                    self.border_entrances[border_key] = self._find_entrances(border_key)
+        self._rebuild_crossings()
+        self.sector_edges = {}
+        for sector_y in range(self.sectors_y):
+            for sector_x in range(self.sectors_x):
+                self.sector_edges[(sector_x, sector_y)] = self._build_sector_edges(sector_x, sector_y)
+
+    def update_tiles(self, tiles):
+        """
+        Rebuilds the part of the graph affected by changes to the given (tile_x, tile_y)
+        tiles: the borders of their sectors, and the entrance costs of those sectors and of
+        the neighbours across those borders.
+        """
+        dirty_sectors = {(tile_x // self.sector_size, tile_y // self.sector_size) for tile_x, tile_y in tiles
+                         if 0 <= tile_x < self.grid.width and 0 <= tile_y < self.grid.height}
+        if not dirty_sectors:
+            return
+        affected_sectors = set(dirty_sectors)
+        for sector_x, sector_y in dirty_sectors:
+            for border_key in self._all_borders(sector_x, sector_y):
+                self.border_entrances[border_key] = self._find_entrances(border_key)
+                affected_sectors.update(self._border_sectors(border_key))
+        self._rebuild_crossings()
+        for sector_x, sector_y in affected_sectors:
+            self.sector_edges[(sector_x, sector_y)] = self._build_sector_edges(sector_x, sector_y)
+
+    def _own_borders(self, sector_x, sector_y):
+        """Borders to the right of and below a sector (each border is owned by one sector)."""
+        borders = []
+        if sector_x + 1 < self.sectors_x:
+            borders.append(("v", sector_x, sector_y))
+        if sector_y + 1 < self.sectors_y:
+            borders.append(("h", sector_x, sector_y))
+        return borders
+
+    def _all_borders(self, sector_x, sector_y):
+        borders = self._own_borders(sector_x, sector_y)
+        if sector_x > 0:
+            borders.append(("v", sector_x - 1, sector_y))
+        if sector_y > 0:
+            borders.append(("h", sector_x, sector_y - 1))
+        return borders
+
+    def _border_sectors(self, border_key):
+        orientation, sector_x, sector_y = border_key
+        if orientation == "v":
+            return [(sector_x, sector_y), (sector_x + 1, sector_y)]
+        return [(sector_x, sector_y), (sector_x, sector_y + 1)]
+
+    def _sector_bounds(self, sector_x, sector_y):
+        """(first_x, first_y, end_x, end_y) of a sector in tiles, end exclusive."""
+        first_x, first_y = sector_x * self.sector_size, sector_y * self.sector_size
+        return (first_x, first_y,
+                min(first_x + self.sector_size, self.grid.width), min(first_y + self.sector_size, self.grid.height))
+
+    def _find_entrances(self, border_key):
+        """Entrance pairs along one border: one per open stretch, or one at each end of a long one."""
+        orientation, sector_x, sector_y = border_key
+        width, cells = self.grid.width, self.grid.cells
+        first_x, first_y, end_x, end_y = self._sector_bounds(sector_x, sector_y)
+        if orientation == "v":
+            # Tiles (end_x - 1, y) | (end_x, y) for y along the sector's right edge
+            pairs = [((y * width + end_x - 1), (y * width + end_x)) for y in range(first_y, end_y)]
+        else:
+            pairs = [(((end_y - 1) * width + x), (end_y * width + x)) for x in range(first_x, end_x)]
+
+        entrances = []
+        run = []
+        for pair in pairs + [None]: # None closes the last run
+            if pair is not None and cells[pair[0]] == 0 and cells[pair[1]] == 0:
+                run.append(pair)
+                continue
+            if run:
+                if len(run) >= LONG_ENTRANCE_LENGTH:
+                    entrances.extend([run[0], run[-1]])
+                else:
+                    entrances.append(run[len(run) // 2])
+                run = []
+        return entrances
+
+    def _rebuild_crossings(self):
+        crossings = {}
+        for entrances in self.border_entrances.values():
+            for tile_a, tile_b in entrances:
+                crossings.setdefault(tile_a, []).append(tile_b)
+                crossings.setdefault(tile_b, []).append(tile_a)
+        self.crossings = crossings
+
+    def _sector_of_index(self, tile_index):
+        return ((tile_index % self.grid.width) // self.sector_size, (tile_index // self.grid.width) // self.sector_size)
+
+    def _sector_entrances(self, sector_x, sector_y):
+        """Entrance tile indices lying inside a sector."""
+        first_x, first_y, end_x, end_y = self._sector_bounds(sector_x, sector_y)
+        width = self.grid.width
+        inside = set()
+        for border_key in self._all_borders(sector_x, sector_y):
+            for pair in self.border_entrances.get(border_key, ()):
+                for tile_index in pair:
+                    if first_x <= tile_index % width < end_x and first_y <= tile_index // width < end_y:
+                        inside.add(tile_index)
+        return sorted(inside)
+
+    def _build_sector_edges(self, sector_x, sector_y):
+        entrances = self._sector_entrances(sector_x, sector_y)
+        edges = {}
+        for i, entrance in enumerate(entrances):
+            costs, _ = self._search_in_sector(entrance, (sector_x, sector_y))
+            edges.setdefault(entrance, [])
+            for other in entrances[i + 1:]:
+                if other in costs:
+                    # Moves are symmetric, so one search gives the cost both ways
+                    edges[entrance].append((other, costs[other]))
+                    edges.setdefault(other, []).append((entrance, costs[other]))
+        return edges
+
+    # --- Searching ---
+
+    def _search_in_sector(self, source_index, sector, goal_index=None):
+        """
+        Dijkstra from source_index restricted to one sector. Returns (costs, parents) dicts
+        keyed by tile index; stops early once goal_index is settled, if given.
+        """
+        first_x, first_y, end_x, end_y = self._sector_bounds(*sector)
+        width, cells = self.grid.width, self.grid.cells
+        costs = {source_index: 0.0}
+        parents = {source_index: None}
+        settled = set()
+        open_heap = [(0.0, source_index)]
+        while open_heap:
+            cost, index = heapq.heappop(open_heap)
+            if index in settled:
+                continue
+            settled.add(index)
+            if index == goal_index:
+                break
+            x, y = index % width, index // width
+            for step_x, step_y, step_cost in GRID_STEPS:
+                nx, ny = x + step_x, y + step_y
+                if not (first_x <= nx < end_x and first_y <= ny < end_y):
+                    continue
+                neighbour = ny * width + nx
+                if cells[neighbour] != 0 or neighbour in settled:
+                    continue
+                if step_x and step_y and cuts_corner(cells, index, step_x, step_y, width):
+                    continue # Would cut a wall corner
+                new_cost = cost + step_cost
+                if new_cost < costs.get(neighbour, math.inf):
+                    costs[neighbour] = new_cost
+                    parents[neighbour] = index
+                    heapq.heappush(open_heap, (new_cost, neighbour))
+        return costs, parents
+
+    def _path_in_sector(self, start_index, goal_index, sector):
+        costs, parents = self._search_in_sector(start_index, sector, goal_index)
+        if goal_index not in costs:
+            return None
+        path = []
+        index = goal_index
+        while index is not None:
+            path.append(index)
+            index = parents[index]
+        path.reverse()
+        return path
+
+    def _heuristic(self, index_a, index_b):
+        width = self.grid.width
+        return octile_distance(index_a % width - index_b % width, index_a // width - index_b // width)
+
+    def find_path(self, start_tile, goal_tile):
+        """
+        Returns the list of (tile_x, tile_y) from start_tile to goal_tile inclusive, or None
+        if either end is unwalkable or no route exists.
+        """
+        grid = self.grid
+        if not (grid.is_walkable(*start_tile) and grid.is_walkable(*goal_tile)):
+            return None
+        width = grid.width
+        start_index = start_tile[1] * width + start_tile[0]
+        goal_index = goal_tile[1] * width + goal_tile[0]
+        start_sector = self._sector_of_index(start_index)
+        goal_sector = self._sector_of_index(goal_index)
+        self.nodes_expanded = 0
+
+        if start_sector == goal_sector:
+            local_path = self._path_in_sector(start_index, goal_index, start_sector)
+            if local_path is not None:
+                return self._to_tiles(local_path)
+
+        # Connect the start and goal to the entrances of their sectors
+        start_costs, _ = self._search_in_sector(start_index, start_sector)
+        goal_costs, _ = self._search_in_sector(goal_index, goal_sector)
+        start_links = [(entrance, start_costs[entrance])
+                       for entrance in self.sector_edges[start_sector] if entrance in start_costs]
+        goal_links = {entrance: goal_costs[entrance]
+                      for entrance in self.sector_edges[goal_sector] if entrance in goal_costs}
+        if not start_links or not goal_links:
+            return None
+
+        abstract_path = self._abstract_search(start_index, start_links, goal_index, goal_links)
+        if abstract_path is None:
+            return None
+
+        # Refine: consecutive abstract nodes are either across a border (adjacent tiles) or
+        # in the same sector, where a search limited to that sector fills in the tiles
+        tile_indices = [abstract_path[0]]
+        for from_index, to_index in zip(abstract_path, abstract_path[1:]):
+            from_sector = self._sector_of_index(from_index)
+            if from_sector != self._sector_of_index(to_index):
+                tile_indices.append(to_index)
+                continue
+            segment = self._path_in_sector(from_index, to_index, from_sector)
+            if segment is None:
+                return None # Graph out of date: update_tiles() wasn't called after an edit
+            tile_indices.extend(segment[1:])
+        return self._to_tiles(tile_indices)
+
+    def _abstract_search(self, start_index, start_links, goal_index, goal_links):
+        """A* over the entrance graph from start to goal; returns the list of tile indices visited."""
+        costs = {start_index: 0.0}
+        parents = {start_index: None}
+        closed = set()
+        open_heap = [(self._heuristic(start_index, goal_index), start_index)]
+        while open_heap:
+            _, node = heapq.heappop(open_heap)
+            if node in closed:
+                continue
+            if node == goal_index:
+                path = []
+                while node is not None:
+                    path.append(node)
+                    node = parents[node]
+                path.reverse()
+                return path
+            closed.add(node)
+            self.nodes_expanded += 1
+
+            if node == start_index:
+                links = list(start_links)
+            else:
+                links = list(self.sector_edges[self._sector_of_index(node)].get(node, []))
+            links.extend((other, 1.0) for other in self.crossings.get(node, ()))
+            if node in goal_links:
+                links.append((goal_index, goal_links[node]))
+            node_cost = costs[node]
+            for other, link_cost in links:
+                if other in closed:
+                    continue
+                new_cost = node_cost + link_cost
+                if new_cost < costs.get(other, math.inf):
+                    costs[other] = new_cost
+                    parents[other] = node
+                    heapq.heappush(open_heap, (new_cost + self._heuristic(other, goal_index), other))
+        return None
+
+    def _to_tiles(self, tile_indices):
+        width = self.grid.width
+        return [(index % width, index // width) for index in tile_indices]
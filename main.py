@@ -3,9 +3,15 @@ import pygame
 import sys
 import os
 import random # Needed for random objective selection
+import math
 
 from map_class import Map
 from destination_class import Destination # Import the Destination class
+from text_cache import TextRenderCache
+from frame_profiler import FrameProfiler
+from spatial_index import SpatialHash
+from distance_table import DistanceTable, destination_tiles_for
+from route_planner import plan_route, select_route_under_length, tour_length
 
 # --- IMPORT YOUR DESTINATIONS DATA ---
 try:
@@ -22,12 +28,60 @@ SCREEN_HEIGHT = 600
 # in convert_map_to_tiles.py if that script defines tile size.
 REFERENCE_TILE_SIZE = 32
 ZOOM_SPEED_MULTIPLIER = 1.1
+# Destinations are bucketed in a spatial hash with cells of this many world pixels, so
+# culling and "near X" hints only look at the destinations around the player or viewport
+DESTINATION_INDEX_CELL_SIZE = 256
+NEARBY_HINT_DISTANCE = 120 # World pixels beyond a destination's radius that count as "near"
+# Optional scroll-blit / dirty-rect rendering for the low-power kiosks: the map layer is
+# scrolled with the camera and only the changed parts of the screen are sent to the display.
+# Enable with: python main.py --dirty-rects
+DIRTY_RECT_RENDERING = "--dirty-rects" in sys.argv
+
+def get_command_line_option(name):
+    """Returns the value that follows name in sys.argv (e.g. --profile-csv frames.csv), or None."""
+    if name in sys.argv:
+        option_index = sys.argv.index(name)
+        if option_index + 1 < len(sys.argv):
+            return sys.argv[option_index + 1]
+    return None
+
+# Frame profiler: F3 toggles the timing overlay. Start with it shown using --profile,
+# and write every frame's phase timings to a CSV file with --profile-csv <path>.
+PROFILE_OVERLAY_AT_START = "--profile" in sys.argv
+PROFILE_CSV_PATH = get_command_line_option("--profile-csv")
+
+# Objective ordering: --route-order visits the session's objectives in a short walking
+# tour from the spawn point instead of in random order. --max-tour-length <pixels> also
+# picks the objectives so that the whole tour stays under that many world pixels.
+OBJECTIVE_ORDERING = "route" if "--route-order" in sys.argv or "--max-tour-length" in sys.argv else "random"
+try:
+    MAX_TOUR_LENGTH = float(get_command_line_option("--max-tour-length")) if "--max-tour-length" in sys.argv else None
+except (TypeError, ValueError):
+    print("Warning: --max-tour-length expects a number of pixels. Ignoring it.")
+    MAX_TOUR_LENGTH = None
+
+# Fixed-timestep simulation: the player and objective checks always advance in steps of
+# SIMULATION_STEP seconds, however fast frames are rendered. Frames draw the player
+# interpolated between the last two steps. After a long hitch at most
+# MAX_SIMULATION_STEPS_PER_FRAME steps are run and the rest of the time is dropped.
+# --fps <n> caps the render rate (0 = uncapped), e.g. --fps 30 on battery-powered kiosks.
+SIMULATION_HZ = 60
+SIMULATION_STEP = 1.0 / SIMULATION_HZ
+MAX_SIMULATION_STEPS_PER_FRAME = 5
+try:
+    RENDER_FPS_CAP = int(get_command_line_option("--fps") or 60)
+except ValueError:
+    print("Warning: --fps expects a whole number. Using 60.")
+    RENDER_FPS_CAP = 60
 
 # --- Colors ---
 WHITE = (255, 255, 255)
 BLUE = (0, 0, 255) 
 BLACK = (0, 0, 0) # Used for player colorkey and some text
 RED = (255,0,0) # For debug drawing
+ROUTE_COLOR = (0, 150, 0) # Planned route to the current objective (toggle with R)
+GUIDANCE_COLOR = (230, 110, 0) # Arrow and breadcrumbs along the walkable route to the objective
+GUIDANCE_TRAIL_STEPS = 6 # Breadcrumb tiles shown ahead of the player
 
 # --- Player Class ---
 class Player(pygame.sprite.Sprite):
@@ -42,6 +96,9 @@ class Player(pygame.sprite.Sprite):
         self.rect = self.image.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))
         self.world_x = float(initial_world_x)
         self.world_y = float(initial_world_y)
+        # Position at the start of the latest simulation step, for render interpolation
+        self.previous_world_x = self.world_x
+        self.previous_world_y = self.world_y
         self.speed = 150 
         self.direction = pygame.math.Vector2(0, 0)
 
@@ -57,63 +114,17 @@ class Player(pygame.sprite.Sprite):
         delta_x = normalized_direction.x * self.speed * dt
         delta_y = normalized_direction.y * self.speed * dt
 
-        # --- X-axis movement and collision ---
-        new_world_x_center = self.world_x + delta_x
-        potential_player_rect_x = pygame.Rect(
-            new_world_x_center - self.width / 2, 
-            self.world_y - self.height / 2, 
-            self.width, 
-            self.height
-        )
-        
-        if delta_x != 0:
-            collided_x = False
-            corners_to_check_x = []
-            if delta_x > 0: corners_to_check_x = [potential_player_rect_x.topright, potential_player_rect_x.bottomright]
-            elif delta_x < 0: corners_to_check_x = [potential_player_rect_x.topleft, potential_player_rect_x.bottomleft]
-
-            for corner_x_coord, corner_y_coord in corners_to_check_x:
-                tile_cx = int(corner_x_coord / game_map.tile_pixel_width)
-                tile_cy = int(corner_y_coord / game_map.tile_pixel_height)
-                
-                if not game_map.is_tile_walkable(tile_cx, tile_cy):
-                    collided_x = True
-                    if delta_x > 0: new_world_x_center = (tile_cx * game_map.tile_pixel_width) - (self.width / 2) - 0.01 
-                    elif delta_x < 0: new_world_x_center = ((tile_cx + 1) * game_map.tile_pixel_width) + (self.width / 2) + 0.01
-                    break 
-            self.world_x = new_world_x_center
-        else:
-            self.world_x = new_world_x_center
-
-        # --- Y-axis movement and collision ---
-        new_world_y_center = self.world_y + delta_y
-        potential_player_rect_y = pygame.Rect(
-            self.world_x - self.width / 2, 
-            new_world_y_center - self.height / 2,
-            self.width,
-            self.height
-        )
-
-        if delta_y != 0:
-            collided_y = False
-            corners_to_check_y = []
-            if delta_y > 0: corners_to_check_y = [potential_player_rect_y.bottomleft, potential_player_rect_y.bottomright]
-            elif delta_y < 0: corners_to_check_y = [potential_player_rect_y.topleft, potential_player_rect_y.topright]
-
-            for corner_x_coord, corner_y_coord in corners_to_check_y:
-                tile_cx = int(corner_x_coord / game_map.tile_pixel_width)
-                tile_cy = int(corner_y_coord / game_map.tile_pixel_height)
-
-                if not game_map.is_tile_walkable(tile_cx, tile_cy):
-                    collided_y = True
-                    if delta_y > 0: new_world_y_center = (tile_cy * game_map.tile_pixel_height) - (self.height / 2) - 0.01
-                    elif delta_y < 0: new_world_y_center = ((tile_cy + 1) * game_map.tile_pixel_height) + (self.height / 2) + 0.01
-                    break
-            self.world_y = new_world_y_center
-        else:
-            self.world_y = new_world_y_center
-        
+        # --- Axis-separated swept collision ---
+        # Each axis is swept through every tile its leading edge crosses, so large dt or
+        # speed values stop at the first wall instead of tunnelling through it.
         half_w, half_h = self.width / 2, self.height / 2
+        moved_x, _ = game_map.sweep_box(self.world_x - half_w, self.world_y - half_h,
+                                        self.width, self.height, delta_x, "x")
+        self.world_x += moved_x
+        moved_y, _ = game_map.sweep_box(self.world_x - half_w, self.world_y - half_h,
+                                        self.width, self.height, delta_y, "y")
+        self.world_y += moved_y
+
         self.world_x = max(half_w, min(self.world_x, game_map.full_map_pixel_width - half_w))
         self.world_y = max(half_h, min(self.world_y, game_map.full_map_pixel_height - half_h))
         self.rect.center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
@@ -121,11 +132,29 @@ class Player(pygame.sprite.Sprite):
     def set_movement_direction(self, input_direction_vector):
         self.direction = input_direction_vector
 
+    def store_previous_position(self):
+        """Call before each simulation step so rendering can interpolate across it."""
+        self.previous_world_x = self.world_x
+        self.previous_world_y = self.world_y
+
+    def get_interpolated_position(self, alpha):
+        """World position alpha (0..1) of the way from the previous step to the current one."""
+        return (self.previous_world_x + (self.world_x - self.previous_world_x) * alpha,
+                self.previous_world_y + (self.world_y - self.previous_world_y) * alpha)
+
 # --- Objective Manager (MODIFIED for Random Objectives) ---
 class ObjectiveManager:
     NUM_OBJECTIVES_TO_COMPLETE = 5 # How many random destinations to visit
-
-    def __init__(self, all_destination_objects_list):
+    ORDER_RANDOM = "random"
+    ORDER_ROUTE = "route" # Sequence the objectives as a short walking tour (route_planner.py)
+
+    def __init__(self, all_destination_objects_list, ordering=ORDER_RANDOM, start_distance=None, distance=None,
+                 max_tour_length=None):
+        """
+        For ORDER_ROUTE, start_distance(dest) and distance(dest_a, dest_b) give walking
+        distances (math.inf if unreachable) from the spawn point and between destinations,
+        and max_tour_length optionally caps the length of the whole tour in the same units.
+        """
         # Filter out destinations with missing coordinates from the main pool
         self.full_destination_pool = [
             d for d in all_destination_objects_list 
@@ -135,8 +164,14 @@ class ObjectiveManager:
         self.game_objectives = [] # The N destinations chosen for this game session
         self.current_objective_idx_in_game_list = -1 # Tracks progress through self.game_objectives
         self.current_target_destination = None
-        
-        self._select_random_objectives()
+        self.tour_length = None # Planned walking length of the session (route ordering only)
+
+        if ordering == self.ORDER_ROUTE and start_distance is not None and distance is not None:
+            self._select_route_objectives(start_distance, distance, max_tour_length)
+        else:
+            if ordering == self.ORDER_ROUTE:
+                print("Warning: Route ordering needs walking distances. Using random objectives.")
+            self._select_random_objectives()
         self.set_next_objective() # Set the first objective
 
     def _select_random_objectives(self):
@@ -162,6 +197,33 @@ class ObjectiveManager:
         else:
             print("Warning: Could not select any objectives for this session.")
 
+    def _select_route_objectives(self, start_distance, distance, max_tour_length):
+        # Destinations that can't be walked to from the spawn point can't be part of the tour
+        reachable = [d for d in self.full_destination_pool if not math.isinf(start_distance(d))]
+        if not reachable:
+            print("Warning: No reachable destinations available to select for objectives.")
+            self.game_objectives = []
+            return
+
+        if max_tour_length is not None:
+            self.game_objectives = select_route_under_length(
+                reachable, start_distance, distance, self.NUM_OBJECTIVES_TO_COMPLETE, max_tour_length)
+        else:
+            chosen = random.sample(reachable, min(len(reachable), self.NUM_OBJECTIVES_TO_COMPLETE))
+            self.game_objectives = plan_route(chosen, start_distance, distance)
+        self.tour_length = tour_length(self.game_objectives, start_distance, distance)
+
+        for dest in self.game_objectives:
+            dest.visited = False 
+            dest.set_active_target(False)
+
+        if self.game_objectives:
+            print(f"Planned a tour of {len(self.game_objectives)} objectives for this session:")
+            for i, dest in enumerate(self.game_objectives):
+                print(f"  {i+1}. {dest.name}")
+        else:
+            print("Warning: No objectives fit within the maximum tour length.")
+
     def set_next_objective(self):
         if self.current_target_destination:
             self.current_target_destination.set_active_target(False)
@@ -201,6 +263,24 @@ class ObjectiveManager:
                 return False
         return True
 
+def walking_distance_functions(game_map, distance_table, spawn_world_x, spawn_world_y):
+    """
+    Returns (start_distance(dest), distance(dest_a, dest_b)) for route ordering, in world pixels.
+    Distances from the spawn tile come from one Dijkstra; distances between destinations from the table.
+    """
+    spawn_tile = (int(spawn_world_x // game_map.tile_pixel_width), int(spawn_world_y // game_map.tile_pixel_height))
+    spawn_distances, _ = game_map.get_pathfinder().distance_field([spawn_tile])
+
+    def start_distance(dest):
+        tile_x, tile_y = distance_table.destination_tiles[distance_table.index_by_id[dest.id]]
+        return spawn_distances[tile_y * game_map.grid_width_in_tiles + tile_x] * game_map.tile_pixel_width
+
+    def distance(dest_a, dest_b):
+        tiles = distance_table.distance(dest_a.id, dest_b.id)
+        return math.inf if tiles is None else tiles * game_map.tile_pixel_width
+
+    return start_distance, distance
+
 # --- Main Function ---
 def main():
     pygame.init()
@@ -223,16 +303,18 @@ def main():
         print("Warning: Default font not found, using system Arial.")
         ui_font = pygame.font.SysFont("arial", 30)
         info_font = pygame.font.SysFont("arial", 24)
+    profiler_font = pygame.font.SysFont("monospace", 14) # Fixed width keeps the profiler columns aligned
 
     game_map = Map(screen, "tiles")
+    game_map.background_color = WHITE
     
     if not game_map.is_loaded_successfully():
         print("CRITICAL ERROR: Map data failed to load. Check 'tiles/map_meta.json' and tile image paths.")
         pygame.quit()
         sys.exit()
     print(f"Debug: Map loaded. Grid: {game_map.grid_width_in_tiles}x{game_map.grid_height_in_tiles}.")
-    if game_map.collision_grid and len(game_map.collision_grid) > 0 :
-        print(f"Collision grid rows: {len(game_map.collision_grid)}, cols: {len(game_map.collision_grid[0])}")
+    if game_map.collision_grid:
+        print(f"Collision grid rows: {game_map.collision_grid.height}, cols: {game_map.collision_grid.width}")
     else:
         print("CRITICAL WARNING: Collision grid is empty or not loaded in game_map!")
 
@@ -241,43 +323,14 @@ def main():
     initial_player_world_y = game_map.full_map_pixel_height / 2
 
     if game_map.grid_width_in_tiles > 0 and game_map.grid_height_in_tiles > 0 and \
-       game_map.collision_grid and len(game_map.collision_grid) > 0:
+       game_map.collision_grid:
         preferred_start_tile_x = game_map.grid_width_in_tiles - 1
         preferred_start_tile_y = 0 
         print(f"Debug: Preferred start tile index for search: ({preferred_start_tile_x}, {preferred_start_tile_y})")
 
-        found_tile_coords = None
-        max_search_radius = max(game_map.grid_width_in_tiles, game_map.grid_height_in_tiles) 
+        # O(1) lookup in the precomputed nearest-walkable field (cached next to map_meta.json)
+        found_tile_coords = game_map.find_nearest_walkable_tile(preferred_start_tile_x, preferred_start_tile_y)
 
-        if game_map.is_tile_walkable(preferred_start_tile_x, preferred_start_tile_y):
-            found_tile_coords = (preferred_start_tile_x, preferred_start_tile_y)
-        else:
-            for r_search in range(1, max_search_radius):
-                # Top edge
-                check_y = preferred_start_tile_y - r_search
-                for x_offset in range(-r_search, r_search + 1):
-                    check_x = preferred_start_tile_x + x_offset
-                    if game_map.is_tile_walkable(check_x, check_y): found_tile_coords = (check_x, check_y); break
-                if found_tile_coords: break
-                # Bottom edge
-                check_y = preferred_start_tile_y + r_search
-                for x_offset in range(-r_search, r_search + 1):
-                    check_x = preferred_start_tile_x + x_offset
-                    if game_map.is_tile_walkable(check_x, check_y): found_tile_coords = (check_x, check_y); break
-                if found_tile_coords: break
-                # Left edge
-                check_x = preferred_start_tile_x - r_search
-                for y_offset in range(-r_search + 1, r_search):
-                    check_y = preferred_start_tile_y + y_offset
-                    if game_map.is_tile_walkable(check_x, check_y): found_tile_coords = (check_x, check_y); break
-                if found_tile_coords: break
-                # Right edge
-                check_x = preferred_start_tile_x + r_search
-                for y_offset in range(-r_search + 1, r_search):
-                    check_y = preferred_start_tile_y + y_offset
-                    if game_map.is_tile_walkable(check_x, check_y): found_tile_coords = (check_x, check_y); break
-                if found_tile_coords: break 
-            
         if found_tile_coords:
             start_tile_x, start_tile_y = found_tile_coords
             initial_player_world_x = (start_tile_x * game_map.tile_pixel_width) + (game_map.tile_pixel_width / 2)
@@ -297,28 +350,69 @@ def main():
         print("Warning: No destination data loaded. Game will have no interactive destinations.")
     for data in destinations_data:
         if data.get("world_x") is not None and data.get("world_y") is not None:
+            dest_world_x, dest_world_y = data["world_x"], data["world_y"]
+            # A destination placed inside a wall could never be reached; move it to the nearest walkable tile
+            snapped_position = game_map.snap_to_walkable(dest_world_x, dest_world_y)
+            if snapped_position and snapped_position != (dest_world_x, dest_world_y):
+                print(f"Note: Destination '{data['name']}' is inside a wall. Moved to the nearest walkable tile at ({snapped_position[0]:.0f}, {snapped_position[1]:.0f}).")
+                dest_world_x, dest_world_y = snapped_position
             dest = Destination(
                 id=data["id"], name=data["name"],
-                world_x=data["world_x"], world_y=data["world_y"],
+                world_x=dest_world_x, world_y=dest_world_y,
                 radius=data.get("radius", 30), # Defaulting to 30 if not specified
                 info_text=data.get("info_text", "No information available.")
             )
             destination_objects_list.append(dest)
         else:
             print(f"Warning: Destination '{data.get('name', 'Unknown')}' in destinations_data.py skipped due to missing coordinates.")
-    destinations_sprite_group = pygame.sprite.Group(destination_objects_list)
-    
-    objective_manager = ObjectiveManager(destination_objects_list)
+    destination_index = SpatialHash(cell_size=DESTINATION_INDEX_CELL_SIZE)
+    for dest in destination_objects_list:
+        destination_index.insert(dest, dest.world_x, dest.world_y, dest.radius)
+    # Destinations keep a fixed on-screen size, so at low zoom they cover more of the world
+    max_destination_radius = max((dest.radius for dest in destination_objects_list), default=0)
+    visible_destinations_group = pygame.sprite.Group() # Refilled every frame from destination_index
+
+    # Walking distances and routes between destinations, cached in tiles/distance_table.bin
+    # (build it offline with: python distance_table.py)
+    distance_table = None
+    if game_map.collision_grid and destination_objects_list:
+        distance_table = DistanceTable.load_or_build(
+            game_map.collision_grid,
+            [dest.id for dest in destination_objects_list],
+            destination_tiles_for([(dest.world_x, dest.world_y) for dest in destination_objects_list],
+                                  game_map.tile_pixel_width, game_map.tile_pixel_height,
+                                  game_map.get_nearest_walkable_field()),
+            game_map.tile_dir)
+
+    start_distance, distance = None, None
+    if OBJECTIVE_ORDERING == ObjectiveManager.ORDER_ROUTE and distance_table:
+        start_distance, distance = walking_distance_functions(game_map, distance_table, player.world_x, player.world_y)
+
+    objective_manager = ObjectiveManager(destination_objects_list, OBJECTIVE_ORDERING, start_distance, distance,
+                                         MAX_TOUR_LENGTH)
+    if objective_manager.tour_length is not None:
+        print(f"Planned tour length: {objective_manager.tour_length:.0f} world pixels")
     
     current_info_message = None
     info_message_timer = 0
     INFO_MESSAGE_DURATION = 5000 
 
     debug_draw_collision = False
+    show_route = False
+    route_waypoints = None # World-space route from the player to the current objective
+    route_key = None # (objective, player tile) the route was planned for
+    guidance_target = None # Objective the current flow field leads to
+    guidance_field = None # FlowField toward guidance_target (the distance table's, or from game_map's LRU)
+    text_cache = TextRenderCache(max_entries=32)
+    profiler = FrameProfiler(enabled=PROFILE_OVERLAY_AT_START, csv_path=PROFILE_CSV_PATH)
+    previous_dirty_rects = [] # Screen areas covered by sprites/UI last frame (dirty-rect mode)
+    simulation_accumulator = 0.0 # Rendered time not yet consumed by simulation steps
+    screen_rect = screen.get_rect()
 
     running = True
     while running:
-        dt = clock.tick(60) / 1000.0 
+        frame_dt = clock.tick(RENDER_FPS_CAP) / 1000.0
+        profiler.begin_frame()
         
         joystick_direction_input = pygame.math.Vector2(0, 0)
         for event in pygame.event.get():
@@ -328,6 +422,8 @@ def main():
                 elif event.key == pygame.K_EQUALS or event.key == pygame.K_PLUS: game_map.zoom(ZOOM_SPEED_MULTIPLIER, player.rect.centerx, player.rect.centery)
                 elif event.key == pygame.K_MINUS: game_map.zoom(1 / ZOOM_SPEED_MULTIPLIER, player.rect.centerx, player.rect.centery)
                 elif event.key == pygame.K_c: debug_draw_collision = not debug_draw_collision
+                elif event.key == pygame.K_r: show_route = not show_route
+                elif event.key == pygame.K_F3: profiler.toggle_overlay()
                 elif event.key == pygame.K_n: 
                     if objective_manager.current_target_destination and not objective_manager.current_target_destination.visited:
                          objective_manager.current_target_destination.mark_visited()
@@ -364,84 +460,184 @@ def main():
             player.set_movement_direction(joystick_direction_input)
         else:
             player.set_movement_direction(keyboard_direction)
-
-        player.update(dt, game_map) 
-        
-        for dest_sprite in destinations_sprite_group:
-            dest_sprite.update_screen_position(game_map)
-
-        target_dest = objective_manager.current_target_destination
-        if target_dest and not target_dest.visited:
-            dx = player.world_x - target_dest.world_x
-            dy = player.world_y - target_dest.world_y
-            player_effective_radius = player.width / 2 
-            if (dx*dx + dy*dy) < (target_dest.radius + player_effective_radius)**2:
-                target_dest.mark_visited()
-                current_info_message = f"{target_dest.name}: {target_dest.info_text}"
-                info_message_timer = pygame.time.get_ticks()
-                objective_manager.set_next_objective()
+        profiler.mark("events")
+
+        # Catch-up budget: time beyond MAX_SIMULATION_STEPS_PER_FRAME steps is dropped
+        simulation_accumulator = min(simulation_accumulator + frame_dt,
+                                     SIMULATION_STEP * MAX_SIMULATION_STEPS_PER_FRAME)
+        while simulation_accumulator >= SIMULATION_STEP:
+            player.store_previous_position()
+            player.update(SIMULATION_STEP, game_map)
+            profiler.mark("player_update")
+
+            target_dest = objective_manager.current_target_destination
+            if target_dest and not target_dest.visited:
+                dx = player.world_x - target_dest.world_x
+                dy = player.world_y - target_dest.world_y
+                player_effective_radius = player.width / 2 
+                if (dx*dx + dy*dy) < (target_dest.radius + player_effective_radius)**2:
+                    target_dest.mark_visited()
+                    current_info_message = f"{target_dest.name}: {target_dest.info_text}"
+                    info_message_timer = pygame.time.get_ticks()
+                    objective_manager.set_next_objective()
+            profiler.mark("destinations")
+            simulation_accumulator -= SIMULATION_STEP
+
+        # "You are near X" hint: the closest destination (other than the objective) in range
+        nearby_destination = None
+        nearest_distance_sq = None
+        for dest in destination_index.query_radius(player.world_x, player.world_y, NEARBY_HINT_DISTANCE):
+            if dest is objective_manager.current_target_destination:
+                continue
+            dx = player.world_x - dest.world_x
+            dy = player.world_y - dest.world_y
+            distance_sq = dx*dx + dy*dy
+            if distance_sq < (dest.radius + NEARBY_HINT_DISTANCE)**2 and \
+               (nearest_distance_sq is None or distance_sq < nearest_distance_sq):
+                nearby_destination = dest
+                nearest_distance_sq = distance_sq
+
+        # Destinations' fields come from the distance table, other goals cost one Dijkstra; after
+        # that the guidance arrow, breadcrumbs and route line are lookups
+        if objective_manager.current_target_destination is not guidance_target:
+            guidance_target = objective_manager.current_target_destination
+            guidance_field = None
+            if guidance_target:
+                guidance_field = game_map.get_flow_field(guidance_target.world_x, guidance_target.world_y,
+                                                         distance_table, guidance_target.id)
+
+        if show_route:
+            # Re-plan only when the objective changes or the player reaches another tile
+            target_dest = objective_manager.current_target_destination
+            player_tile = (int(player.world_x // game_map.tile_pixel_width), int(player.world_y // game_map.tile_pixel_height))
+            if (target_dest, player_tile) != route_key:
+                route_key = (target_dest, player_tile)
+                route_waypoints = None
+                if target_dest and not target_dest.visited:
+                    # Read the route off the guidance field; search only if it has none
+                    tile_path = guidance_field.route_from_tile(player_tile) if guidance_field else None
+                    if tile_path:
+                        route_waypoints = game_map.waypoints_from_tile_path(player.world_x, player.world_y,
+                                                                            target_dest.world_x, target_dest.world_y,
+                                                                            tile_path, player.width, player.height)
+                    else:
+                        route_waypoints = game_map.find_path(player.world_x, player.world_y,
+                                                             target_dest.world_x, target_dest.world_y,
+                                                             player.width, player.height)
 
         if current_info_message:
             if pygame.time.get_ticks() - info_message_timer > INFO_MESSAGE_DURATION:
                 current_info_message = None
+        profiler.mark("destinations")
         
-        game_map.offset_x = player.rect.centerx - (player.world_x * game_map.zoom_level)
-        game_map.offset_y = player.rect.centery - (player.world_y * game_map.zoom_level)
-
-        screen.fill(WHITE) 
-        game_map.draw(debug_draw_collision) 
-        destinations_sprite_group.draw(screen)
+        # The camera follows the player interpolated between the last two simulation steps
+        render_world_x, render_world_y = player.get_interpolated_position(simulation_accumulator / SIMULATION_STEP)
+        game_map.offset_x = player.rect.centerx - (render_world_x * game_map.zoom_level)
+        game_map.offset_y = player.rect.centery - (render_world_y * game_map.zoom_level)
+
+        if DIRTY_RECT_RENDERING:
+            if game_map.update_map_layer(debug_draw_collision) or not previous_dirty_rects:
+                # The camera moved (or this is the first frame): the whole screen changes
+                screen.blit(game_map.map_layer, (0, 0))
+                update_rects = [screen_rect]
+            else:
+                # Camera is still: restore the map under last frame's sprites and UI only
+                for rect in previous_dirty_rects:
+                    screen.blit(game_map.map_layer, rect, rect)
+                update_rects = list(previous_dirty_rects)
+        else:
+            screen.fill(WHITE) 
+            game_map.draw(debug_draw_collision) 
+        profiler.mark("map_draw")
+
+        # Only destinations from the index cells under the viewport are positioned and drawn
+        view_margin = max_destination_radius / game_map.zoom_level
+        view_left = -game_map.offset_x / game_map.zoom_level
+        view_top = -game_map.offset_y / game_map.zoom_level
+        visible_destinations_group.empty()
+        for dest_sprite in destination_index.query_rect(view_left - view_margin, view_top - view_margin,
+                                                        view_left + SCREEN_WIDTH / game_map.zoom_level + view_margin,
+                                                        view_top + SCREEN_HEIGHT / game_map.zoom_level + view_margin):
+            dest_sprite.update_screen_position(game_map)
+            if screen_rect.colliderect(dest_sprite.rect):
+                visible_destinations_group.add(dest_sprite)
+
+        dirty_rects = []
+        if show_route and route_waypoints and len(route_waypoints) >= 2:
+            route_points = [(game_map.offset_x + x * game_map.zoom_level, game_map.offset_y + y * game_map.zoom_level)
+                            for x, y in route_waypoints]
+            route_points[0] = player.rect.center # The route starts under the player sprite
+            dirty_rects.append(pygame.draw.lines(screen, ROUTE_COLOR, False, route_points, 3).clip(screen_rect))
+        visible_destinations_group.draw(screen)
+
+        guidance_direction = None
+        if guidance_field and guidance_target and not guidance_target.visited:
+            player_tile_x = int(player.world_x // game_map.tile_pixel_width)
+            player_tile_y = int(player.world_y // game_map.tile_pixel_height)
+            for tile_x, tile_y in guidance_field.trail(player_tile_x, player_tile_y, GUIDANCE_TRAIL_STEPS):
+                crumb_center = (game_map.offset_x + (tile_x + 0.5) * game_map.tile_pixel_width * game_map.zoom_level,
+                                game_map.offset_y + (tile_y + 0.5) * game_map.tile_pixel_height * game_map.zoom_level)
+                dirty_rects.append(pygame.draw.circle(screen, GUIDANCE_COLOR, crumb_center, 4).clip(screen_rect))
+            step = guidance_field.next_step(player_tile_x, player_tile_y)
+            if step:
+                guidance_direction = pygame.math.Vector2(step)
+            else: # Already on the goal tile (or cut off from it): point straight at the destination
+                guidance_direction = pygame.math.Vector2(guidance_target.world_x - player.world_x,
+                                                         guidance_target.world_y - player.world_y)
         all_sprites_group.draw(screen)
+        if guidance_direction and guidance_direction.length_squared() > 0:
+            guidance_direction.scale_to_length(1)
+            side = pygame.math.Vector2(-guidance_direction.y, guidance_direction.x)
+            center = pygame.math.Vector2(player.rect.center)
+            arrow_points = [center + guidance_direction * 32,
+                            center + guidance_direction * 20 + side * 7,
+                            center + guidance_direction * 20 - side * 7]
+            dirty_rects.append(pygame.draw.polygon(screen, GUIDANCE_COLOR, arrow_points).clip(screen_rect))
+        if DIRTY_RECT_RENDERING:
+            for sprite in visible_destinations_group:
+                dirty_rects.append(sprite.rect.copy())
+            dirty_rects.append(player.rect.copy())
+        profiler.mark("sprites")
         
-        obj_text_surface = ui_font.render(objective_manager.get_current_objective_text(), True, BLACK)
-        screen.blit(obj_text_surface, (20, 20))
+        # Text only changes a few times per session, so it comes pre-rendered from the cache
+        obj_text_surface = text_cache.render(ui_font, objective_manager.get_current_objective_text(), BLACK)
+        dirty_rects.append(screen.blit(obj_text_surface, (20, 20)))
+        if nearby_destination:
+            nearby_text_surface = text_cache.render(info_font, f"You are near: {nearby_destination.name}", BLACK)
+            dirty_rects.append(screen.blit(nearby_text_surface, (20, 24 + obj_text_surface.get_height())))
 
         if current_info_message:
-            max_width = SCREEN_WIDTH - 40
-            words = current_info_message.split(' ')
-            lines = []
-            current_line_text = ""
-            for word in words:
-                test_line_text = current_line_text + word + " "
-                if info_font.size(test_line_text)[0] <= max_width:
-                    current_line_text = test_line_text
-                else:
-                    lines.append(current_line_text)
-                    current_line_text = word + " "
-            lines.append(current_line_text)
-
-            num_lines = len(lines)
-            line_height = info_font.get_linesize()
-            total_text_height = num_lines * line_height
-            
-            padding = 10
-            info_bg_height = total_text_height + (2 * padding)
-            info_bg_width = max_width + (2 * padding) if lines else 2 * padding # Ensure some width even if no text
-            if lines: # Get width of longest line for better fitting background
-                actual_text_max_width = 0
-                for line_surf_text in lines:
-                    line_width = info_font.size(line_surf_text.strip())[0]
-                    if line_width > actual_text_max_width:
-                        actual_text_max_width = line_width
-                info_bg_width = actual_text_max_width + (2*padding)
-
-
-            info_bg_rect = pygame.Rect(0,0, info_bg_width, info_bg_height)
+            # Light grey background (the screen has no alpha channel) with a black border
+            info_panel_surface = text_cache.render_panel(info_font, current_info_message, SCREEN_WIDTH - 40,
+                                                         BLACK, (230, 230, 230), BLACK, padding=10)
+            info_bg_rect = info_panel_surface.get_rect()
             info_bg_rect.centerx = SCREEN_WIDTH / 2
             info_bg_rect.bottom = SCREEN_HEIGHT - 10
-            
-            pygame.draw.rect(screen, (230, 230, 230, 200), info_bg_rect) # Semi-transparent Light grey background
-            pygame.draw.rect(screen, BLACK, info_bg_rect, 1) 
-
-            for i, line_text in enumerate(lines):
-                info_surface = info_font.render(line_text.strip(), True, BLACK)
-                # Center each line of text within the background box
-                info_text_render_rect = info_surface.get_rect(centerx=info_bg_rect.centerx, 
-                                                              top=info_bg_rect.top + padding + i * line_height)
-                screen.blit(info_surface, info_text_render_rect)
-        
-        pygame.display.flip()
+            dirty_rects.append(screen.blit(info_panel_surface, info_bg_rect))
 
+        profiler_overlay_rect = profiler.draw_overlay(screen, profiler_font, position=(10, 90))
+        if profiler_overlay_rect:
+            dirty_rects.append(profiler_overlay_rect)
+        profiler.mark("text")
+        
+        if DIRTY_RECT_RENDERING:
+            update_rects.extend(dirty_rects)
+            pygame.display.update(update_rects)
+            previous_dirty_rects = dirty_rects
+        else:
+            pygame.display.flip()
+        profiler.mark("flip")
+
+        frame_counters = game_map.take_frame_counters()
+        # Sprite groups blit every member, plus the objective text and info panel
+        frame_counters["blits"] += len(visible_destinations_group) + len(all_sprites_group) + \
+                                   1 + (1 if nearby_destination else 0) + (1 if current_info_message else 0)
+        profiler.end_frame(frame_counters)
+
+    if game_map.prefetcher is not None:
+        print(f"Tile prefetch: {game_map.prefetch_hits} hits, {game_map.prefetch_misses} misses")
+    game_map.shutdown()
+    profiler.close()
     pygame.quit()
     if joysticks:
         pygame.joystick.quit()
@@ -0,0 +1,255 @@
+# map_binary.py
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from collision_grid import CollisionGrid
+
+# Binary form of map_meta.json, written next to it. Header: magic, format version, flags,
+# tile pixel width and height, grid width and height, number of levels (level 0 included),
+# number of unique tile names, then the byte offset and length of the tile name table
+# (newline separated UTF-8) and of the extras (JSON of every other metadata key).
+# The header is followed by one LEVEL_ENTRY per level, the collision plane (one byte per
+# cell, 0 = walkable, present if FLAG_COLLISION is set) and, per level, a plane of uint32
+# tile ids (row by row, NO_TILE where a tile failed). Everything is little endian.
+MAP_BINARY_FILENAME = "map_meta.bin"
+MAP_FILE_MAGIC = b"CNMB"
+MAP_FILE_VERSION = 1
+MAP_HEADER = struct.Struct("<4sHHIIIIIIQQQQ")
+LEVEL_ENTRY = struct.Struct("<IdIIQ") # level, scale, grid width, grid height, offset of the id plane
+FLAG_COLLISION = 1
+NO_TILE = 0xFFFFFFFF
+
+# Zoom range Map allows. Map draws the coarsest pyramid level whose scale is still at least
+# the zoom, so levels coarser than MIN_ZOOM_LEVEL are never drawn and the slicer stops there.
+MIN_ZOOM_LEVEL = 0.1
+MAX_ZOOM_LEVEL = 10.0
+
+# Metadata keys stored in the fixed sections; everything else goes into the extras
+_STRUCTURED_KEYS = {"tile_pixel_width", "tile_pixel_height", "grid_width_in_tiles", "grid_height_in_tiles",
+                    "tile_filenames_grid", "tile_id_grid", "tile_files", "pyramid_levels",
+                    "collision_grid_data"}
+
+class TileNameRow:
+    """One row of a TileNameGrid; row[col] is the tile name (or None)."""
+    def __init__(self, tile_ids, tile_files):
+        self.tile_ids = tile_ids
+        self.tile_files = tile_files
+
+    def __len__(self):
+        return len(self.tile_ids)
+
+    def __getitem__(self, col_idx):
+        tile_id = self.tile_ids[col_idx]
+        return None if tile_id == NO_TILE else self.tile_files[tile_id]
+
+class TileNameGrid:
+    """
+    Read-only grid of tile names backed by a flat plane of tile ids, indexed like the nested
+    lists of map_meta.json (grid[row_idx][col_idx]). Names are looked up only when read.
+    """
+    def __init__(self, tile_ids, width, height, tile_files):
+        self.tile_ids = tile_ids
+        self.width = width
+        self.height = height
+        self.tile_files = tile_files
+
+    def __len__(self):
+        return self.height
+
+    def __getitem__(self, row_idx):
+        if not 0 <= row_idx < self.height:
+            raise IndexError("tile row out of range")
+        start = row_idx * self.width
+        return TileNameRow(self.tile_ids[start:start + self.width], self.tile_files)
+
+    def to_id_rows(self):
+        """The grid as nested lists of tile ids, None where a tile failed (the JSON form)."""
+        return [[None if tile_id == NO_TILE else tile_id for tile_id in self.tile_ids[y * self.width:(y + 1) * self.width]]
+                for y in range(self.height)]
+
+def _id_plane(filenames_grid, width, height, tile_ids):
+    """Flat uint32 id plane of a grid of tile names, adding new names to tile_ids."""
+    plane = array('I', [NO_TILE]) * (width * height)
+    for y_idx, row in enumerate(filenames_grid[:height]):
+        for x_idx, tile_filename in enumerate(row[:width]):
+            if tile_filename:
+                plane[y_idx * width + x_idx] = tile_ids.setdefault(tile_filename, len(tile_ids))
+    return plane
+
+def expand_tile_ids(level_metadata, tile_files):
+    """The grid of tile names of one metadata level, from its "tile_id_grid" if it has one."""
+    if "tile_id_grid" not in level_metadata:
+        return level_metadata["tile_filenames_grid"]
+    return [[None if tile_id is None else tile_files[tile_id] for tile_id in row]
+            for row in level_metadata["tile_id_grid"]]
+
+def save_map_binary(metadata, path, collision_grid=None):
+    """
+    Writes map metadata (the dict stored in map_meta.json, old or deduplicated layout) as a
+    binary map file. collision_grid defaults to the one in metadata["collision_grid_data"].
+    """
+    if collision_grid is None:
+        collision_grid = CollisionGrid.from_rows(metadata.get("collision_grid_data") or [])
+    tile_files = metadata.get("tile_files")
+    levels = [{"level": 0, "scale": 1.0, "grid_width_in_tiles": metadata["grid_width_in_tiles"],
+               "grid_height_in_tiles": metadata["grid_height_in_tiles"],
+               "tile_filenames_grid": expand_tile_ids(metadata, tile_files)}]
+    for level in sorted(metadata.get("pyramid_levels", []), key=lambda lvl: lvl["level"]):
+        levels.append({**level, "tile_filenames_grid": expand_tile_ids(level, tile_files)})
+
+    tile_ids = {}
+    planes = [_id_plane(level["tile_filenames_grid"], level["grid_width_in_tiles"], level["grid_height_in_tiles"], tile_ids)
+              for level in levels]
+    names_blob = "\n".join(tile_ids).encode("utf-8") # Dicts keep insertion order, i.e. id order
+    extras_blob = json.dumps({key: value for key, value in metadata.items() if key not in _STRUCTURED_KEYS}).encode("utf-8")
+
+    collision_cells = bytes(collision_grid.cells) if collision_grid else b""
+    position = MAP_HEADER.size + LEVEL_ENTRY.size * len(levels) + len(collision_cells)
+    position += -position % 4 # Id planes start 4-byte aligned so they can be viewed as uint32 in place
+    level_entries = []
+    for level, plane in zip(levels, planes):
+        level_entries.append(LEVEL_ENTRY.pack(level["level"], level["scale"], level["grid_width_in_tiles"],
+                                              level["grid_height_in_tiles"], position))
+        position += len(plane) * plane.itemsize
+    names_offset = position
+    extras_offset = names_offset + len(names_blob)
+
+    flags = FLAG_COLLISION if collision_grid else 0
+    with open(path, 'wb') as f:
+        f.write(MAP_HEADER.pack(MAP_FILE_MAGIC, MAP_FILE_VERSION, flags,
+                                metadata["tile_pixel_width"], metadata["tile_pixel_height"],
+                                metadata["grid_width_in_tiles"], metadata["grid_height_in_tiles"],
+                                len(levels), len(tile_ids), names_offset, len(names_blob), extras_offset, len(extras_blob)))
+        f.writelines(level_entries)
+        f.write(collision_cells)
+        f.write(bytes(-f.tell() % 4))
+        for plane in planes:
+            if sys.byteorder == "big":
+                plane.byteswap()
+            f.write(plane.tobytes())
+        f.write(names_blob)
+        f.write(extras_blob)
+
+class MapBinary:
+    """
+    A binary map file opened with mmap. The header, level table, tile names and extras are
+    parsed on open; the collision plane and the tile id planes are read straight from the
+    mapping, without building Python objects per cell.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        data = memoryview(self._mapping)
+        if len(data) < MAP_HEADER.size:
+            raise ValueError("file is truncated")
+        (magic, version, flags, self.tile_pixel_width, self.tile_pixel_height, self.grid_width_in_tiles,
+         self.grid_height_in_tiles, level_count, tile_file_count,
+         names_offset, names_length, extras_offset, extras_length) = MAP_HEADER.unpack_from(data)
+        if magic != MAP_FILE_MAGIC or version != MAP_FILE_VERSION:
+            raise ValueError(f"not a version {MAP_FILE_VERSION} map file")
+        if names_offset + names_length > len(data) or extras_offset + extras_length > len(data):
+            raise ValueError("sections do not fit in the file")
+
+        names = bytes(data[names_offset:names_offset + names_length]).decode("utf-8")
+        self.tile_files = names.split("\n") if tile_file_count else []
+        if len(self.tile_files) != tile_file_count:
+            raise ValueError("tile name count does not match the header")
+        self.extras = json.loads(bytes(data[extras_offset:extras_offset + extras_length]).decode("utf-8"))
+
+        position = MAP_HEADER.size
+        self.levels = []
+        for _ in range(level_count):
+            level, scale, level_w, level_h, plane_offset = LEVEL_ENTRY.unpack_from(data, position)
+            position += LEVEL_ENTRY.size
+            plane_length = level_w * level_h * 4
+            if plane_offset % 4 or plane_offset + plane_length > len(data):
+                raise ValueError(f"tile id plane of level {level} does not fit in the file")
+            tile_ids = data[plane_offset:plane_offset + plane_length].cast('I')
+            if sys.byteorder == "big":
+                tile_ids = array('I', tile_ids)
+                tile_ids.byteswap()
+            self.levels.append({
+                "level": level,
+                "scale": scale,
+                "grid_width_in_tiles": level_w,
+                "grid_height_in_tiles": level_h,
+                "tile_filenames_grid": TileNameGrid(tile_ids, level_w, level_h, self.tile_files)
+            })
+        if not self.levels:
+            raise ValueError("file has no tile levels")
+
+        self._collision_offset = position
+        self._has_collision = bool(flags & FLAG_COLLISION)
+        if self._has_collision and position + self.grid_width_in_tiles * self.grid_height_in_tiles > len(data):
+            raise ValueError("collision plane does not fit in the file")
+
+    def collision_grid(self):
+        """The collision grid (a copy of the plane, so runtime edits never touch the file)."""
+        if not self._has_collision:
+            return CollisionGrid()
+        cell_count = self.grid_width_in_tiles * self.grid_height_in_tiles
+        cells = bytearray(self._mapping[self._collision_offset:self._collision_offset + cell_count])
+        return CollisionGrid(self.grid_width_in_tiles, self.grid_height_in_tiles, cells)
+
+    def to_metadata(self):
+        """The metadata as a map_meta.json dict (deduplicated layout), for export."""
+        metadata = {
+            "tile_pixel_width": self.tile_pixel_width,
+            "tile_pixel_height": self.tile_pixel_height,
+            "grid_width_in_tiles": self.grid_width_in_tiles,
+            "grid_height_in_tiles": self.grid_height_in_tiles,
+            "tile_id_grid": self.levels[0]["tile_filenames_grid"].to_id_rows(),
+            "pyramid_levels": [{**{key: value for key, value in level.items() if key != "tile_filenames_grid"},
+                                "tile_id_grid": level["tile_filenames_grid"].to_id_rows()}
+                               for level in self.levels[1:]],
+            "tile_files": list(self.tile_files),
+            "collision_grid_data": self.collision_grid().to_rows()
+        }
+        metadata.update(self.extras)
+        return metadata
+
+def is_binary_current(tile_directory, meta_filename="map_meta.json"):
+    """
+    True if tile_directory has a binary map file at least as new as the JSON metadata (or
+    no JSON at all), so it can be loaded instead of the JSON.
+    """
+    binary_path = os.path.join(tile_directory, MAP_BINARY_FILENAME)
+    json_path = os.path.join(tile_directory, meta_filename)
+    if not os.path.exists(binary_path):
+        return False
+    return not os.path.exists(json_path) or os.path.getmtime(binary_path) >= os.path.getmtime(json_path)
+
+if __name__ == "__main__":
+    # python map_binary.py [tiles_directory]           map_meta.json -> map_meta.bin
+    # python map_binary.py [tiles_directory] --export  map_meta.bin -> map_meta.json
+    arguments = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    tile_directory = arguments[0] if arguments else "tiles"
+    meta_path = os.path.join(tile_directory, "map_meta.json")
+    binary_path = os.path.join(tile_directory, MAP_BINARY_FILENAME)
+
+    if "--export" in sys.argv:
+        try:
+            metadata = MapBinary(binary_path).to_metadata()
+            with open(meta_path, 'w') as f:
+                json.dump(metadata, f, indent=4)
+        except (OSError, ValueError) as e:
+            print(f"Error exporting {binary_path}: {e}")
+            sys.exit(1)
+        print(f"Exported {binary_path} to {meta_path}")
+    else:
+        try:
+            with open(meta_path, 'r') as f:
+                metadata = json.load(f)
+        except (IOError, json.JSONDecodeError) as e:
+            print(f"Error reading metadata file {meta_path}: {e}")
+            sys.exit(1)
+        try:
+            save_map_binary(metadata, binary_path, CollisionGrid.from_metadata(metadata, tile_directory))
+        except (OSError, KeyError, TypeError, ValueError) as e:
+            print(f"Error writing {binary_path}: {e}")
+            sys.exit(1)
+        print(f"Wrote {binary_path} ({os.path.getsize(binary_path)} bytes, {os.path.getsize(meta_path)} as JSON)")
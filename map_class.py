@@ -2,20 +2,103 @@
 import pygame
 import os
 import json
+import math
+from collections import OrderedDict
+
+from tile_prefetcher import TilePrefetcher
+from collision_grid import CollisionGrid
+from nearest_walkable import NearestWalkableField
+from pathfinding import GridPathfinder
+from hierarchical_pathfinding import HierarchicalPathfinder
+from flow_field import FlowFieldCache
+from map_binary import MapBinary, MAP_BINARY_FILENAME, MIN_ZOOM_LEVEL, MAX_ZOOM_LEVEL, expand_tile_ids, is_binary_current
+
+# Memory budget (in bytes) for smoothscaled copies of tiles. Scaled tiles are
+# kept per zoom bucket so zooming in and out doesn't rescale every tile every frame.
+DEFAULT_SCALED_TILE_CACHE_BUDGET = 32 * 1024 * 1024
+
+# The map is drawn in square chunks of CHUNK_SIZE_IN_TILES x CHUNK_SIZE_IN_TILES tiles,
+# each composited once into a single surface per zoom bucket. Chunks that would be
+# larger than MAX_CHUNK_SURFACE_SIDE pixels (when zoomed far in) are drawn tile by tile.
+CHUNK_SIZE_IN_TILES = 8
+MAX_CHUNK_SURFACE_SIDE = 1024
+DEFAULT_CHUNK_CACHE_BUDGET = 48 * 1024 * 1024
+
+COLLISION_OVERLAY_COLOR = (255, 0, 0, 100) # Semi-transparent red for walls
+# Gap left between a moving box and the wall it stopped against, so float rounding
+# never leaves the box overlapping the wall tile on the next sweep
+COLLISION_SKIN = 0.01
+
+# Background tile loading: tiles the camera will reach within PREFETCH_LOOKAHEAD_FRAMES
+# (at its current pan and zoom speed) are decoded ahead of time. Tiles that are needed
+# before they finish loading are drawn as a flat placeholder instead of stalling the frame.
+DEFAULT_PREFETCH_WORKERS = 2
+PREFETCH_LOOKAHEAD_FRAMES = 30
+PLACEHOLDER_TILE_COLOR = (220, 220, 220)
+
+# Collision grids with at least this many cells (e.g. imported at 8px or 4px instead of
+# 32px) are searched hierarchically (HPA*) instead of with flat A* over every tile
+HIERARCHICAL_PATHFINDING_MIN_CELLS = 128 * 128
 
 class Map:
-    def __init__(self, screen, tile_directory):
+    def __init__(self, screen, tile_directory, scaled_tile_cache_budget=DEFAULT_SCALED_TILE_CACHE_BUDGET,
+                 chunk_cache_budget=DEFAULT_CHUNK_CACHE_BUDGET, prefetch_workers=DEFAULT_PREFETCH_WORKERS):
         self.screen = screen
         self.tile_dir = tile_directory
         self.tile_cache = {}  # Cache for loaded tile images (pygame.Surface objects)
 
+        # Background tile loader; with prefetch_workers=0 tiles are loaded synchronously on first draw
+        self.prefetcher = TilePrefetcher(tile_directory, prefetch_workers) if prefetch_workers > 0 else None
+        self.prefetch_hits = 0 # Tiles that were already decoded when first drawn
+        self.prefetch_misses = 0 # Tiles that had to be drawn as a placeholder first
+        self.tile_load_generation = 0 # Bumped whenever decoded tiles arrive from the prefetcher
+        self._prefetched_unused = set() # Decoded ahead of time and not drawn yet
+        self._tiles_waited_for = set() # Drawn as a placeholder while still decoding
+        self._placeholder_tile = None
+        self._drew_placeholder = False
+        self._last_camera = None # (offset_x, offset_y, zoom_level) at the previous prefetch update
+
+        # Per-frame counters for the frame profiler, read and reset by take_frame_counters()
+        self.blit_count = 0
+        self.tile_cache_hits = 0
+        self.tile_cache_misses = 0
+        self.chunk_cache_hits = 0
+        self.chunk_cache_misses = 0
+
+        # LRU cache of scaled tile surfaces, keyed by (tile_filename, zoom_bucket).
+        # Least recently drawn entries are evicted once the byte budget is exceeded.
+        self.scaled_tile_cache = OrderedDict()
+        self.scaled_tile_cache_budget = scaled_tile_cache_budget
+        self.scaled_tile_cache_bytes = 0
+
+        # LRU cache of pre-composited chunk surfaces, keyed by (level_index, chunk_col, chunk_row, zoom_bucket).
+        # Chunks are built lazily the first time they become visible.
+        self.chunk_cache = OrderedDict()
+        self.chunk_cache_budget = chunk_cache_budget
+        self.chunk_cache_bytes = 0
+        # Chunks composited while some of their tiles were still placeholders, mapped to the
+        # tile_load_generation they were built at. They are rebuilt once more tiles arrive.
+        self._incomplete_chunks = {}
+
         # Properties to be loaded from metadata
         self.tile_pixel_width = 0
         self.tile_pixel_height = 0
         self.grid_width_in_tiles = 0
         self.grid_height_in_tiles = 0
         self.tile_filenames_grid = [] # 2D list of tile filenames in correct order
-        self.collision_grid = [] # Will be loaded/updated
+        # Tile pyramid: index 0 is the full-resolution grid above, followed by the
+        # downscaled levels from convert_map_to_tiles.py (each a dict with "scale",
+        # "grid_width_in_tiles", "grid_height_in_tiles" and "tile_filenames_grid").
+        self.tile_levels = []
+        # Atlas output from convert_map_to_tiles.py: tile names map to rects inside a few
+        # large atlas images instead of separate PNG files.
+        self.tile_atlas_files = []
+        self.tile_atlas_index = {} # Tile name -> [atlas_number, x, y, width, height]
+        self.atlas_surfaces = {} # Atlas number -> loaded atlas image (pygame.Surface)
+        self.collision_grid = CollisionGrid() # Compact walkability grid, will be loaded/updated
+        # Bumped whenever collision_grid changes so cached debug overlays and fields get rebuilt
+        self.collision_grid_version = 0
+        self._loaded_collision_grid_version = 0
         self._loaded_successfully = False # <--- ADD THIS ATTRIBUTE
 
         self.load_map_metadata()
@@ -34,6 +117,30 @@ class Map:
         self.offset_x = 0  # Top-left corner of the map relative to the screen's top-left
         self.offset_y = 0
 
+        # Scroll-blit rendering (see update_map_layer): a screen-sized copy of the drawn map
+        # that is scrolled with the camera instead of being redrawn from scratch every frame.
+        self.background_color = (255, 255, 255) # Shown where the map doesn't cover the screen
+        self.map_layer = None
+        self._map_layer_offset = (0, 0)
+        self._map_layer_state = None
+        self._map_layer_has_placeholders = False
+        self._map_layer_generation = 0
+
+        # Collision debug overlay: one pixel per tile, built once from collision_grid, plus
+        # the most recent screen-sized scaled copy of its visible part.
+        self._collision_overlay = None
+        self._collision_overlay_version = -1
+        self._scaled_collision_overlay = None
+        self._scaled_collision_overlay_key = None
+
+        # Nearest-walkable-tile lookup, built (or read from its cache file) on first use
+        self._nearest_walkable_field = None
+        self._nearest_walkable_version = -1
+        self._pathfinder = None # GridPathfinder for collision_grid, created on first use
+        self._pathfinder_version = -1
+        self._hierarchical_pathfinder = None # HierarchicalPathfinder for large grids, created on first use
+        self.flow_fields = FlowFieldCache() # Per-goal walking directions for recently used goals
+
     # --- ADD THIS METHOD ---
     def is_loaded_successfully(self):
         return self._loaded_successfully
@@ -42,22 +149,39 @@ class Map:
     def load_map_metadata(self, meta_filename="map_meta.json"):
         meta_file_path = os.path.join(self.tile_dir, meta_filename)
         try:
-            with open(meta_file_path, 'r') as f:
-                metadata = json.load(f)
+            # The binary map file (if it is up to date) loads without parsing the JSON
+            if not self._load_map_binary(meta_filename):
+                with open(meta_file_path, 'r') as f:
+                    metadata = json.load(f)
 
-            self.tile_pixel_width = metadata["tile_pixel_width"]
-            self.tile_pixel_height = metadata["tile_pixel_height"]
-            self.grid_width_in_tiles = metadata["grid_width_in_tiles"]
-            self.grid_height_in_tiles = metadata["grid_height_in_tiles"]
-            self.tile_filenames_grid = metadata["tile_filenames_grid"]
-            self.collision_grid = metadata.get("collision_grid_data")
+                self.tile_pixel_width = metadata["tile_pixel_width"]
+                self.tile_pixel_height = metadata["tile_pixel_height"]
+                self.grid_width_in_tiles = metadata["grid_width_in_tiles"]
+                self.grid_height_in_tiles = metadata["grid_height_in_tiles"]
+                # Deduplicated metadata lists each unique tile once ("tile_files") and refers to it by
+                # index; expanding the ids to the shared names keeps one cached surface per unique tile
+                tile_files = metadata.get("tile_files")
+                self.tile_filenames_grid = expand_tile_ids(metadata, tile_files)
+                self.collision_grid = CollisionGrid.from_metadata(metadata, self.tile_dir)
+                self.tile_levels = [{
+                    "level": 0,
+                    "scale": 1.0,
+                    "grid_width_in_tiles": self.grid_width_in_tiles,
+                    "grid_height_in_tiles": self.grid_height_in_tiles,
+                    "tile_filenames_grid": self.tile_filenames_grid
+                }]
+                # Older metadata files have no pyramid; the map then always draws from level 0
+                for level in sorted(metadata.get("pyramid_levels", []), key=lambda lvl: lvl["level"]):
+                    level["tile_filenames_grid"] = expand_tile_ids(level, tile_files)
+                    self.tile_levels.append(level)
+                self.tile_atlas_files = metadata.get("tile_atlases", [])
+                self.tile_atlas_index = metadata.get("tile_atlas_index", {})
 
-            if not self.collision_grid: # Check if collision_grid is None or empty
+            if not self.collision_grid: # Check if collision_grid is missing or empty
                 print("Warning: 'collision_grid_data' not found or is empty in metadata.")
                 # If you are using tiled_importer.py, this should be populated.
                 # If it's critical and missing, you might not want to default to all walkable.
-                # For now, let's make it an empty grid if missing, error will be caught below.
-                self.collision_grid = []
+                # An empty grid treats every tile as unwalkable.
 
             # More robust check for essential data
             if not all([
@@ -66,7 +190,6 @@ class Map:
                 self.grid_width_in_tiles > 0,
                 self.grid_height_in_tiles > 0,
                 self.tile_filenames_grid, # Check if it's not empty
-                isinstance(self.collision_grid, list) # Check if it's a list (even if empty, to be checked later)
             ]):
                 # Don't raise ValueError here, instead set _loaded_successfully to False
                 print("Error: Metadata is missing essential information or has invalid values.")
@@ -75,26 +198,28 @@ class Map:
 
             # Check if collision grid dimensions match map dimensions (if collision grid is not empty)
             if self.collision_grid and \
-               (len(self.collision_grid) != self.grid_height_in_tiles or \
-                (self.grid_height_in_tiles > 0 and len(self.collision_grid[0]) != self.grid_width_in_tiles)):
+               (self.collision_grid.height != self.grid_height_in_tiles or \
+                self.collision_grid.width != self.grid_width_in_tiles):
                 print("Error: Collision grid dimensions do not match map grid dimensions.")
                 self._loaded_successfully = False
                 return
 
             print(f"Map metadata loaded: Grid {self.grid_width_in_tiles}x{self.grid_height_in_tiles}, Tile Size: {self.tile_pixel_width}x{self.tile_pixel_height}px")
-            if self.collision_grid and len(self.collision_grid) > 0: # Check if collision_grid is not empty before accessing its dimensions
-                print(f"Collision grid loaded with dimensions: {len(self.collision_grid)}x{len(self.collision_grid[0])}")
-            elif not self.collision_grid: # Specifically if it's an empty list after .get() and our assignment
+            if self.collision_grid:
+                print(f"Collision grid loaded with dimensions: {self.collision_grid.height}x{self.collision_grid.width}")
+            else:
                  print("Warning: Collision grid is present but empty. Player may not collide correctly.")
 
 
             self._loaded_successfully = True # <--- SET TO TRUE ON SUCCESSFUL LOAD
+            self.collision_grid_version += 1
+            self._loaded_collision_grid_version = self.collision_grid_version # Grid as stored on disk
 
         except FileNotFoundError:
             print(f"Error: Metadata file '{meta_file_path}' not found in '{self.tile_dir}'.")
             print("Ensure 'map_meta.json' exists. Run tile generation and Tiled import scripts.")
             self._loaded_successfully = False
-        except (json.JSONDecodeError, KeyError, TypeError) as e: # Added TypeError for metadata access
+        except (json.JSONDecodeError, KeyError, IndexError, TypeError, ValueError) as e: # Added TypeError for metadata access
             print(f"Error parsing metadata file '{meta_file_path}' or accessing key: {e}")
             self._loaded_successfully = False
         
@@ -105,25 +230,238 @@ class Map:
             self.grid_width_in_tiles = 0
             self.grid_height_in_tiles = 0
             self.tile_filenames_grid = []
-            self.collision_grid = []
+            self.tile_levels = []
+            self.tile_atlas_files = []
+            self.tile_atlas_index = {}
+            self.collision_grid = CollisionGrid()
+
+    def _load_map_binary(self, meta_filename):
+        """
+        Loads the map from MAP_BINARY_FILENAME if it is at least as new as the JSON metadata.
+        The tile grids stay views into the memory-mapped file. Returns False (so the JSON is
+        used) if there is no usable binary file.
+        """
+        if not is_binary_current(self.tile_dir, meta_filename):
+            return False
+        binary_path = os.path.join(self.tile_dir, MAP_BINARY_FILENAME)
+        try:
+            map_binary = MapBinary(binary_path)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read binary map file '{binary_path}': {e}. Using '{meta_filename}'.")
+            return False
+        self.tile_pixel_width = map_binary.tile_pixel_width
+        self.tile_pixel_height = map_binary.tile_pixel_height
+        self.grid_width_in_tiles = map_binary.grid_width_in_tiles
+        self.grid_height_in_tiles = map_binary.grid_height_in_tiles
+        self.tile_levels = map_binary.levels
+        self.tile_filenames_grid = self.tile_levels[0]["tile_filenames_grid"]
+        self.collision_grid = map_binary.collision_grid()
+        self.tile_atlas_files = map_binary.extras.get("tile_atlases", [])
+        self.tile_atlas_index = map_binary.extras.get("tile_atlas_index", {})
+        print(f"Loaded binary map file '{binary_path}'")
+        return True
 
+    def set_tile_walkable(self, tile_x_idx, tile_y_idx, walkable):
+        """Updates one cell of the collision grid and invalidates anything derived from it."""
+        if self.collision_grid.set_walkable(tile_x_idx, tile_y_idx, walkable):
+            self.collision_grid_version += 1
+            if self._hierarchical_pathfinder is not None and self._hierarchical_pathfinder.grid is self.collision_grid:
+                self._hierarchical_pathfinder.update_tiles([(tile_x_idx, tile_y_idx)]) # Only the sectors around this tile
 
     def is_tile_walkable(self, tile_x_idx, tile_y_idx):
         """Checks if a tile at given grid indices is walkable."""
-        if not self._loaded_successfully or not self.collision_grid:
-            # print("Debug: is_tile_walkable called but map not loaded or no collision_grid. Defaulting to False (unwalkable).")
-            return False 
+        # Out of bounds, or no collision grid loaded (an empty grid), is not walkable
+        return self.collision_grid.is_walkable(tile_x_idx, tile_y_idx)
+
+    def get_nearest_walkable_field(self):
+        """
+        Returns the NearestWalkableField for the current collision grid. The first call reads
+        it from the cache next to map_meta.json (or builds and saves it); runtime edits made
+        with set_tile_walkable rebuild it in memory only.
+        """
+        if self._nearest_walkable_version != self.collision_grid_version:
+            if self.collision_grid_version == self._loaded_collision_grid_version:
+                self._nearest_walkable_field = NearestWalkableField.load_or_build(self.collision_grid, self.tile_dir)
+            else:
+                self._nearest_walkable_field = NearestWalkableField.build(self.collision_grid)
+            self._nearest_walkable_version = self.collision_grid_version
+        return self._nearest_walkable_field
+
+    def find_nearest_walkable_tile(self, tile_x_idx, tile_y_idx):
+        """Returns (tile_x, tile_y) of the walkable tile nearest to the given one, or None."""
+        return self.get_nearest_walkable_field().nearest(tile_x_idx, tile_y_idx)
+
+    def snap_to_walkable(self, world_x, world_y):
+        """
+        Returns a world position that is on a walkable tile: the position itself if it already
+        is, otherwise the centre of the nearest walkable tile. Returns None if there is none.
+        """
+        if self.tile_pixel_width <= 0 or self.tile_pixel_height <= 0:
+            return None
+        tile_x_idx = math.floor(world_x / self.tile_pixel_width)
+        tile_y_idx = math.floor(world_y / self.tile_pixel_height)
+        if self.is_tile_walkable(tile_x_idx, tile_y_idx):
+            return world_x, world_y
+        nearest_tile = self.find_nearest_walkable_tile(tile_x_idx, tile_y_idx)
+        if nearest_tile is None:
+            return None
+        return ((nearest_tile[0] + 0.5) * self.tile_pixel_width,
+                (nearest_tile[1] + 0.5) * self.tile_pixel_height)
+
+    def get_pathfinder(self):
+        """Returns the GridPathfinder for the current collision grid (its buffers are reused)."""
+        if self._pathfinder is None or self._pathfinder.grid is not self.collision_grid:
+            self._pathfinder = GridPathfinder(self.collision_grid)
+            self._pathfinder_version = self.collision_grid_version
+        elif self._pathfinder_version != self.collision_grid_version:
+            self._pathfinder.refresh()
+            self._pathfinder_version = self.collision_grid_version
+        return self._pathfinder
+
+    def get_hierarchical_pathfinder(self):
+        """Returns the HierarchicalPathfinder for the current collision grid, building it on first use."""
+        if self._hierarchical_pathfinder is None or self._hierarchical_pathfinder.grid is not self.collision_grid:
+            self._hierarchical_pathfinder = HierarchicalPathfinder(self.collision_grid)
+        return self._hierarchical_pathfinder
+
+    def get_flow_field(self, goal_x, goal_y, distance_table=None, destination_id=None):
+        """
+        Returns the FlowField toward the tile containing a world position (moved to the nearest
+        walkable tile if it is inside a wall), or None if there is no walkable tile. When the
+        goal is destination_id of a DistanceTable built for the current collision grid, the
+        table's stored field is used; other fields for recent goals are cached, so switching
+        back to a goal costs nothing.
+        """
+        if distance_table is not None and destination_id in distance_table.index_by_id and \
+           distance_table.grid_hash == self.collision_grid.content_hash():
+            field = distance_table.flow_field(destination_id)
+            if field is not None:
+                return field
+        snapped_goal = self.snap_to_walkable(goal_x, goal_y)
+        if snapped_goal is None:
+            return None
+        goal_tile = (math.floor(snapped_goal[0] / self.tile_pixel_width), math.floor(snapped_goal[1] / self.tile_pixel_height))
+        return self.flow_fields.get(self.get_pathfinder(), goal_tile, self.collision_grid_version)
 
-        if 0 <= tile_y_idx < len(self.collision_grid) and \
-           0 <= tile_x_idx < len(self.collision_grid[0]):
-            return self.collision_grid[tile_y_idx][tile_x_idx] == 0 # 0 means walkable
-        return False # Out of bounds is not walkable
+    def find_path(self, start_x, start_y, goal_x, goal_y, clearance_width=0, clearance_height=0, smooth=True):
+        """
+        Plans a route between two world positions and returns it as a list of world-space
+        waypoints, starting at the start position and ending at the goal, or None if there is
+        no route. Ends inside walls are moved to the nearest walkable tile first. With smooth,
+        waypoints are dropped wherever a box of clearance_width x clearance_height pixels can
+        travel straight between the remaining ones.
+        """
+        if self.tile_pixel_width <= 0 or self.tile_pixel_height <= 0:
+            return None
+        snapped_start = self.snap_to_walkable(start_x, start_y)
+        snapped_goal = self.snap_to_walkable(goal_x, goal_y)
+        if snapped_start is None or snapped_goal is None:
+            return None
+        start_tile = (math.floor(snapped_start[0] / self.tile_pixel_width), math.floor(snapped_start[1] / self.tile_pixel_height))
+        goal_tile = (math.floor(snapped_goal[0] / self.tile_pixel_width), math.floor(snapped_goal[1] / self.tile_pixel_height))
+
+        tile_path = None
+        if self.collision_grid.width * self.collision_grid.height >= HIERARCHICAL_PATHFINDING_MIN_CELLS:
+            tile_path = self.get_hierarchical_pathfinder().find_path(start_tile, goal_tile)
+        if tile_path is None:
+            # Small grid, or the abstract graph missed a route (e.g. one that only crosses
+            # between sectors diagonally at a corner): search the full grid
+            pathfinder = self.get_pathfinder()
+            if pathfinder.is_reachable(start_tile, goal_tile):
+                tile_path = pathfinder.find_path(start_tile, goal_tile)
+        if tile_path is None:
+            return None
+        return self.waypoints_from_tile_path(start_x, start_y, snapped_goal[0], snapped_goal[1], tile_path,
+                                             clearance_width, clearance_height, smooth)
+
+    def waypoints_from_tile_path(self, start_x, start_y, goal_x, goal_y, tile_path,
+                                 clearance_width=0, clearance_height=0, smooth=True):
+        """
+        Turns a tile path (e.g. from find_path or a DistanceTable route) into world-space
+        waypoints from (start_x, start_y) to (goal_x, goal_y) through the centres of the tiles
+        in between, smoothed as described in find_path.
+        """
+        pathfinder = self.get_pathfinder()
+        snapped_start = self.snap_to_walkable(start_x, start_y) or (start_x, start_y)
+        # Plan in tile units: tile centres in between, the exact positions at the ends
+        points = [(snapped_start[0] / self.tile_pixel_width, snapped_start[1] / self.tile_pixel_height)]
+        points.extend((tile_x + 0.5, tile_y + 0.5) for tile_x, tile_y in tile_path[1:-1])
+        points.append((goal_x / self.tile_pixel_width, goal_y / self.tile_pixel_height))
+        if smooth:
+            points = pathfinder.smooth_path(points, clearance_width / 2 / self.tile_pixel_width,
+                                            clearance_height / 2 / self.tile_pixel_height)
+
+        waypoints = [(x * self.tile_pixel_width, y * self.tile_pixel_height) for x, y in points]
+        waypoints[0] = (start_x, start_y)
+        if snapped_start != (start_x, start_y):
+            waypoints.insert(1, snapped_start)
+        return waypoints
+
+    def sweep_box(self, left, top, width, height, delta, axis):
+        """
+        Moves the box (left, top, width, height) by delta along one axis ("x" or "y") and
+        returns how far it can actually go before hitting an unwalkable tile, plus whether it
+        was blocked. Only the tile columns (or rows) the leading edge crosses are tested, one
+        line at a time in the order they are reached, so a move of any length can't skip
+        over a wall. Tiles the box already overlaps are ignored, so it can always back out.
+        """
+        if delta == 0:
+            return 0.0, False
+        if axis == "x":
+            tile_size, cross_tile_size = self.tile_pixel_width, self.tile_pixel_height
+            lead_min, lead_size, cross_min, cross_size = left, width, top, height
+        else:
+            tile_size, cross_tile_size = self.tile_pixel_height, self.tile_pixel_width
+            lead_min, lead_size, cross_min, cross_size = top, height, left, width
+
+        # Tiles are half-open: the box covers lines floor(min / size) .. ceil(max / size) - 1
+        first_cross = math.floor(cross_min / cross_tile_size)
+        end_cross = max(first_cross + 1, math.ceil((cross_min + cross_size) / cross_tile_size))
+
+        if delta > 0:
+            lead_edge = lead_min + lead_size
+            lines = range(math.ceil(lead_edge / tile_size), math.ceil((lead_edge + delta) / tile_size))
+        else:
+            lead_edge = lead_min
+            lines = range(math.floor(lead_edge / tile_size) - 1, math.floor((lead_edge + delta) / tile_size) - 1, -1)
+
+        for line in lines:
+            if axis == "x":
+                coords = [(line, cross) for cross in range(first_cross, end_cross)]
+            else:
+                coords = [(cross, line) for cross in range(first_cross, end_cross)]
+            if not all(self.collision_grid.walkable_many(coords)):
+                if delta > 0:
+                    allowed = line * tile_size - COLLISION_SKIN - lead_edge
+                else:
+                    allowed = (line + 1) * tile_size + COLLISION_SKIN - lead_edge
+                # Never push the box backwards (it may already sit inside the skin)
+                return (max(0.0, allowed) if delta > 0 else min(0.0, allowed)), True
+        return delta, False
 
     def get_tile_image(self, tile_filename):
-        """Loads a tile image if not cached, then returns it. Handles transparency."""
+        """
+        Loads a tile image if not cached, then returns it. Handles transparency.
+        With background loading enabled, a tile that hasn't been decoded yet is queued on
+        the prefetcher and the placeholder tile is returned for now.
+        """
         if not tile_filename: # Can happen if a tile failed to save/process
             return None
+        if tile_filename in self._prefetched_unused:
+            self._prefetched_unused.discard(tile_filename)
+            self.prefetch_hits += 1
         if tile_filename not in self.tile_cache:
+            atlas_entry = self.tile_atlas_index.get(tile_filename)
+            if atlas_entry is not None:
+                self.tile_cache[tile_filename] = self._get_atlas_tile(atlas_entry)
+                return self.tile_cache[tile_filename]
+            if self.prefetcher is not None:
+                if tile_filename not in self._tiles_waited_for:
+                    self._tiles_waited_for.add(tile_filename)
+                    self.prefetch_misses += 1
+                self.prefetcher.request(tile_filename)
+                self._drew_placeholder = True
+                return self.get_placeholder_tile()
             try:
                 tile_path = os.path.join(self.tile_dir, tile_filename)
                 image = pygame.image.load(tile_path).convert_alpha()
@@ -133,54 +471,481 @@ class Map:
                 self.tile_cache[tile_filename] = None 
         return self.tile_cache[tile_filename]
 
+    def get_placeholder_tile(self):
+        """Returns the flat surface drawn in place of tiles that are still loading."""
+        if self._placeholder_tile is None:
+            self._placeholder_tile = pygame.Surface((self.tile_pixel_width, self.tile_pixel_height)).convert_alpha()
+            self._placeholder_tile.fill(PLACEHOLDER_TILE_COLOR)
+        return self._placeholder_tile
+
+    def is_tile_ready(self, tile_filename):
+        """True if the tile can be drawn for real (loaded, failed, or empty), not as a placeholder."""
+        return not tile_filename or tile_filename in self.tile_cache
+
+    def update_prefetch(self):
+        """
+        Moves tiles decoded by the background workers into tile_cache, then queues the tiles
+        around the part of the map the camera is heading towards. Called once per frame.
+        """
+        if self.prefetcher is None or not self._loaded_successfully:
+            return
+
+        finished = self.prefetcher.collect_finished()
+        if finished:
+            for tile_filename, image in finished:
+                self.tile_cache[tile_filename] = image.convert_alpha() if image is not None else None
+                if tile_filename in self._tiles_waited_for:
+                    self._tiles_waited_for.discard(tile_filename)
+                else:
+                    self._prefetched_unused.add(tile_filename)
+            self.tile_load_generation += 1
+
+        camera = (self.offset_x, self.offset_y, self.zoom_level)
+        previous_camera = self._last_camera
+        self._last_camera = camera
+        if previous_camera == camera or self.zoom_level <= 0:
+            return
+        if previous_camera is None:
+            previous_camera = camera
+
+        # Visible world area now, and where the current pan/zoom speed takes it
+        screen_width, screen_height = self.screen.get_size()
+        pan_x = (camera[0] - previous_camera[0]) * PREFETCH_LOOKAHEAD_FRAMES
+        pan_y = (camera[1] - previous_camera[1]) * PREFETCH_LOOKAHEAD_FRAMES
+        zoom_ratio = (camera[2] / previous_camera[2]) if previous_camera[2] > 0 else 1.0
+        predicted_zoom = max(MIN_ZOOM_LEVEL, min(self.zoom_level * zoom_ratio ** PREFETCH_LOOKAHEAD_FRAMES, MAX_ZOOM_LEVEL))
+
+        view_left = -self.offset_x / self.zoom_level
+        view_top = -self.offset_y / self.zoom_level
+        view_right = view_left + screen_width / self.zoom_level
+        view_bottom = view_top + screen_height / self.zoom_level
+
+        center_x = (view_left + view_right) / 2 - pan_x / self.zoom_level
+        center_y = (view_top + view_bottom) / 2 - pan_y / self.zoom_level
+        half_width = screen_width / predicted_zoom / 2
+        half_height = screen_height / predicted_zoom / 2
+
+        world_rect = (min(view_left, center_x - half_width), min(view_top, center_y - half_height),
+                      max(view_right, center_x + half_width), max(view_bottom, center_y + half_height))
+
+        for level_index in {self.select_pyramid_level(), self.select_pyramid_level(predicted_zoom)}:
+            self._request_tiles_in_world_rect(level_index, *world_rect)
+
+    def _request_tiles_in_world_rect(self, level_index, left, top, right, bottom):
+        level = self.tile_levels[level_index]
+        tile_world_width = self.tile_pixel_width / level["scale"]
+        tile_world_height = self.tile_pixel_height / level["scale"]
+        first_col = max(0, math.floor(left / tile_world_width))
+        end_col = min(level["grid_width_in_tiles"], math.ceil(right / tile_world_width))
+        first_row = max(0, math.floor(top / tile_world_height))
+        end_row = min(level["grid_height_in_tiles"], math.ceil(bottom / tile_world_height))
+        # Whole chunks are composited at once, so prefetch every tile of the chunks touched
+        first_col -= first_col % CHUNK_SIZE_IN_TILES
+        first_row -= first_row % CHUNK_SIZE_IN_TILES
+        end_col = min(level["grid_width_in_tiles"], -(-end_col // CHUNK_SIZE_IN_TILES) * CHUNK_SIZE_IN_TILES)
+        end_row = min(level["grid_height_in_tiles"], -(-end_row // CHUNK_SIZE_IN_TILES) * CHUNK_SIZE_IN_TILES)
+
+        for row_idx in range(first_row, end_row):
+            tile_row = level["tile_filenames_grid"][row_idx]
+            for col_idx in range(first_col, end_col):
+                tile_filename = tile_row[col_idx]
+                if tile_filename and tile_filename not in self.tile_cache and \
+                   tile_filename not in self.tile_atlas_index:
+                    self.prefetcher.request(tile_filename)
+
+    def take_frame_counters(self):
+        """Returns this frame's blit and cache counters as a dict and resets them."""
+        counters = {
+            "blits": self.blit_count,
+            "tile_cache_hits": self.tile_cache_hits,
+            "tile_cache_misses": self.tile_cache_misses,
+            "chunk_cache_hits": self.chunk_cache_hits,
+            "chunk_cache_misses": self.chunk_cache_misses,
+        }
+        self.blit_count = 0
+        self.tile_cache_hits = 0
+        self.tile_cache_misses = 0
+        self.chunk_cache_hits = 0
+        self.chunk_cache_misses = 0
+        return counters
+
+    def shutdown(self):
+        """Stops the background tile loader. Call before pygame.quit()."""
+        if self.prefetcher is not None:
+            self.prefetcher.shutdown()
+
+    def select_pyramid_level(self, zoom=None):
+        """
+        Returns the index of the pyramid level to draw at a zoom (default: the current zoom):
+        the coarsest level that still has at least as much detail as the screen shows, so
+        tiles are only ever scaled down, never up.
+        """
+        if zoom is None:
+            zoom = self.zoom_level
+        selected_index = 0
+        for level_index, level in enumerate(self.tile_levels):
+            if level["scale"] >= zoom - 1e-9:
+                selected_index = level_index
+        return selected_index
+
+    def _get_atlas_tile(self, atlas_entry):
+        """Returns a tile as a subsurface of its atlas image, loading the atlas on first use."""
+        atlas_number, x, y, width, height = atlas_entry
+        if atlas_number not in self.atlas_surfaces:
+            atlas_filename = self.tile_atlas_files[atlas_number]
+            atlas_path = os.path.join(self.tile_dir, atlas_filename)
+            try:
+                self.atlas_surfaces[atlas_number] = pygame.image.load(atlas_path).convert_alpha()
+            except pygame.error as e:
+                print(f"Error loading tile atlas: {atlas_filename} from {atlas_path} - {e}")
+                self.atlas_surfaces[atlas_number] = None
+        atlas_surface = self.atlas_surfaces[atlas_number]
+        if atlas_surface is None:
+            return None
+        return atlas_surface.subsurface(pygame.Rect(x, y, width, height))
+
+    def get_zoom_bucket(self, level_index=0):
+        """
+        Returns the quantized zoom level as the on-screen size, in whole pixels, of a tile
+        from the given pyramid level. Every zoom level that rounds to the same tile size
+        draws identical tiles, so they can all share one set of scaled surfaces.
+        """
+        level_scale = self.tile_levels[level_index]["scale"] if self.tile_levels else 1.0
+        return (int(self.tile_pixel_width * self.zoom_level / level_scale),
+                int(self.tile_pixel_height * self.zoom_level / level_scale))
+
+    def get_scaled_tile_image(self, tile_filename, zoom_bucket):
+        """Returns the tile smoothscaled to the zoom bucket's size, using the LRU cache."""
+        original_tile_surface = self.get_tile_image(tile_filename)
+        if original_tile_surface is None:
+            return None
+        if original_tile_surface is self._placeholder_tile:
+            tile_filename = None # All tiles that are still loading share one scaled placeholder
+        if zoom_bucket == original_tile_surface.get_size():
+            self.tile_cache_hits += 1
+            return original_tile_surface
+
+        cache_key = (tile_filename, zoom_bucket)
+        scaled_surface = self.scaled_tile_cache.get(cache_key)
+        if scaled_surface is not None:
+            self.scaled_tile_cache.move_to_end(cache_key) # Mark as most recently used
+            self.tile_cache_hits += 1
+            return scaled_surface
+
+        self.tile_cache_misses += 1
+        scaled_surface = pygame.transform.smoothscale(original_tile_surface, zoom_bucket)
+        self.scaled_tile_cache[cache_key] = scaled_surface
+        self.scaled_tile_cache_bytes += self._surface_size_in_bytes(scaled_surface)
+        self._evict_scaled_tiles()
+        return scaled_surface
+
+    def _evict_scaled_tiles(self):
+        # Always keep the entry we just added, even if it alone exceeds the budget
+        while self.scaled_tile_cache_bytes > self.scaled_tile_cache_budget and len(self.scaled_tile_cache) > 1:
+            _, evicted_surface = self.scaled_tile_cache.popitem(last=False)
+            self.scaled_tile_cache_bytes -= self._surface_size_in_bytes(evicted_surface)
+
+    def clear_scaled_tile_cache(self):
+        self.scaled_tile_cache.clear()
+        self.scaled_tile_cache_bytes = 0
+
+    def get_chunk_surface(self, level_index, chunk_col, chunk_row, zoom_bucket):
+        """Returns the composited surface for a chunk of a pyramid level at the zoom bucket's size, building it on first use."""
+        cache_key = (level_index, chunk_col, chunk_row, zoom_bucket)
+        chunk_surface = self.chunk_cache.get(cache_key)
+        if chunk_surface is not None:
+            built_at_generation = self._incomplete_chunks.get(cache_key)
+            if built_at_generation is None or built_at_generation == self.tile_load_generation:
+                if built_at_generation is not None:
+                    self._drew_placeholder = True
+                self.chunk_cache.move_to_end(cache_key) # Mark as most recently used
+                self.chunk_cache_hits += 1
+                return chunk_surface
+            # Tiles have arrived since this chunk was composited with placeholders; rebuild it
+            del self.chunk_cache[cache_key]
+            del self._incomplete_chunks[cache_key]
+            self.chunk_cache_bytes -= self._surface_size_in_bytes(chunk_surface)
+
+        level = self.tile_levels[level_index]
+        scaled_tile_width, scaled_tile_height = zoom_bucket
+        first_col = chunk_col * CHUNK_SIZE_IN_TILES
+        first_row = chunk_row * CHUNK_SIZE_IN_TILES
+        end_col = min(first_col + CHUNK_SIZE_IN_TILES, level["grid_width_in_tiles"])
+        end_row = min(first_row + CHUNK_SIZE_IN_TILES, level["grid_height_in_tiles"])
+
+        chunk_surface = pygame.Surface(
+            ((end_col - first_col) * scaled_tile_width, (end_row - first_row) * scaled_tile_height),
+            pygame.SRCALPHA
+        )
+        self.chunk_cache_misses += 1
+        chunk_complete = True
+        for row_idx in range(first_row, end_row):
+            tile_row = level["tile_filenames_grid"][row_idx]
+            for col_idx in range(first_col, end_col):
+                tile_filename = tile_row[col_idx]
+                if tile_filename is None:
+                    continue
+                tile_surface = self.get_scaled_tile_image(tile_filename, zoom_bucket)
+                if not self.is_tile_ready(tile_filename):
+                    chunk_complete = False
+                if tile_surface:
+                    # The chunk starts fully transparent and tiles never overlap, so additive
+                    # blending copies each tile's pixels (alpha included) unchanged.
+                    chunk_surface.blit(
+                        tile_surface,
+                        ((col_idx - first_col) * scaled_tile_width, (row_idx - first_row) * scaled_tile_height),
+                        special_flags=pygame.BLEND_RGBA_ADD
+                    )
+
+        self.chunk_cache[cache_key] = chunk_surface
+        self.chunk_cache_bytes += self._surface_size_in_bytes(chunk_surface)
+        if not chunk_complete:
+            self._incomplete_chunks[cache_key] = self.tile_load_generation
+        self._evict_chunks()
+        return chunk_surface
+
+    def _evict_chunks(self):
+        # Always keep the entry we just added, even if it alone exceeds the budget
+        while self.chunk_cache_bytes > self.chunk_cache_budget and len(self.chunk_cache) > 1:
+            evicted_key, evicted_surface = self.chunk_cache.popitem(last=False)
+            self._incomplete_chunks.pop(evicted_key, None)
+            self.chunk_cache_bytes -= self._surface_size_in_bytes(evicted_surface)
+
+    def clear_chunk_cache(self):
+        self.chunk_cache.clear()
+        self._incomplete_chunks.clear()
+        self.chunk_cache_bytes = 0
+
+    @staticmethod
+    def _surface_size_in_bytes(surface):
+        width, height = surface.get_size()
+        return width * height * surface.get_bytesize()
+
+    def get_visible_tile_range(self, view_rect=None, level_index=0, offset=None):
+        """
+        Returns (first_col, end_col, first_row, end_row) of the tiles of a pyramid level
+        overlapping view_rect (the whole screen by default), with the map drawn at offset
+        (the current offset_x/offset_y by default). End indices are exclusive and clamped
+        to the grid, so the range is empty when the map is entirely off-screen.
+        """
+        if view_rect is None:
+            view_rect = self.screen.get_rect()
+        offset_x, offset_y = offset if offset is not None else (self.offset_x, self.offset_y)
+        if not self.tile_levels:
+            return 0, 0, 0, 0
+        level = self.tile_levels[level_index]
+        scaled_tile_width, scaled_tile_height = self.get_zoom_bucket(level_index)
+        if scaled_tile_width <= 0 or scaled_tile_height <= 0:
+            return 0, 0, 0, 0
+
+        first_col = math.floor((view_rect.left - offset_x) / scaled_tile_width)
+        end_col = math.ceil((view_rect.right - offset_x) / scaled_tile_width)
+        first_row = math.floor((view_rect.top - offset_y) / scaled_tile_height)
+        end_row = math.ceil((view_rect.bottom - offset_y) / scaled_tile_height)
+
+        first_col = max(0, first_col)
+        first_row = max(0, first_row)
+        end_col = min(level["grid_width_in_tiles"], end_col)
+        end_row = min(level["grid_height_in_tiles"], end_row)
+        if end_col <= first_col or end_row <= first_row:
+            return 0, 0, 0, 0
+        return first_col, end_col, first_row, end_row
+
     def draw(self, debug_collision=False): # Added debug_collision parameter
         if not self._loaded_successfully or self.tile_pixel_width == 0 or self.tile_pixel_height == 0 :
             # print("Map not loaded or tile size is zero. Cannot draw.")
             return
+        self.update_prefetch()
+        self._draw_map(self.screen, self.screen.get_rect(), self.offset_x, self.offset_y, debug_collision)
+
+    def update_map_layer(self, debug_collision=False):
+        """
+        Brings self.map_layer (a screen-sized copy of the drawn map) up to date with the camera.
+        When only the offset changed, the previous contents are scrolled and just the newly
+        exposed strips are drawn; a zoom or debug-overlay change redraws the whole layer.
+        Returns True if the layer changed since the last call.
+        """
+        if not self._loaded_successfully or self.tile_pixel_width == 0 or self.tile_pixel_height == 0 :
+            return False
+        self.update_prefetch()
 
-        screen_rect = self.screen.get_rect()
-        current_scaled_tile_width = int(self.tile_pixel_width * self.zoom_level)
-        current_scaled_tile_height = int(self.tile_pixel_height * self.zoom_level)
+        screen_size = self.screen.get_size()
+        # The layer is drawn at whole-pixel offsets so scrolled and redrawn parts line up exactly
+        layer_offset = (math.floor(self.offset_x), math.floor(self.offset_y))
+        # A collision edit changes the debug overlay, so it invalidates the layer too
+        layer_state = (self.zoom_level, debug_collision, self.collision_grid_version)
 
-        if current_scaled_tile_width <= 0 or current_scaled_tile_height <= 0:
+        # Placeholders in the layer are replaced as soon as their tiles have loaded
+        placeholders_outdated = self._map_layer_has_placeholders and \
+                                self._map_layer_generation != self.tile_load_generation
+
+        if self.map_layer is None or self.map_layer.get_size() != screen_size or \
+           self._map_layer_state != layer_state or placeholders_outdated:
+            if self.map_layer is None or self.map_layer.get_size() != screen_size:
+                self.map_layer = pygame.Surface(screen_size).convert()
+            self._map_layer_has_placeholders = False
+            self._redraw_map_layer_area(self.map_layer.get_rect(), layer_offset, debug_collision)
+            self._map_layer_state = layer_state
+            self._map_layer_offset = layer_offset
+            return True
+
+        dx = layer_offset[0] - self._map_layer_offset[0]
+        dy = layer_offset[1] - self._map_layer_offset[1]
+        if dx == 0 and dy == 0:
+            return False
+        self._map_layer_offset = layer_offset
+
+        layer_width, layer_height = screen_size
+        if abs(dx) >= layer_width or abs(dy) >= layer_height:
+            self._map_layer_has_placeholders = False
+            self._redraw_map_layer_area(self.map_layer.get_rect(), layer_offset, debug_collision)
+            return True
+
+        self.map_layer.scroll(dx, dy)
+        if dx > 0:
+            self._redraw_map_layer_area(pygame.Rect(0, 0, dx, layer_height), layer_offset, debug_collision)
+        elif dx < 0:
+            self._redraw_map_layer_area(pygame.Rect(layer_width + dx, 0, -dx, layer_height), layer_offset, debug_collision)
+        if dy > 0:
+            self._redraw_map_layer_area(pygame.Rect(0, 0, layer_width, dy), layer_offset, debug_collision)
+        elif dy < 0:
+            self._redraw_map_layer_area(pygame.Rect(0, layer_height + dy, layer_width, -dy), layer_offset, debug_collision)
+        return True
+
+    def _redraw_map_layer_area(self, area_rect, layer_offset, debug_collision):
+        self._drew_placeholder = False
+        self.map_layer.set_clip(area_rect)
+        self.map_layer.fill(self.background_color, area_rect)
+        self._draw_map(self.map_layer, area_rect, layer_offset[0], layer_offset[1], debug_collision)
+        self.map_layer.set_clip(None)
+        if self._drew_placeholder:
+            self._map_layer_has_placeholders = True
+            self._map_layer_generation = self.tile_load_generation
+
+    def _draw_map(self, target, view_rect, offset_x, offset_y, debug_collision):
+        """Draws the part of the map that falls inside view_rect of the target surface."""
+        # Draw from the pyramid level closest to the current zoom, so zoomed-out views
+        # scale down a few small tiles instead of every full-resolution tile.
+        level_index = self.select_pyramid_level()
+        zoom_bucket = self.get_zoom_bucket(level_index)
+        if zoom_bucket[0] <= 0 or zoom_bucket[1] <= 0:
             return 
 
-        for row_idx, tile_row in enumerate(self.tile_filenames_grid):
-            for col_idx, tile_filename in enumerate(tile_row):
+        # Only walk the tiles that can overlap the view, so draw cost depends on the
+        # screen size rather than on how large the campus map is.
+        first_col, end_col, first_row, end_row = self.get_visible_tile_range(view_rect, level_index, (offset_x, offset_y))
+        if end_col > first_col and end_row > first_row:
+            chunk_pixel_side = CHUNK_SIZE_IN_TILES * max(zoom_bucket)
+            if chunk_pixel_side <= MAX_CHUNK_SURFACE_SIDE:
+                self._draw_chunks(target, offset_x, offset_y, level_index, first_col, end_col, first_row, end_row, zoom_bucket)
+            else:
+                self._draw_tiles(target, offset_x, offset_y, level_index, first_col, end_col, first_row, end_row, zoom_bucket)
+
+        if debug_collision and self.collision_grid:
+            self._draw_collision_overlay(target, view_rect, offset_x, offset_y, level_index, zoom_bucket)
+
+    def get_collision_overlay(self):
+        """
+        Returns the collision debug overlay: a surface with one pixel per tile, red where the
+        tile is a wall. It is only rebuilt when collision_grid_version changes.
+        """
+        if self._collision_overlay is not None and self._collision_overlay_version == self.collision_grid_version:
+            return self._collision_overlay
+
+        overlay = pygame.Surface((self.grid_width_in_tiles, self.grid_height_in_tiles), pygame.SRCALPHA)
+        overlay.fill((0, 0, 0, 0))
+        grid = self.collision_grid
+        if grid and grid.width == self.grid_width_in_tiles and grid.height == self.grid_height_in_tiles:
+            # Expand each cell byte to an RGBA pixel in one pass: walls get the overlay colour
+            rgba_channels = []
+            for channel_value in COLLISION_OVERLAY_COLOR:
+                rgba_channels.append(grid.cells.translate(bytes([0] + [channel_value] * 255)))
+            pixels = bytearray(len(grid.cells) * 4)
+            for channel_idx, channel in enumerate(rgba_channels):
+                pixels[channel_idx::4] = channel
+            overlay = pygame.image.frombytes(bytes(pixels), (grid.width, grid.height), "RGBA").convert_alpha()
+        elif grid:
+            for row_idx in range(min(self.grid_height_in_tiles, grid.height)):
+                for col_idx in range(min(self.grid_width_in_tiles, grid.width)):
+                    if not grid.is_walkable(col_idx, row_idx):
+                        overlay.set_at((col_idx, row_idx), COLLISION_OVERLAY_COLOR)
+
+        self._collision_overlay = overlay
+        self._collision_overlay_version = self.collision_grid_version
+        self._scaled_collision_overlay = None
+        self._scaled_collision_overlay_key = None
+        return overlay
+
+    def _draw_collision_overlay(self, target, view_rect, offset_x, offset_y, level_index=0, zoom_bucket=None):
+        """
+        Blits the visible part of the collision overlay over the map as drawn from the given
+        pyramid level and zoom bucket. Each tile of that level covers 1/scale full-resolution
+        cells, so the overlay is lined up with the level's tiles rather than level 0's.
+        """
+        if zoom_bucket is None:
+            zoom_bucket = self.get_zoom_bucket(level_index)
+        scaled_tile_width, scaled_tile_height = zoom_bucket
+        first_col, end_col, first_row, end_row = self.get_visible_tile_range(view_rect, level_index, (offset_x, offset_y))
+        if end_col <= first_col or end_row <= first_row:
+            return
+
+        # Collision cells (full-resolution tiles) under the visible tiles of this level
+        level_scale = self.tile_levels[level_index]["scale"]
+        cells_per_tile = round(1 / level_scale)
+        first_cell_col = first_col * cells_per_tile
+        first_cell_row = first_row * cells_per_tile
+        end_cell_col = min(self.grid_width_in_tiles, end_col * cells_per_tile)
+        end_cell_row = min(self.grid_height_in_tiles, end_row * cells_per_tile)
+        if end_cell_col <= first_cell_col or end_cell_row <= first_cell_row:
+            return
+
+        overlay = self.get_collision_overlay()
+        overlay_key = (first_cell_col, end_cell_col, first_cell_row, end_cell_row, level_index, scaled_tile_width, scaled_tile_height)
+        if self._scaled_collision_overlay_key != overlay_key:
+            # Nearest-neighbour scaling: at level 0 each overlay pixel becomes exactly one tile;
+            # on coarser levels a cell is the level's tile size / cells_per_tile (to within a pixel)
+            visible_part = overlay.subsurface(pygame.Rect(first_cell_col, first_cell_row,
+                                                          end_cell_col - first_cell_col, end_cell_row - first_cell_row))
+            self._scaled_collision_overlay = pygame.transform.scale(
+                visible_part,
+                (round((end_cell_col - first_cell_col) * scaled_tile_width / cells_per_tile),
+                 round((end_cell_row - first_cell_row) * scaled_tile_height / cells_per_tile))
+            )
+            self._scaled_collision_overlay_key = overlay_key
+        self.blit_count += 1
+        target.blit(self._scaled_collision_overlay,
+                    (offset_x + first_col * scaled_tile_width, offset_y + first_row * scaled_tile_height))
+
+    def _draw_chunks(self, target, offset_x, offset_y, level_index, first_col, end_col, first_row, end_row, zoom_bucket):
+        """Blits the pre-composited chunks covering the given tile range of a pyramid level."""
+        scaled_tile_width, scaled_tile_height = zoom_bucket
+        chunk_pixel_width = CHUNK_SIZE_IN_TILES * scaled_tile_width
+        chunk_pixel_height = CHUNK_SIZE_IN_TILES * scaled_tile_height
+        for chunk_row in range(first_row // CHUNK_SIZE_IN_TILES, (end_row - 1) // CHUNK_SIZE_IN_TILES + 1):
+            draw_y = offset_y + (chunk_row * chunk_pixel_height)
+            for chunk_col in range(first_col // CHUNK_SIZE_IN_TILES, (end_col - 1) // CHUNK_SIZE_IN_TILES + 1):
+                draw_x = offset_x + (chunk_col * chunk_pixel_width)
+                target.blit(self.get_chunk_surface(level_index, chunk_col, chunk_row, zoom_bucket), (draw_x, draw_y))
+                self.blit_count += 1
+
+    def _draw_tiles(self, target, offset_x, offset_y, level_index, first_col, end_col, first_row, end_row, zoom_bucket):
+        """Blits the given tile range of a pyramid level one tile at a time (used when chunks would be too large)."""
+        tile_filenames_grid = self.tile_levels[level_index]["tile_filenames_grid"]
+        scaled_tile_width, scaled_tile_height = zoom_bucket
+        for row_idx in range(first_row, end_row):
+            tile_row = tile_filenames_grid[row_idx]
+            draw_y = offset_y + (row_idx * scaled_tile_height)
+            for col_idx in range(first_col, end_col):
+                tile_filename = tile_row[col_idx]
                 # tile_filename could be None if convert_map_to_tiles had an issue for a specific tile
                 if tile_filename is None:
-                    continue 
-                
-                original_tile_surface = self.get_tile_image(tile_filename)
-                
-                draw_x = self.offset_x + (col_idx * current_scaled_tile_width)
-                draw_y = self.offset_y + (row_idx * current_scaled_tile_height)
-                tile_on_screen_rect = pygame.Rect(draw_x, draw_y, current_scaled_tile_width, current_scaled_tile_height)
-                
-                if not screen_rect.colliderect(tile_on_screen_rect):
                     continue
-
-                if original_tile_surface: 
-                    if self.zoom_level == 1.0:
-                        image_to_draw = original_tile_surface
-                    else:
-                        image_to_draw = pygame.transform.smoothscale(
-                            original_tile_surface,
-                            (current_scaled_tile_width, current_scaled_tile_height)
-                        )
-                    self.screen.blit(image_to_draw, (draw_x, draw_y))
-                
-                if debug_collision and self.collision_grid:
-                    # Check bounds for collision_grid access, as it might be smaller or improperly formed
-                    if 0 <= row_idx < len(self.collision_grid) and \
-                       0 <= col_idx < len(self.collision_grid[row_idx]):
-                        if not self.is_tile_walkable(col_idx, row_idx): # Use the method which includes bounds checks
-                            s = pygame.Surface((current_scaled_tile_width, current_scaled_tile_height), pygame.SRCALPHA)
-                            s.fill((255, 0, 0, 100)) # Semi-transparent red for walls
-                            self.screen.blit(s, (draw_x, draw_y))
-                    # else:
-                        # print(f"Debug draw: collision_grid access out of bounds for {row_idx}, {col_idx}")
-
+                draw_x = offset_x + (col_idx * scaled_tile_width)
+                # Scaled tiles come from the LRU cache; they are only rebuilt when the zoom bucket changes
+                image_to_draw = self.get_scaled_tile_image(tile_filename, zoom_bucket)
+                if image_to_draw:
+                    target.blit(image_to_draw, (draw_x, draw_y))
+                    self.blit_count += 1
 
     def zoom(self, zoom_increment_factor, screen_focus_px, screen_focus_py):
         """
@@ -193,7 +958,7 @@ class Map:
         world_focus_y = (screen_focus_py - self.offset_y) / self.zoom_level
 
         self.zoom_level *= zoom_increment_factor
-        self.zoom_level = max(0.1, min(self.zoom_level, 10.0)) # Clamp zoom
+        self.zoom_level = max(MIN_ZOOM_LEVEL, min(self.zoom_level, MAX_ZOOM_LEVEL)) # Clamp zoom
 
         self.offset_x = screen_focus_px - (world_focus_x * self.zoom_level)
         self.offset_y = screen_focus_py - (world_focus_y * self.zoom_level)
\ No newline at end of file
@@ -0,0 +1,117 @@
+# nearest_walkable.py
+import os
+import struct
+import sys
+from array import array
+from collections import deque
+
+# Cache file written next to map_meta.json: magic, format version, width, height,
+# SHA-1 of the collision grid it was built from, then one int32 per cell
+NEAREST_WALKABLE_FILENAME = "nearest_walkable.bin"
+FIELD_FILE_MAGIC = b"CNNW"
+FIELD_FILE_VERSION = 1
+FIELD_HEADER = struct.Struct("<4sHII40s")
+
+# 8-connected, so the distance is the Chebyshev ("ring") distance the old spawn search used
+_NEIGHBOUR_STEPS = [(-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1)]
+
+class NearestWalkableField:
+    """
+    For every tile of a collision grid, the flat index (y * width + x) of the nearest
+    walkable tile, or -1 when the grid has no walkable tiles at all. Built once with a
+    multi-source BFS outward from every walkable tile, after which lookups are O(1).
+    """
+    def __init__(self, width, height, grid_hash, nearest_indices):
+        self.width = width
+        self.height = height
+        self.grid_hash = grid_hash
+        self.nearest_indices = nearest_indices
+
+    @classmethod
+    def build(cls, collision_grid):
+        width, height, cells = collision_grid.width, collision_grid.height, collision_grid.cells
+        nearest_indices = array('i', [-1]) * (width * height)
+        frontier = deque()
+        for index, value in enumerate(cells):
+            if value == 0: # Walkable tiles are their own nearest walkable tile
+                nearest_indices[index] = index
+                frontier.append(index)
+
+        while frontier:
+            index = frontier.popleft()
+            source = nearest_indices[index]
+            x, y = index % width, index // width
+            for step_x, step_y in _NEIGHBOUR_STEPS:
+                nx, ny = x + step_x, y + step_y
+                if 0 <= nx < width and 0 <= ny < height:
+                    neighbour = ny * width + nx
+                    if nearest_indices[neighbour] == -1:
+                        nearest_indices[neighbour] = source
+                        frontier.append(neighbour)
+        return cls(width, height, collision_grid.content_hash(), nearest_indices)
+
+    @classmethod
+    def load_or_build(cls, collision_grid, directory):
+        """
+        Returns the field for collision_grid, read from the cache file in directory when it
+        was built from the same grid, otherwise built now and written back to the cache.
+        """
+        cache_path = os.path.join(directory, NEAREST_WALKABLE_FILENAME)
+        grid_hash = collision_grid.content_hash()
+        try:
+            field = cls.load(cache_path)
+            if field.grid_hash == grid_hash and field.width == collision_grid.width and field.height == collision_grid.height:
+                return field
+            print(f"'{cache_path}' was built for a different collision grid. Rebuilding it.")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read '{cache_path}': {e}. Rebuilding it.")
+
+        field = cls.build(collision_grid)
+        try:
+            field.save(cache_path)
+        except OSError as e:
+            print(f"Warning: Could not write nearest-walkable cache '{cache_path}': {e}")
+        return field
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(FIELD_HEADER.pack(FIELD_FILE_MAGIC, FIELD_FILE_VERSION, self.width, self.height,
+                                      self.grid_hash.encode("ascii")))
+            indices = array('i', self.nearest_indices)
+            if sys.byteorder == "big":
+                indices.byteswap() # The file is little endian
+            f.write(indices.tobytes())
+
+    @classmethod
+    def load(cls, path):
+        """Reads a file written by save. Raises ValueError if it isn't one."""
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < FIELD_HEADER.size:
+            raise ValueError("file is truncated")
+        magic, version, width, height, grid_hash = FIELD_HEADER.unpack_from(data)
+        if magic != FIELD_FILE_MAGIC or version != FIELD_FILE_VERSION:
+            raise ValueError(f"not a version {FIELD_FILE_VERSION} nearest-walkable file")
+        nearest_indices = array('i')
+        nearest_indices.frombytes(data[FIELD_HEADER.size:])
+        if sys.byteorder == "big":
+            nearest_indices.byteswap()
+        if len(nearest_indices) != width * height:
+            raise ValueError("cell count does not match the header")
+        return cls(width, height, grid_hash.decode("ascii"), nearest_indices)
+
+    def nearest(self, tile_x_idx, tile_y_idx):
+        """
+        Returns the (tile_x, tile_y) of the walkable tile nearest to the given tile, which
+        is clamped into the grid first. Returns None if nothing is walkable.
+        """
+        if self.width == 0 or self.height == 0:
+            return None
+        tile_x_idx = max(0, min(tile_x_idx, self.width - 1))
+        tile_y_idx = max(0, min(tile_y_idx, self.height - 1))
+        index = self.nearest_indices[tile_y_idx * self.width + tile_x_idx]
+        if index < 0:
+            return None
+        return index % self.width, index // self.width
@@ -0,0 +1,307 @@
+# pathfinding.py
+import heapq
+import math
+from array import array
+
+DIAGONAL_COST = math.sqrt(2)
+# (step_x, step_y, cost): orthogonal moves first, then diagonals
+_ORTHOGONAL_STEPS = [(1, 0, 1.0), (-1, 0, 1.0), (0, 1, 1.0), (0, -1, 1.0)]
+_DIAGONAL_STEPS = [(1, 1, DIAGONAL_COST), (-1, 1, DIAGONAL_COST), (1, -1, DIAGONAL_COST), (-1, -1, DIAGONAL_COST)]
+GRID_STEPS = _ORTHOGONAL_STEPS + _DIAGONAL_STEPS # All eight moves, for other searches over the grid
+
+# Direction codes used by distance fields: STEP_DIRECTIONS[code] is the (step_x, step_y)
+# to take from a tile. NO_STEP marks sources, walls and unreachable tiles.
+STEP_DIRECTIONS = [(step_x, step_y) for step_x, step_y, _ in GRID_STEPS]
+NO_STEP = 255
+
+def cuts_corner(cells, index, step_x, step_y, row_width):
+    """
+    True if the diagonal move (step_x, step_y) from cells[index] would cut a wall corner,
+    i.e. either orthogonal cell beside it is not walkable. cells is row-major, row_width wide.
+    """
+    return bool(cells[index + step_x] or cells[index + step_y * row_width])
+
+def octile_distance(dx, dy):
+    """Cost of the cheapest 8-directional route over open ground for an offset of (dx, dy)."""
+    dx, dy = abs(dx), abs(dy)
+    return (dx + dy) + (DIAGONAL_COST - 2) * min(dx, dy)
+
+class GridPathfinder:
+    """
+    A* over a CollisionGrid. The open set is a binary heap (heapq) and the per-cell costs,
+    parents and visited flags live in flat arrays allocated once per grid; each search
+    bumps a stamp instead of clearing them, so a search only touches the cells it visits.
+    Diagonal moves are allowed when both orthogonal neighbours are walkable (no cutting
+    wall corners) and the heuristic is the octile distance.
+
+    The search works on a copy of the grid with a one-cell wall border, so neighbours need
+    no bounds checks, plus connected-region labels so unreachable goals fail at once.
+    Call refresh() after the collision grid is edited.
+    """
+    def __init__(self, collision_grid, allow_diagonal=True):
+        self.grid = collision_grid
+        self.allow_diagonal = allow_diagonal
+        self.padded_width = collision_grid.width + 2
+        cell_count = self.padded_width * (collision_grid.height + 2)
+        self.g_costs = array('d', [0.0]) * cell_count
+        self.parents = array('i', [-1]) * cell_count
+        self.seen_stamps = array('I', [0]) * cell_count # Cell has a cost from the current search
+        self.closed_stamps = array('I', [0]) * cell_count # Cell was expanded in the current search
+        self.search_stamp = 0
+        self.nodes_expanded = 0 # Cells expanded by the last search
+
+        padded_width = self.padded_width
+        # (index offset, x step, y step, cost) in the padded layout: orthogonal moves first
+        self.steps = [(step_x + step_y * padded_width, step_x, step_y, cost)
+                      for step_x, step_y, cost in _ORTHOGONAL_STEPS + (_DIAGONAL_STEPS if allow_diagonal else [])]
+        self.padded_cells = bytearray()
+        self.region_labels = array('i')
+        self.refresh()
+
+    def refresh(self):
+        """Re-reads the collision grid: rebuilds the bordered copy and the region labels."""
+        grid = self.grid
+        width, height, padded_width = grid.width, grid.height, self.padded_width
+        padded_cells = bytearray(b"\x01") * (padded_width * (height + 2))
+        for y in range(height):
+            row_start = (y + 1) * padded_width + 1
+            padded_cells[row_start:row_start + width] = grid.cells[y * width:(y + 1) * width]
+        self.padded_cells = padded_cells
+
+        # Flood-fill region labels with the same moves the search uses (0 = wall)
+        region_labels = array('i', [0]) * len(padded_cells)
+        next_label = 0
+        for start in range(len(padded_cells)):
+            if padded_cells[start] != 0 or region_labels[start]:
+                continue
+            next_label += 1
+            region_labels[start] = next_label
+            stack = [start]
+            while stack:
+                index = stack.pop()
+                for offset, step_x, step_y, _ in self.steps:
+                    neighbour = index + offset
+                    if padded_cells[neighbour] != 0 or region_labels[neighbour]:
+                        continue
+                    if step_x and step_y and cuts_corner(padded_cells, index, step_x, step_y, padded_width):
+                        continue
+                    region_labels[neighbour] = next_label
+                    stack.append(neighbour)
+        self.region_labels = region_labels
+
+    def heuristic(self, tile_x_idx, tile_y_idx, goal_x_idx, goal_y_idx):
+        if self.allow_diagonal:
+            return octile_distance(tile_x_idx - goal_x_idx, tile_y_idx - goal_y_idx)
+        return abs(tile_x_idx - goal_x_idx) + abs(tile_y_idx - goal_y_idx)
+
+    def _next_stamp(self):
+        self.search_stamp += 1
+        if self.search_stamp >= 0xFFFFFFFF: # Wrapped: clear the stamps once and start over
+            self.seen_stamps = array('I', [0]) * len(self.seen_stamps)
+            self.closed_stamps = array('I', [0]) * len(self.closed_stamps)
+            self.search_stamp = 1
+        return self.search_stamp
+
+    def _padded_index(self, tile):
+        return (tile[1] + 1) * self.padded_width + tile[0] + 1
+
+    def is_reachable(self, start_tile, goal_tile):
+        """True if both tiles are walkable and connected (O(1), no search)."""
+        if not (self.grid.is_walkable(*start_tile) and self.grid.is_walkable(*goal_tile)):
+            return False
+        return self.region_labels[self._padded_index(start_tile)] == self.region_labels[self._padded_index(goal_tile)]
+
+    def find_path(self, start_tile, goal_tile):
+        """
+        Returns the list of (tile_x, tile_y) from start_tile to goal_tile inclusive, or None
+        if either end is unwalkable or the goal can't be reached.
+        """
+        self.nodes_expanded = 0
+        if not self.is_reachable(start_tile, goal_tile):
+            return None
+
+        stamp = self._next_stamp()
+        cells = self.padded_cells
+        padded_width = self.padded_width
+        g_costs, parents = self.g_costs, self.parents
+        seen_stamps, closed_stamps = self.seen_stamps, self.closed_stamps
+        steps = self.steps
+        allow_diagonal = self.allow_diagonal
+        octile_bonus = DIAGONAL_COST - 2
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        # Coordinates below are in the padded layout (tile + 1)
+        goal_x, goal_y = goal_tile[0] + 1, goal_tile[1] + 1
+        goal_index = self._padded_index(goal_tile)
+        start_index = self._padded_index(start_tile)
+        g_costs[start_index] = 0.0
+        parents[start_index] = -1
+        seen_stamps[start_index] = stamp
+        start_h = self.heuristic(start_tile[0], start_tile[1], goal_tile[0], goal_tile[1])
+        # Entries are (f, h, index): ties on f go to the cell closest to the goal
+        open_heap = [(start_h, start_h, start_index)]
+        expanded = 0
+
+        while open_heap:
+            _, _, index = heappop(open_heap)
+            if closed_stamps[index] == stamp:
+                continue # Stale entry for a cell that was already expanded more cheaply
+            if index == goal_index:
+                self.nodes_expanded = expanded
+                return self._reconstruct(index)
+            closed_stamps[index] = stamp
+            expanded += 1
+
+            y, x = divmod(index, padded_width)
+            current_g = g_costs[index]
+            for offset, step_x, step_y, step_cost in steps:
+                neighbour = index + offset
+                if cells[neighbour] or closed_stamps[neighbour] == stamp:
+                    continue
+                if step_x and step_y and (cells[index + step_x] or cells[index + step_y * padded_width]):
+                    continue # Would cut a wall corner (cuts_corner, inlined for speed)
+                new_g = current_g + step_cost
+                if seen_stamps[neighbour] != stamp or new_g < g_costs[neighbour]:
+                    seen_stamps[neighbour] = stamp
+                    g_costs[neighbour] = new_g
+                    parents[neighbour] = index
+                    dx = x + step_x - goal_x
+                    if dx < 0: dx = -dx
+                    dy = y + step_y - goal_y
+                    if dy < 0: dy = -dy
+                    if allow_diagonal:
+                        h = dx + dy + octile_bonus * (dx if dx < dy else dy)
+                    else:
+                        h = dx + dy
+                    heappush(open_heap, (new_g + h, h, neighbour))
+
+        self.nodes_expanded = expanded
+        return None
+
+    def distance_field(self, source_tiles):
+        """
+        Multi-source Dijkstra from source_tiles over the whole grid, with the same moves as
+        find_path. Returns (distances, first_steps), both indexed by y * width + x: the walking
+        distance in tiles to the nearest source (math.inf if unreachable), and the direction
+        code (see STEP_DIRECTIONS) of the first step on a shortest route toward it.
+        """
+        grid = self.grid
+        width, height = grid.width, grid.height
+        cells = self.padded_cells
+        padded_width = self.padded_width
+        distances = array('d', [math.inf]) * len(cells)
+        first_steps = bytearray([NO_STEP]) * len(cells)
+        # Stepping back along a move is the move's opposite direction
+        steps = [(offset, step_x, step_y, cost, STEP_DIRECTIONS.index((-step_x, -step_y)))
+                 for offset, step_x, step_y, cost in self.steps]
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        open_heap = []
+        for tile in source_tiles:
+            if grid.is_walkable(*tile):
+                index = self._padded_index(tile)
+                distances[index] = 0.0
+                open_heap.append((0.0, index))
+        heapq.heapify(open_heap)
+
+        while open_heap:
+            distance, index = heappop(open_heap)
+            if distance > distances[index]:
+                continue # Stale entry
+            for offset, step_x, step_y, step_cost, back_code in steps:
+                neighbour = index + offset
+                if cells[neighbour]:
+                    continue
+                if step_x and step_y and (cells[index + step_x] or cells[index + step_y * padded_width]):
+                    continue # Would cut a wall corner (cuts_corner, inlined for speed)
+                new_distance = distance + step_cost
+                if new_distance < distances[neighbour]:
+                    distances[neighbour] = new_distance
+                    first_steps[neighbour] = back_code
+                    heappush(open_heap, (new_distance, neighbour))
+
+        # Drop the border
+        grid_distances = array('d')
+        grid_first_steps = bytearray()
+        for y in range(height):
+            row_start = (y + 1) * padded_width + 1
+            grid_distances.extend(distances[row_start:row_start + width])
+            grid_first_steps.extend(first_steps[row_start:row_start + width])
+        return grid_distances, grid_first_steps
+
+    def _reconstruct(self, index):
+        path = []
+        parents = self.parents
+        while index != -1:
+            y, x = divmod(index, self.padded_width)
+            path.append((x - 1, y - 1))
+            index = parents[index]
+        path.reverse()
+        return path
+
+    def is_segment_clear(self, start_x, start_y, end_x, end_y):
+        """
+        True if every tile the segment (in tile units) passes through is walkable. Walks the
+        tiles with a grid traversal; where the segment passes exactly through a tile corner
+        both tiles beside the corner must be walkable.
+        """
+        grid = self.grid
+        tile_x, tile_y = math.floor(start_x), math.floor(start_y)
+        end_tile_x, end_tile_y = math.floor(end_x), math.floor(end_y)
+        dx, dy = end_x - start_x, end_y - start_y
+        step_x = 1 if dx > 0 else -1
+        step_y = 1 if dy > 0 else -1
+        # Segment parameter t (0..1) at which the next vertical / horizontal tile edge is crossed
+        t_max_x = ((tile_x + (1 if dx > 0 else 0)) - start_x) / dx if dx else math.inf
+        t_max_y = ((tile_y + (1 if dy > 0 else 0)) - start_y) / dy if dy else math.inf
+        t_delta_x = abs(1 / dx) if dx else math.inf
+        t_delta_y = abs(1 / dy) if dy else math.inf
+
+        for _ in range(abs(end_tile_x - tile_x) + abs(end_tile_y - tile_y) + 1):
+            if not grid.is_walkable(tile_x, tile_y):
+                return False
+            if tile_x == end_tile_x and tile_y == end_tile_y:
+                break
+            if t_max_x < t_max_y:
+                tile_x += step_x
+                t_max_x += t_delta_x
+            elif t_max_y < t_max_x:
+                tile_y += step_y
+                t_max_y += t_delta_y
+            else:
+                if not (grid.is_walkable(tile_x + step_x, tile_y) and grid.is_walkable(tile_x, tile_y + step_y)):
+                    return False
+                tile_x += step_x
+                tile_y += step_y
+                t_max_x += t_delta_x
+                t_max_y += t_delta_y
+        return True
+
+    def is_box_path_clear(self, start_point, end_point, half_width=0.0, half_height=0.0):
+        """
+        Conservative clearance test for a box (half sizes in tile units, smaller than a tile)
+        moving in a straight line: the segments traced by its four corners must all be clear.
+        """
+        for corner_x in (-half_width, half_width):
+            for corner_y in (-half_height, half_height):
+                if not self.is_segment_clear(start_point[0] + corner_x, start_point[1] + corner_y,
+                                             end_point[0] + corner_x, end_point[1] + corner_y):
+                    return False
+        return True
+
+    def smooth_path(self, points, half_width=0.0, half_height=0.0):
+        """
+        String-pulls a list of points (in tile units): from each kept point, walks forward
+        while the next point can still be reached in a straight line and keeps the last one
+        that could.
+        """
+        if len(points) <= 2:
+            return list(points)
+        smoothed = [points[0]]
+        anchor = 0
+        for candidate in range(2, len(points)):
+            if not self.is_box_path_clear(points[anchor], points[candidate], half_width, half_height):
+                anchor = candidate - 1
+                smoothed.append(points[anchor])
+        smoothed.append(points[-1])
+        return smoothed
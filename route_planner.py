@@ -0,0 +1,93 @@
+# route_planner.py
+import math
+import random
+import time
+
+# Planning is done once per session at startup; this bounds how long it may take
+DEFAULT_PLANNING_TIME_BUDGET = 0.05 # seconds
+
+def tour_length(order, start_distance, distance):
+    """Length of the open tour that starts at the spawn point and visits order in sequence."""
+    if not order:
+        return 0.0
+    total = start_distance(order[0])
+    for previous_stop, next_stop in zip(order, order[1:]):
+        total += distance(previous_stop, next_stop)
+    return total
+
+def nearest_neighbour_order(stops, start_distance, distance):
+    """Greedy tour: from the spawn point, always walk to the closest stop not yet visited."""
+    remaining = list(stops)
+    order = []
+    while remaining:
+        if order:
+            closest = min(remaining, key=lambda stop: distance(order[-1], stop))
+        else:
+            closest = min(remaining, key=start_distance)
+        order.append(closest)
+        remaining.remove(closest)
+    return order
+
+def two_opt(order, start_distance, distance, deadline):
+    """
+    Improves an open tour (fixed start at the spawn point, free end) by reversing segments
+    while that shortens it, until no reversal helps or time.perf_counter() passes deadline.
+    """
+    order = list(order)
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for i in range(len(order) - 1):
+            if time.perf_counter() >= deadline:
+                break
+            # Edge into order[i]: from the spawn point or from the previous stop
+            before_cost = start_distance(order[i]) if i == 0 else distance(order[i - 1], order[i])
+            for j in range(i + 1, len(order)):
+                # Reversing order[i..j] replaces the edges (prev, i) and (j, next) with (prev, j) and (i, next)
+                new_before_cost = start_distance(order[j]) if i == 0 else distance(order[i - 1], order[j])
+                if j + 1 < len(order):
+                    after_cost = distance(order[j], order[j + 1])
+                    new_after_cost = distance(order[i], order[j + 1])
+                else:
+                    after_cost = new_after_cost = 0.0 # Open tour: nothing follows the last stop
+                if new_before_cost + new_after_cost < before_cost + after_cost - 1e-9:
+                    order[i:j + 1] = reversed(order[i:j + 1])
+                    before_cost = new_before_cost
+                    improved = True
+    return order
+
+def plan_route(stops, start_distance, distance, time_budget=DEFAULT_PLANNING_TIME_BUDGET):
+    """Orders stops into a short walking tour from the spawn point (nearest neighbour + 2-opt)."""
+    deadline = time.perf_counter() + time_budget
+    return two_opt(nearest_neighbour_order(stops, start_distance, distance), start_distance, distance, deadline)
+
+def select_route_under_length(candidates, start_distance, distance, max_stops, max_length,
+                              time_budget=DEFAULT_PLANNING_TIME_BUDGET, rng=random):
+    """
+    Picks up to max_stops of the candidates, in random order, and inserts each one where it
+    lengthens the tour least, skipping any that would push the tour over max_length. The
+    result is then shortened with 2-opt. Returns the ordered stops.
+    """
+    deadline = time.perf_counter() + time_budget
+    shuffled = list(candidates)
+    rng.shuffle(shuffled)
+    order = []
+    length = 0.0
+    for stop in shuffled:
+        if len(order) >= max_stops or time.perf_counter() >= deadline:
+            break
+        best_position, best_increase = None, math.inf
+        for position in range(len(order) + 1):
+            if position == 0:
+                increase = start_distance(stop) + (distance(stop, order[0]) - start_distance(order[0]) if order else 0.0)
+            elif position == len(order):
+                increase = distance(order[-1], stop)
+            else:
+                increase = distance(order[position - 1], stop) + distance(stop, order[position]) - \
+                           distance(order[position - 1], order[position])
+            if increase < best_increase:
+                best_position, best_increase = position, increase
+        if best_position is not None and length + best_increase <= max_length:
+            order.insert(best_position, stop)
+            length += best_increase
+    return two_opt(order, start_distance, distance, deadline)
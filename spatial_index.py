@@ -0,0 +1,55 @@
+# spatial_index.py
+import math
+
+class SpatialHash:
+    """
+    Uniform grid over world coordinates for finding the points of interest near a position
+    or inside a rectangle. Each item is stored in every cell its bounding circle touches, so
+    a query only looks at the cells it overlaps and costs about the same however many items
+    there are in total. Queries return candidates; callers do their own exact test.
+    """
+    def __init__(self, cell_size=256):
+        self.cell_size = cell_size
+        self.cells = {} # (cell_x, cell_y) -> list of items
+        self.item_cells = {} # id(item) -> list of cell keys the item is stored in
+        self.item_order = {} # id(item) -> insertion number, so results come back in a stable order
+        self._next_order = 0
+
+    def _cell_range(self, left, top, right, bottom):
+        first_x, first_y = math.floor(left / self.cell_size), math.floor(top / self.cell_size)
+        last_x, last_y = math.floor(right / self.cell_size), math.floor(bottom / self.cell_size)
+        return [(cell_x, cell_y) for cell_y in range(first_y, last_y + 1) for cell_x in range(first_x, last_x + 1)]
+
+    def insert(self, item, world_x, world_y, radius=0):
+        """Adds item, a point at (world_x, world_y) with an optional radius of influence."""
+        if id(item) in self.item_cells:
+            self.remove(item)
+        keys = self._cell_range(world_x - radius, world_y - radius, world_x + radius, world_y + radius)
+        for key in keys:
+            self.cells.setdefault(key, []).append(item)
+        self.item_cells[id(item)] = keys
+        self.item_order[id(item)] = self._next_order
+        self._next_order += 1
+
+    def remove(self, item):
+        for key in self.item_cells.pop(id(item), []):
+            bucket = self.cells[key]
+            bucket.remove(item)
+            if not bucket:
+                del self.cells[key]
+        self.item_order.pop(id(item), None)
+
+    def __len__(self):
+        return len(self.item_cells)
+
+    def query_rect(self, left, top, right, bottom):
+        """Items whose cells overlap the world rectangle, in insertion order, each once."""
+        found = {}
+        for key in self._cell_range(left, top, right, bottom):
+            for item in self.cells.get(key, ()):
+                found[id(item)] = item
+        return sorted(found.values(), key=lambda item: self.item_order[id(item)])
+
+    def query_radius(self, world_x, world_y, radius):
+        """Items whose cells overlap the square around the circle (world_x, world_y, radius)."""
+        return self.query_rect(world_x - radius, world_y - radius, world_x + radius, world_y + radius)
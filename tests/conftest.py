@@ -0,0 +1,59 @@
+# tests/conftest.py
+import json
+import os
+import random
+import sys
+
+import pytest
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame
+
+from collision_grid import CollisionGrid
+
+@pytest.fixture
+def screen():
+    pygame.init()
+    surface = pygame.display.set_mode((800, 600))
+    yield surface
+    pygame.quit()
+
+@pytest.fixture
+def small_map_dir(tmp_path):
+    """A 6x4 map of 32px tiles (files not written) with a wall down column 2, except the bottom row."""
+    collision_rows = [[1 if x == 2 and y < 3 else 0 for x in range(6)] for y in range(4)]
+    metadata = {
+        "tile_pixel_width": 32,
+        "tile_pixel_height": 32,
+        "grid_width_in_tiles": 6,
+        "grid_height_in_tiles": 4,
+        "tile_filenames_grid": [[f"tile_{y}_{x}.png" for x in range(6)] for y in range(4)],
+        "collision_grid_data": collision_rows
+    }
+    with open(tmp_path / "map_meta.json", 'w') as f:
+        json.dump(metadata, f)
+    return tmp_path
+
+@pytest.fixture
+def rooms_grid():
+    """A 64x48 CollisionGrid of 12x12 rooms with a door or two in each wall and scattered pillars."""
+    rng = random.Random(7)
+    width, height = 64, 48
+    rows = [[0] * width for _ in range(height)]
+    for wall in range(12, width, 12):
+        for y in range(height):
+            rows[y][wall] = 1
+        for room_top in range(0, height, 12):
+            for _ in range(rng.randint(1, 2)):
+                rows[min(height - 1, room_top + rng.randrange(1, 11))][wall] = 0
+    for wall in range(12, height, 12):
+        for x in range(width):
+            rows[wall][x] = 1
+        for room_left in range(0, width, 12):
+            rows[wall][min(width - 1, room_left + rng.randrange(1, 11))] = 0
+    for _ in range(150):
+        rows[rng.randrange(height)][rng.randrange(width)] = 1
+    return CollisionGrid.from_rows(rows)
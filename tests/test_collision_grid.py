@@ -0,0 +1,48 @@
+# tests/test_collision_grid.py
+import random
+
+from collision_grid import CollisionGrid
+
+ROWS = [[0, 1, 0, 0, 1],
+        [1, 1, 0, 0, 0],
+        [0, 0, 0, 1, 0]]
+
+def _metadata_with_packed_file(tmp_path, rows):
+    CollisionGrid.from_rows(rows).save_packed(tmp_path / "collision_grid.bin")
+    return {"collision_grid_data": rows, "collision_grid_file": "collision_grid.bin"}
+
+def test_packed_round_trip():
+    rng = random.Random(5)
+    for width, height in ((1, 1), (7, 3), (64, 48)):
+        grid = CollisionGrid(width, height, bytearray(rng.choice((0, 1)) for _ in range(width * height)))
+        unpacked = CollisionGrid.from_packed_bytes(width, height, grid.to_packed_bytes())
+        assert unpacked.cells == grid.cells
+        assert unpacked.content_hash() == grid.content_hash()
+
+def test_from_metadata_uses_matching_packed_file(tmp_path, capsys):
+    metadata = _metadata_with_packed_file(tmp_path, ROWS)
+    grid = CollisionGrid.from_metadata(metadata, str(tmp_path))
+    assert grid.to_rows() == ROWS
+    assert "Warning" not in capsys.readouterr().out
+
+def test_from_metadata_prefers_edited_json_and_warns(tmp_path, capsys):
+    metadata = _metadata_with_packed_file(tmp_path, ROWS)
+    edited_rows = [list(row) for row in ROWS]
+    edited_rows[0][0] = 1 # Hand edit after tiled_importer.py wrote the packed file
+    metadata["collision_grid_data"] = edited_rows
+    assert CollisionGrid.from_metadata(metadata, str(tmp_path)).to_rows() == edited_rows
+    assert "does not match" in capsys.readouterr().out
+
+    metadata["collision_grid_data"] = [row[:4] for row in ROWS] # Different size
+    assert CollisionGrid.from_metadata(metadata, str(tmp_path)).width == 4
+    assert "does not match" in capsys.readouterr().out
+
+def test_from_metadata_falls_back_between_sources(tmp_path, capsys):
+    metadata = _metadata_with_packed_file(tmp_path, ROWS)
+    metadata["collision_grid_data"] = []
+    assert CollisionGrid.from_metadata(metadata, str(tmp_path)).to_rows() == ROWS # Packed file only
+
+    (tmp_path / "collision_grid.bin").write_bytes(b"not a grid")
+    metadata["collision_grid_data"] = ROWS
+    assert CollisionGrid.from_metadata(metadata, str(tmp_path)).to_rows() == ROWS # JSON only
+    assert "Could not load packed collision grid" in capsys.readouterr().out
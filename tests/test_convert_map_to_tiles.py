@@ -0,0 +1,91 @@
+# tests/test_convert_map_to_tiles.py
+import json
+import os
+
+import pytest
+from PIL import Image
+
+from convert_map_to_tiles import TILE_MANIFEST_FILENAME, slice_map_into_visual_tiles
+from map_binary import MIN_ZOOM_LEVEL
+
+TILE_SIZE = 32
+
+def _map_image(path, changed_pixels=()):
+    """A 200x150 synthetic map (6x4 whole tiles plus a ragged edge): gradients, a flat area that dedupes, some text-like noise."""
+    image = Image.new("RGB", (200, 150), (40, 120, 40))
+    pixels = image.load()
+    for y in range(150):
+        for x in range(100):
+            pixels[x, y] = (x * 2 % 256, y * 3 % 256, (x * y) % 256)
+    for x, y, color in changed_pixels:
+        pixels[x, y] = color
+    image.save(path)
+    return str(path)
+
+def _tile_files(directory):
+    """
+    Name -> contents of every generated file except the manifest (which records the run's
+    own history); map_meta.json is parsed, as an incremental run may order its keys differently.
+    """
+    files = {name: (directory / name).read_bytes() for name in sorted(os.listdir(directory)) if name != TILE_MANIFEST_FILENAME}
+    files["map_meta.json"] = json.loads(files["map_meta.json"])
+    return files
+
+@pytest.mark.parametrize("dedupe", [True, False])
+def test_parallel_slicing_matches_serial_byte_for_byte(tmp_path, dedupe):
+    image_path = _map_image(tmp_path / "map.png")
+    serial_dir, parallel_dir = tmp_path / "serial", tmp_path / "parallel"
+    serial = slice_map_into_visual_tiles(image_path, TILE_SIZE, TILE_SIZE, str(serial_dir), workers=1, dedupe=dedupe)
+    parallel = slice_map_into_visual_tiles(image_path, TILE_SIZE, TILE_SIZE, str(parallel_dir), workers=2, dedupe=dedupe)
+    assert serial == parallel
+    assert serial["pyramid_levels"]
+    assert _tile_files(serial_dir) == _tile_files(parallel_dir)
+    assert (serial_dir / "map_meta.json").read_bytes() == (parallel_dir / "map_meta.json").read_bytes()
+    assert (serial_dir / TILE_MANIFEST_FILENAME).read_bytes() == (parallel_dir / TILE_MANIFEST_FILENAME).read_bytes()
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_incremental_run_rewrites_only_changed_tiles(tmp_path, workers):
+    incremental_dir, full_dir = tmp_path / "incremental", tmp_path / "full"
+    slice_map_into_visual_tiles(_map_image(tmp_path / "old.png"), TILE_SIZE, TILE_SIZE, str(incremental_dir),
+                                workers=workers, dedupe=False)
+    # Backdate every file so rewritten ones stand out
+    for name in os.listdir(incremental_dir):
+        os.utime(incremental_dir / name, ns=(0, 0))
+
+    # Two pixels in tile (1, 0) and one in tile (4, 3), which is in the flat area
+    new_image = _map_image(tmp_path / "new.png", [(40, 5, (255, 0, 0)), (41, 5, (255, 0, 0)), (140, 100, (0, 0, 0))])
+    slice_map_into_visual_tiles(new_image, TILE_SIZE, TILE_SIZE, str(incremental_dir), workers=workers,
+                                incremental=True, dedupe=False)
+    slice_map_into_visual_tiles(new_image, TILE_SIZE, TILE_SIZE, str(full_dir), workers=workers, dedupe=False)
+
+    with open(incremental_dir / TILE_MANIFEST_FILENAME, 'r') as f:
+        manifest = json.load(f)
+    rewritten = sorted(name for name in os.listdir(incremental_dir)
+                       if name.startswith("tile_") and name.endswith(".png") and os.stat(incremental_dir / name).st_mtime_ns != 0)
+    assert "tile_0_1.png" in rewritten and "tile_3_4.png" in rewritten
+    assert len(rewritten) < len(manifest["tiles"]) // 2 # Pyramid tiles over the edits change too, nothing else
+    assert manifest["changed_tiles"] == rewritten
+    assert manifest["removed_tiles"] == []
+    assert _tile_files(incremental_dir) == _tile_files(full_dir)
+
+def test_incremental_run_removes_tiles_no_longer_produced(tmp_path):
+    output_dir = tmp_path / "tiles"
+    slice_map_into_visual_tiles(_map_image(tmp_path / "map.png"), TILE_SIZE, TILE_SIZE, str(output_dir), dedupe=False)
+    Image.open(tmp_path / "map.png").crop((0, 0, 200, 100)).save(tmp_path / "short.png") # One tile row fewer
+    slice_map_into_visual_tiles(str(tmp_path / "short.png"), TILE_SIZE, TILE_SIZE, str(output_dir), incremental=True, dedupe=False)
+    slice_map_into_visual_tiles(str(tmp_path / "short.png"), TILE_SIZE, TILE_SIZE, str(tmp_path / "full"), dedupe=False)
+
+    with open(output_dir / TILE_MANIFEST_FILENAME, 'r') as f:
+        manifest = json.load(f)
+    assert "tile_3_0.png" in manifest["removed_tiles"]
+    assert not (output_dir / "tile_3_0.png").exists()
+    assert _tile_files(output_dir) == _tile_files(tmp_path / "full")
+
+def test_pyramid_stops_at_the_minimum_zoom(tmp_path):
+    # 32 tiles wide: halving until one tile would take 5 levels, but Map never zooms out past 1/8
+    Image.new("RGB", (32 * TILE_SIZE, 2 * TILE_SIZE), (90, 90, 200)).save(tmp_path / "wide.png")
+    metadata = slice_map_into_visual_tiles(str(tmp_path / "wide.png"), TILE_SIZE, TILE_SIZE, str(tmp_path / "tiles"))
+    scales = [level["scale"] for level in metadata["pyramid_levels"]]
+    assert scales == [0.5, 0.25, 0.125]
+    assert scales[-1] >= MIN_ZOOM_LEVEL > scales[-1] / 2
+    assert not any(name.startswith("tile_L4_") for name in os.listdir(tmp_path / "tiles"))
@@ -0,0 +1,100 @@
+# tests/test_distance_table.py
+import math
+
+import pytest
+
+from collision_grid import CollisionGrid
+from distance_table import DISTANCE_TABLE_FILENAME, DistanceTable, destination_tiles_for
+from nearest_walkable import NearestWalkableField
+from test_pathfinding import reference_distances
+
+IDS = ["library", "gym", "cafe", "lab"]
+
+def _destination_tiles(grid):
+    walkable = [(x, y) for y in range(grid.height) for x in range(grid.width) if grid.is_walkable(x, y)]
+    return [walkable[0], walkable[len(walkable) // 3], walkable[2 * len(walkable) // 3], walkable[-1]]
+
+def test_distances_match_reference(rooms_grid):
+    tiles = _destination_tiles(rooms_grid)
+    table = DistanceTable.build(rooms_grid, IDS, tiles)
+    for from_id, from_tile in zip(IDS, tiles):
+        expected = reference_distances(rooms_grid, from_tile)
+        for to_id, to_tile in zip(IDS, tiles):
+            assert table.distance(from_id, to_id) == pytest.approx(expected.get(to_tile), rel=1e-6)
+            assert table.distance(from_id, to_id) == table.distance(to_id, from_id)
+    assert table.distance("library", "nowhere") is None
+
+def test_unreachable_pairs_have_no_distance():
+    grid = CollisionGrid.from_rows([[0, 0, 1, 0, 0]] * 3)
+    table = DistanceTable.build(grid, ["west", "east"], [(0, 0), (4, 2)])
+    assert table.distance("west", "west") == 0.0
+    assert table.distance("west", "east") is None
+    assert table.flow_field("east").route_from_tile((0, 0)) is None
+
+@pytest.mark.parametrize("include_first_steps", [True, False])
+def test_save_and_load_round_trip(tmp_path, rooms_grid, include_first_steps):
+    table = DistanceTable.build(rooms_grid, IDS, _destination_tiles(rooms_grid), include_first_steps)
+    table.save(tmp_path / DISTANCE_TABLE_FILENAME)
+    loaded = DistanceTable.load(tmp_path / DISTANCE_TABLE_FILENAME)
+    assert (loaded.grid_hash, loaded.width, loaded.height) == (table.grid_hash, table.width, table.height)
+    assert (loaded.destination_ids, loaded.destination_tiles) == (table.destination_ids, table.destination_tiles)
+    assert list(loaded.distances) == list(table.distances)
+    assert loaded.first_steps == table.first_steps
+
+def test_load_rejects_truncated_file(tmp_path, rooms_grid):
+    path = tmp_path / DISTANCE_TABLE_FILENAME
+    DistanceTable.build(rooms_grid, IDS, _destination_tiles(rooms_grid)).save(path)
+    path.write_bytes(path.read_bytes()[:-1])
+    with pytest.raises(ValueError):
+        DistanceTable.load(path)
+
+def test_load_or_build_reuses_matching_cache_and_rebuilds_stale_one(tmp_path, rooms_grid):
+    tiles = _destination_tiles(rooms_grid)
+    path = tmp_path / DISTANCE_TABLE_FILENAME
+    DistanceTable.load_or_build(rooms_grid, IDS, tiles, str(tmp_path))
+    cached_bytes = path.read_bytes()
+
+    # Mark the cache (flip one first-step byte): a cache hit leaves the file alone
+    marked_bytes = cached_bytes[:-1] + bytes([cached_bytes[-1] ^ 1])
+    path.write_bytes(marked_bytes)
+    DistanceTable.load_or_build(rooms_grid, IDS, tiles, str(tmp_path))
+    assert path.read_bytes() == marked_bytes
+
+    # Other destinations: rebuilt and written back
+    table = DistanceTable.load_or_build(rooms_grid, IDS[:2], tiles[:2], str(tmp_path))
+    assert DistanceTable.load(path).destination_ids == IDS[:2] == table.destination_ids
+
+    # Edited collision grid: rebuilt and written back
+    path.write_bytes(cached_bytes)
+    rooms_grid.set_walkable(*tiles[1], False)
+    table = DistanceTable.load_or_build(rooms_grid, IDS, tiles, str(tmp_path))
+    assert table.grid_hash == rooms_grid.content_hash() == DistanceTable.load(path).grid_hash
+
+def test_destination_tiles_are_moved_out_of_walls():
+    grid = CollisionGrid.from_rows([[0, 0, 1, 1],
+                                    [1, 1, 1, 1]])
+    field = NearestWalkableField.build(grid)
+    assert destination_tiles_for([(16, 16), (112, 16)], 32, 32, field) == [(0, 0), (1, 0)]
+    assert destination_tiles_for([(112, 16)], 32, 32) == [(3, 0)] # Without a field, tiles are kept as they are
+
+def test_ids_with_newlines_and_off_grid_tiles_round_trip(tmp_path):
+    grid = CollisionGrid.from_rows([[0, 0, 0]] * 2)
+    ids = ["Block A\nEntrance", "", "Café"]
+    tiles = [(0, 0), (-1, 5), (2, 1)] # A destination off the map keeps its (unreachable) tile
+    DistanceTable.build(grid, ids, tiles).save(tmp_path / DISTANCE_TABLE_FILENAME)
+    loaded = DistanceTable.load(tmp_path / DISTANCE_TABLE_FILENAME)
+    assert loaded.destination_ids == ids
+    assert loaded.destination_tiles == tiles
+    assert loaded.distance("Block A\nEntrance", "Café") == pytest.approx(1 + math.sqrt(2), rel=1e-6)
+    assert loaded.distance("", "Café") is None
+
+def test_unstorable_tile_is_reported_not_raised(tmp_path, capsys):
+    grid = CollisionGrid.from_rows([[0, 0, 0]])
+    table = DistanceTable.build(grid, ["far"], [(2 ** 40, 0)])
+    with pytest.raises(ValueError):
+        table.save(tmp_path / DISTANCE_TABLE_FILENAME)
+    assert not (tmp_path / DISTANCE_TABLE_FILENAME).exists()
+
+    table = DistanceTable.load_or_build(grid, ["far"], [(2 ** 40, 0)], str(tmp_path))
+    assert table.distance("far", "far") is None
+    assert "Could not write distance table" in capsys.readouterr().out
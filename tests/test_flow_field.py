@@ -0,0 +1,49 @@
+# tests/test_flow_field.py
+from collision_grid import CollisionGrid
+from distance_table import DistanceTable
+from map_class import Map
+from pathfinding import GridPathfinder
+
+# Wall down column 2 except the bottom row (as in the small_map_dir fixture)
+ROWS = [[0, 0, 1, 0, 0, 0],
+        [0, 0, 1, 0, 0, 0],
+        [0, 0, 1, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0]]
+
+def test_table_field_matches_dijkstra_field():
+    grid = CollisionGrid.from_rows(ROWS)
+    table = DistanceTable.build(grid, ["a", "b"], [(0, 0), (5, 0)])
+    for dest_id, tile in (("a", (0, 0)), ("b", (5, 0))):
+        field = table.flow_field(dest_id)
+        assert field.goal_tile == tile
+        assert bytes(field.first_steps) == bytes(GridPathfinder(grid).distance_field([tile])[1])
+    assert table.flow_field("missing") is None
+
+def test_route_from_tile_goes_round_the_wall():
+    grid = CollisionGrid.from_rows(ROWS)
+    field = DistanceTable.build(grid, ["b"], [(5, 0)]).flow_field("b")
+    route = field.route_from_tile((0, 0))
+    assert route[0] == (0, 0) and route[-1] == (5, 0)
+    assert (2, 3) in route # The only gap in the wall
+    assert all(grid.is_walkable(*tile) for tile in route)
+    assert field.route_from_tile((5, 0)) == [(5, 0)]
+
+def test_route_from_tile_is_none_when_cut_off():
+    grid = CollisionGrid.from_rows(ROWS)
+    grid.set_walkable(2, 3, False)
+    field = DistanceTable.build(grid, ["b"], [(5, 0)]).flow_field("b")
+    assert field.route_from_tile((0, 0)) is None
+
+def test_map_uses_table_field_for_destinations(screen, small_map_dir):
+    game_map = Map(screen, str(small_map_dir), prefetch_workers=0)
+    table = DistanceTable.build(game_map.collision_grid, ["b"], [(5, 0)])
+
+    field = game_map.get_flow_field(5 * 32 + 16, 16, table, "b")
+    assert field.first_steps.obj is table.first_steps # A view of the table, no search
+    assert game_map.flow_fields.misses == 0
+
+    # Once the grid is edited the table is stale, so the field is searched for instead
+    game_map.set_tile_walkable(1, 3, False)
+    field = game_map.get_flow_field(5 * 32 + 16, 16, table, "b")
+    assert game_map.flow_fields.misses == 1
+    assert field.route_from_tile((0, 0)) is None
@@ -0,0 +1,78 @@
+# tests/test_hierarchical_pathfinding.py
+import random
+
+from hierarchical_pathfinding import HierarchicalPathfinder
+from pathfinding import GridPathfinder
+from test_pathfinding import check_path
+
+COST_TOLERANCE = 1.25 # HPA* routes may be this much longer than the shortest
+ROOM_WALLS = (12, 24, 36, 48, 60) # Wall lines of the rooms_grid fixture
+
+def _walkable_tiles(grid):
+    return [(x, y) for y in range(grid.height) for x in range(grid.width) if grid.is_walkable(x, y)]
+
+def test_paths_are_legal_and_close_to_shortest(rooms_grid):
+    flat = GridPathfinder(rooms_grid)
+    hierarchical = HierarchicalPathfinder(rooms_grid, sector_size=16)
+    rng = random.Random(3)
+    walkable = _walkable_tiles(rooms_grid)
+    reachable_pairs = found = 0
+    for _ in range(200):
+        start, goal = rng.sample(walkable, 2)
+        shortest = flat.find_path(start, goal)
+        path = hierarchical.find_path(start, goal)
+        if shortest is None:
+            assert path is None
+            continue
+        reachable_pairs += 1
+        if path is None:
+            continue # Map falls back to the flat search for these
+        found += 1
+        shortest_cost = check_path(rooms_grid, shortest, start, goal)
+        cost = check_path(rooms_grid, path, start, goal)
+        assert shortest_cost - 1e-9 <= cost <= shortest_cost * COST_TOLERANCE
+    assert found >= 0.9 * reachable_pairs
+
+def test_update_tiles_after_edit(rooms_grid):
+    hierarchical = HierarchicalPathfinder(rooms_grid, sector_size=16)
+    # From the top-left room to the farthest tile in the bottom-right one
+    start = _walkable_tiles(rooms_grid)[0]
+    goal = next(tile for tile in reversed(_walkable_tiles(rooms_grid)) if GridPathfinder(rooms_grid).is_reachable(start, tile))
+    path = hierarchical.find_path(start, goal)
+    # Close a door (a gap in a wall) the route goes through, one that has a way round it;
+    # doors on a sector border first, as those are entrances of the abstract graph
+    doors = [tile for tile in path if tile[0] in ROOM_WALLS or tile[1] in ROOM_WALLS]
+    doors.sort(key=lambda tile: not (tile[0] % 16 == 0 or tile[1] % 16 == 0))
+    for door in doors:
+        rooms_grid.set_walkable(*door, False)
+        if HierarchicalPathfinder(rooms_grid, sector_size=16).find_path(start, goal):
+            break
+        rooms_grid.set_walkable(*door, True)
+    else:
+        raise AssertionError("no door on the route can be closed")
+    hierarchical.update_tiles([door])
+
+    path = hierarchical.find_path(start, goal)
+    fresh_path = HierarchicalPathfinder(rooms_grid, sector_size=16).find_path(start, goal)
+    assert door not in path
+    check_path(rooms_grid, path, start, goal)
+    assert path == fresh_path
+    rebuilt = HierarchicalPathfinder(rooms_grid, sector_size=16) # Same graph as building from scratch
+    assert (hierarchical.border_entrances, hierarchical.sector_edges) == (rebuilt.border_entrances, rebuilt.sector_edges)
+
+    rooms_grid.set_walkable(*door, True)
+    hierarchical.update_tiles([door])
+    rebuilt = HierarchicalPathfinder(rooms_grid, sector_size=16)
+    assert (hierarchical.border_entrances, hierarchical.sector_edges) == (rebuilt.border_entrances, rebuilt.sector_edges)
+
+def test_same_sector_and_unwalkable_ends(rooms_grid):
+    flat = GridPathfinder(rooms_grid)
+    hierarchical = HierarchicalPathfinder(rooms_grid, sector_size=16)
+    start = _walkable_tiles(rooms_grid)[0]
+    goal = next(tile for tile in reversed(_walkable_tiles(rooms_grid))
+                if tile[0] < 12 and tile[1] < 12 and flat.is_reachable(start, tile)) # Same room and sector
+    assert check_path(rooms_grid, hierarchical.find_path(start, goal), start, goal) == \
+           check_path(rooms_grid, flat.find_path(start, goal), start, goal)
+    wall = next((x, 12) for x in range(rooms_grid.width) if not rooms_grid.is_walkable(x, 12))
+    assert hierarchical.find_path(start, wall) is None
+    assert hierarchical.find_path(wall, start) is None
@@ -0,0 +1,58 @@
+# tests/test_map_binary.py
+import json
+
+from collision_grid import CollisionGrid
+from map_binary import MAP_BINARY_FILENAME, MapBinary, expand_tile_ids, save_map_binary
+
+def _tiled_metadata():
+    """Metadata as convert_map_to_tiles.py + tiled_importer.py write it (deduplicated, atlas, packed collision)."""
+    return {
+        "tile_pixel_width": 32,
+        "tile_pixel_height": 32,
+        "grid_width_in_tiles": 4,
+        "grid_height_in_tiles": 3,
+        "tile_id_grid": [[0, 1, 1, 0], [2, None, 1, 0], [0, 0, 3, 3]],
+        "pyramid_levels": [
+            {"level": 1, "scale": 0.5, "grid_width_in_tiles": 2, "grid_height_in_tiles": 2, "tile_id_grid": [[4, 5], [5, 4]]},
+            {"level": 2, "scale": 0.25, "grid_width_in_tiles": 1, "grid_height_in_tiles": 1, "tile_id_grid": [[6]]}
+        ],
+        "tile_files": ["tile_0_0.png", "tile_0_1.png", "tile_1_0.png", "tile_2_2.png",
+                       "tile_L1_0_0.png", "tile_L1_0_1.png", "tile_L2_0_0.png"],
+        "tile_atlases": ["tile_atlas_0.png"],
+        "tile_atlas_index": {"tile_0_0.png": [0, 0, 0, 32, 32], "tile_0_1.png": [0, 32, 0, 32, 32]},
+        "collision_grid_data": [[0, 1, 0, 0], [0, 1, 1, 0], [0, 0, 0, 0]],
+        "collision_grid_file": "collision_grid.bin"
+    }
+
+def test_json_binary_metadata_round_trip_keeps_every_key(tmp_path):
+    metadata = json.loads(json.dumps(_tiled_metadata())) # The form json.load gives back
+    binary_path = tmp_path / MAP_BINARY_FILENAME
+    save_map_binary(metadata, binary_path)
+
+    exported = json.loads(json.dumps(MapBinary(binary_path).to_metadata()))
+
+    assert set(exported) == set(metadata)
+    for key in metadata:
+        assert exported[key] == metadata[key], key
+
+def test_round_trip_of_undeduplicated_metadata_keeps_tiles_and_collision_file(tmp_path):
+    metadata = _tiled_metadata()
+    tile_files = metadata.pop("tile_files")
+    metadata["tile_filenames_grid"] = expand_tile_ids(metadata, tile_files)
+    del metadata["tile_id_grid"]
+    for level in metadata["pyramid_levels"]:
+        level["tile_filenames_grid"] = expand_tile_ids(level, tile_files)
+        del level["tile_id_grid"]
+    binary_path = tmp_path / MAP_BINARY_FILENAME
+    save_map_binary(metadata, binary_path, CollisionGrid.from_rows(metadata["collision_grid_data"]))
+
+    exported = MapBinary(binary_path).to_metadata()
+
+    assert expand_tile_ids(exported, exported["tile_files"]) == metadata["tile_filenames_grid"]
+    for exported_level, level in zip(exported["pyramid_levels"], metadata["pyramid_levels"]):
+        assert expand_tile_ids(exported_level, exported["tile_files"]) == level["tile_filenames_grid"]
+    assert exported["collision_grid_file"] == "collision_grid.bin"
+    assert exported["collision_grid_data"] == metadata["collision_grid_data"]
+    for key in ("tile_pixel_width", "tile_pixel_height", "grid_width_in_tiles", "grid_height_in_tiles",
+                "tile_atlases", "tile_atlas_index"):
+        assert exported[key] == metadata[key], key
@@ -0,0 +1,108 @@
+# tests/test_map_class.py
+import json
+
+import pygame
+import pytest
+
+from map_class import Map
+from nearest_walkable import NEAREST_WALKABLE_FILENAME
+
+def test_tile_edit_does_not_rewrite_nearest_walkable_cache(screen, small_map_dir):
+    cache_path = small_map_dir / NEAREST_WALKABLE_FILENAME
+    Map(screen, str(small_map_dir), prefetch_workers=0).get_nearest_walkable_field() # Writes the cache
+    cached_bytes = cache_path.read_bytes()
+
+    # Edit before the field is first needed, then ask for it
+    game_map = Map(screen, str(small_map_dir), prefetch_workers=0)
+    game_map.set_tile_walkable(0, 0, False)
+    field = game_map.get_nearest_walkable_field()
+
+    assert cache_path.read_bytes() == cached_bytes
+    assert field.nearest(0, 0) != (0, 0) # The edit is seen in memory
+
+def test_tile_edit_before_first_use_does_not_create_cache(screen, small_map_dir):
+    game_map = Map(screen, str(small_map_dir), prefetch_workers=0)
+    game_map.set_tile_walkable(0, 0, False)
+    game_map.get_nearest_walkable_field()
+    assert not (small_map_dir / NEAREST_WALKABLE_FILENAME).exists()
+
+MAP_COLOR = (0, 0, 255)
+BACKGROUND = (255, 255, 255)
+
+def _pyramid_map_dir(tmp_path):
+    """A 48x36 map of 32px tiles with pyramid levels 1-3, every cell a wall, all tiles one blue PNG."""
+    tile = pygame.Surface((32, 32))
+    tile.fill(MAP_COLOR)
+    pygame.image.save(tile, str(tmp_path / "tile_blue.png"))
+    def level(level_number, width, height):
+        return {"level": level_number, "scale": 1.0 / 2 ** level_number, "grid_width_in_tiles": width,
+                "grid_height_in_tiles": height, "tile_id_grid": [[0] * width for _ in range(height)]}
+    metadata = {
+        "tile_pixel_width": 32,
+        "tile_pixel_height": 32,
+        "grid_width_in_tiles": 48,
+        "grid_height_in_tiles": 36,
+        "tile_id_grid": [[0] * 48 for _ in range(36)],
+        "tile_files": ["tile_blue.png"],
+        "pyramid_levels": [level(1, 24, 18), level(2, 12, 9), level(3, 6, 5)],
+        "collision_grid_data": [[1] * 48 for _ in range(36)]
+    }
+    with open(tmp_path / "map_meta.json", 'w') as f:
+        json.dump(metadata, f)
+    return tmp_path
+
+def _drawn_extent(surface, row):
+    """One past the last column of the given screen row that isn't background."""
+    columns = [x for x in range(surface.get_width()) if surface.get_at((x, row))[:3] != BACKGROUND]
+    return columns[-1] + 1 if columns else 0
+
+@pytest.mark.parametrize("zoom", [0.4, 0.12])
+def test_collision_overlay_lines_up_with_pyramid_level(screen, tmp_path, zoom):
+    game_map = Map(screen, str(_pyramid_map_dir(tmp_path)), prefetch_workers=0)
+    game_map.zoom_level = zoom
+    game_map.offset_x = game_map.offset_y = 0
+    level_index = game_map.select_pyramid_level()
+    assert level_index >= 1
+
+    screen.fill(BACKGROUND)
+    game_map.draw(False)
+    map_width = _drawn_extent(screen, 5)
+    level = game_map.tile_levels[level_index]
+    assert map_width == level["grid_width_in_tiles"] * game_map.get_zoom_bucket(level_index)[0]
+
+    screen.fill(BACKGROUND)
+    game_map.draw(True)
+    assert _drawn_extent(screen, 5) == map_width # The overlay doesn't run past the map...
+    assert screen.get_at((map_width - 1, 5)).r > 50 # ...and tints the map right up to its far edge
+
+def test_select_pyramid_level_for_other_zoom(screen, tmp_path):
+    game_map = Map(screen, str(_pyramid_map_dir(tmp_path)), prefetch_workers=0)
+    game_map.zoom_level = 1.0
+    assert [game_map.select_pyramid_level(zoom) for zoom in (2.0, 1.0, 0.5, 0.3, 0.25, 0.1)] == [0, 0, 1, 1, 2, 3]
+    assert game_map.select_pyramid_level() == 0
+    assert game_map.zoom_level == 1.0
+
+def test_prefetch_looks_ahead_without_changing_zoom(screen, tmp_path, monkeypatch):
+    game_map = Map(screen, str(_pyramid_map_dir(tmp_path)), prefetch_workers=1)
+    requested_levels = []
+    monkeypatch.setattr(game_map, "_request_tiles_in_world_rect", lambda level_index, *rect: requested_levels.append(level_index))
+    game_map.offset_x = game_map.offset_y = 0
+    game_map.zoom_level = 1.0
+    game_map.update_prefetch()
+    game_map.zoom_level = 0.8 # Zooming out quickly: the camera is heading for a coarser level
+    game_map.update_prefetch()
+    game_map.shutdown()
+
+    assert game_map.zoom_level == 0.8
+    assert requested_levels[0] == 0 and set(requested_levels[1:]) == {0, 3}
+
+def test_dirty_rect_layer_redraws_after_collision_edit(screen, tmp_path):
+    game_map = Map(screen, str(_pyramid_map_dir(tmp_path)), prefetch_workers=0)
+    game_map.offset_x = game_map.offset_y = 0
+    assert game_map.update_map_layer(True)
+    assert not game_map.update_map_layer(True) # Nothing moved or changed
+    walled_color = game_map.map_layer.get_at((16, 16))
+
+    game_map.set_tile_walkable(0, 0, True)
+    assert game_map.update_map_layer(True)
+    assert game_map.map_layer.get_at((16, 16)) != walled_color # The overlay no longer marks the tile
@@ -0,0 +1,108 @@
+# tests/test_pathfinding.py
+import heapq
+import math
+import random
+
+import pytest
+
+from collision_grid import CollisionGrid
+from pathfinding import DIAGONAL_COST, GridPathfinder
+
+def reference_distances(grid, source):
+    """Plain Dijkstra over a dict, straight from the movement rules, to check the fast searches against."""
+    distances = {source: 0.0}
+    open_heap = [(0.0, source)]
+    while open_heap:
+        distance, (x, y) = heapq.heappop(open_heap)
+        if distance > distances[(x, y)]:
+            continue
+        for step_x in (-1, 0, 1):
+            for step_y in (-1, 0, 1):
+                nx, ny = x + step_x, y + step_y
+                if (step_x, step_y) == (0, 0) or not grid.is_walkable(nx, ny):
+                    continue
+                if step_x and step_y and not (grid.is_walkable(nx, y) and grid.is_walkable(x, ny)):
+                    continue
+                new_distance = distance + (DIAGONAL_COST if step_x and step_y else 1.0)
+                if new_distance < distances.get((nx, ny), math.inf):
+                    distances[(nx, ny)] = new_distance
+                    heapq.heappush(open_heap, (new_distance, (nx, ny)))
+    return distances
+
+def check_path(grid, path, start, goal):
+    """Asserts path is a legal walk from start to goal and returns its cost."""
+    assert path[0] == start and path[-1] == goal
+    cost = 0.0
+    for (x, y), (nx, ny) in zip(path, path[1:]):
+        step_x, step_y = nx - x, ny - y
+        assert max(abs(step_x), abs(step_y)) == 1
+        assert grid.is_walkable(nx, ny)
+        if step_x and step_y:
+            assert grid.is_walkable(nx, y) and grid.is_walkable(x, ny), "cut a wall corner"
+        cost += DIAGONAL_COST if step_x and step_y else 1.0
+    return cost
+
+def test_paths_are_shortest(rooms_grid):
+    pathfinder = GridPathfinder(rooms_grid)
+    rng = random.Random(1)
+    walkable = [(x, y) for y in range(rooms_grid.height) for x in range(rooms_grid.width) if rooms_grid.is_walkable(x, y)]
+    for _ in range(20):
+        start = rng.choice(walkable)
+        distances = reference_distances(rooms_grid, start)
+        for goal in rng.sample(walkable, 10):
+            path = pathfinder.find_path(start, goal)
+            if goal not in distances:
+                assert path is None
+            else:
+                assert check_path(rooms_grid, path, start, goal) == pytest.approx(distances[goal])
+
+def test_distance_field_matches_reference(rooms_grid):
+    pathfinder = GridPathfinder(rooms_grid)
+    source = (5, 5)
+    distances, _ = pathfinder.distance_field([source])
+    expected = reference_distances(rooms_grid, source)
+    for y in range(rooms_grid.height):
+        for x in range(rooms_grid.width):
+            assert distances[y * rooms_grid.width + x] == pytest.approx(expected.get((x, y), math.inf))
+
+def test_unreachable_region_fails_without_searching():
+    # The right two columns are walled off
+    grid = CollisionGrid.from_rows([[0, 0, 1, 0, 0]] * 4)
+    pathfinder = GridPathfinder(grid)
+    assert not pathfinder.is_reachable((0, 0), (4, 3))
+    assert pathfinder.find_path((0, 0), (4, 3)) is None
+    assert pathfinder.nodes_expanded == 0
+    assert pathfinder.find_path((0, 0), (2, 0)) is None # Goal inside a wall
+    assert pathfinder.find_path((3, 0), (4, 3)) is not None
+
+def test_no_corner_cutting():
+    # The only way from the top-left to the bottom-right is round the wall ends, not between them
+    grid = CollisionGrid.from_rows([[0, 1, 0],
+                                    [1, 0, 0],
+                                    [0, 0, 0]])
+    pathfinder = GridPathfinder(grid)
+    assert pathfinder.find_path((0, 0), (1, 1)) is None
+    assert (0, 0) not in reference_distances(grid, (1, 1))
+
+    grid = CollisionGrid.from_rows([[0, 0, 0],
+                                    [0, 1, 0],
+                                    [0, 0, 0]])
+    path = GridPathfinder(grid).find_path((0, 0), (2, 2))
+    assert check_path(grid, path, (0, 0), (2, 2)) == 4.0 # Round the pillar's sides; every diagonal would clip it
+
+def test_orthogonal_only():
+    grid = CollisionGrid.from_rows([[0] * 5] * 5)
+    path = GridPathfinder(grid, allow_diagonal=False).find_path((0, 0), (4, 4))
+    assert len(path) == 9
+    assert all(abs(x - nx) + abs(y - ny) == 1 for (x, y), (nx, ny) in zip(path, path[1:]))
+
+def test_refresh_after_edit():
+    grid = CollisionGrid.from_rows([[0] * 5] * 3)
+    pathfinder = GridPathfinder(grid)
+    for y in range(3):
+        grid.set_walkable(2, y, False)
+    pathfinder.refresh()
+    assert pathfinder.find_path((0, 1), (4, 1)) is None
+    grid.set_walkable(2, 2, True)
+    pathfinder.refresh()
+    assert (2, 2) in pathfinder.find_path((0, 1), (4, 1))
@@ -0,0 +1,58 @@
+# tests/test_player_collision.py
+import pygame
+import pytest
+
+from main import Player
+from map_class import Map
+
+# small_map_dir: 6x4 tiles of 32px, wall down column 2 (x 64..96) except the bottom row
+WALL_TILES = [(2, 0), (2, 1), (2, 2)]
+
+def _overlaps_wall(player):
+    left, top = player.world_x - player.width / 2, player.world_y - player.height / 2
+    return any(left < (x + 1) * 32 and left + player.width > x * 32 and top < (y + 1) * 32 and top + player.height > y * 32
+               for x, y in WALL_TILES)
+
+@pytest.fixture
+def game_map(screen, small_map_dir):
+    return Map(screen, str(small_map_dir), prefetch_workers=0)
+
+@pytest.mark.parametrize("speed, dt", [(150, 1.0), (150, 5.0), (20000, 1 / 60)])
+def test_large_move_stops_at_one_tile_wall(game_map, speed, dt):
+    player = Player(32, 16)
+    player.speed = speed
+    player.set_movement_direction(pygame.math.Vector2(1, 0))
+    player.update(dt, game_map)
+    assert 64 - 1 < player.world_x + player.width / 2 <= 64 # Right edge stopped at the wall
+    assert not _overlaps_wall(player)
+
+def test_large_move_left_stops_at_one_tile_wall(game_map):
+    player = Player(160, 48)
+    player.set_movement_direction(pygame.math.Vector2(-1, 0))
+    player.update(10.0, game_map)
+    assert 96 <= player.world_x - player.width / 2 < 96 + 1
+
+def test_sweep_box_checks_every_crossed_tile(game_map):
+    moved, blocked = game_map.sweep_box(10, 10, 20, 20, 500, "x")
+    assert blocked and moved == pytest.approx(64 - 30, abs=0.1)
+    moved, blocked = game_map.sweep_box(10, 100, 20, 20, 150, "x") # Bottom row: open to the map edge
+    assert not blocked and moved == 150
+    moved, blocked = game_map.sweep_box(10, 10, 20, 20, 0, "y")
+    assert (moved, blocked) == (0.0, False)
+
+def test_box_slides_along_wall_and_round_its_corner(game_map):
+    player = Player(40, 16)
+    player.set_movement_direction(pygame.math.Vector2(1, 1))
+    positions = []
+    for _ in range(120):
+        player.update(1 / 60, game_map)
+        assert not _overlaps_wall(player)
+        positions.append((player.world_x, player.world_y))
+        if player.world_x > 96 + player.width / 2:
+            break
+    # Pressed against the wall the box kept sliding down instead of sticking...
+    sliding = [(x, y) for x, y in positions if x + player.width / 2 == pytest.approx(64, abs=0.1)]
+    assert len(sliding) > 2 and sliding[-1][1] > sliding[0][1]
+    # ...then turned the corner into the bottom row and passed under the wall
+    assert player.world_x > 96 + player.width / 2
+    assert player.world_y - player.height / 2 >= 96
@@ -0,0 +1,75 @@
+# tests/test_route_planner.py
+import itertools
+import math
+import random
+
+import pytest
+
+from route_planner import nearest_neighbour_order, plan_route, select_route_under_length, tour_length, two_opt
+
+SPAWN = (0.0, 0.0)
+
+def _distances(points):
+    """(start_distance, distance) callables over named points, as main.py builds them from the distance table."""
+    def start_distance(stop):
+        return math.dist(SPAWN, points[stop])
+    def distance(stop_a, stop_b):
+        return math.dist(points[stop_a], points[stop_b])
+    return start_distance, distance
+
+def _random_points(count, seed):
+    rng = random.Random(seed)
+    return {f"stop{i}": (rng.uniform(-100, 100), rng.uniform(-100, 100)) for i in range(count)}
+
+def test_tour_length():
+    points = {"a": (3.0, 4.0), "b": (3.0, 10.0)}
+    start_distance, distance = _distances(points)
+    assert tour_length([], start_distance, distance) == 0.0
+    assert tour_length(["a", "b"], start_distance, distance) == pytest.approx(5.0 + 6.0)
+    assert tour_length(["b", "a"], start_distance, distance) == pytest.approx(math.hypot(3, 10) + 6.0)
+
+def test_points_on_a_line_are_visited_in_order():
+    points = {name: (x, 0.0) for name, x in (("c", 30.0), ("a", 10.0), ("d", 40.0), ("b", 20.0))}
+    start_distance, distance = _distances(points)
+    assert plan_route(list(points), start_distance, distance) == ["a", "b", "c", "d"]
+
+@pytest.mark.parametrize("seed", range(5))
+def test_two_opt_never_lengthens_and_is_near_optimal(seed):
+    points = _random_points(7, seed)
+    start_distance, distance = _distances(points)
+    greedy = nearest_neighbour_order(list(points), start_distance, distance)
+    improved = two_opt(greedy, start_distance, distance, deadline=math.inf)
+    assert sorted(improved) == sorted(points)
+    greedy_length = tour_length(greedy, start_distance, distance)
+    improved_length = tour_length(improved, start_distance, distance)
+    best_length = min(tour_length(order, start_distance, distance) for order in itertools.permutations(points))
+    assert best_length - 1e-9 <= improved_length <= greedy_length + 1e-9
+    assert improved_length <= best_length * 1.2
+
+def test_expired_deadline_returns_a_complete_tour():
+    points = _random_points(12, 9)
+    start_distance, distance = _distances(points)
+    order = plan_route(list(points), start_distance, distance, time_budget=0.0)
+    assert sorted(order) == sorted(points)
+
+@pytest.mark.parametrize("max_length", [0.0, 150.0, 400.0, math.inf])
+def test_select_route_under_length(max_length):
+    points = _random_points(15, 4)
+    start_distance, distance = _distances(points)
+    order = select_route_under_length(list(points), start_distance, distance, max_stops=5, max_length=max_length,
+                                      rng=random.Random(1))
+    assert len(order) == len(set(order)) <= 5
+    assert tour_length(order, start_distance, distance) <= max_length + 1e-9
+    if max_length == math.inf:
+        assert len(order) == 5
+
+def test_unreachable_stops_are_left_out():
+    points = {"near": (10.0, 0.0), "far": (20.0, 0.0)}
+    start_distance, _ = _distances(points)
+    def distance(stop_a, stop_b):
+        return math.inf if "far" in (stop_a, stop_b) and stop_a != stop_b else 0.0
+    def start_distance_with_gap(stop):
+        return math.inf if stop == "far" else start_distance(stop)
+    order = select_route_under_length(["near", "far"], start_distance_with_gap, distance, max_stops=2,
+                                      max_length=1000.0, rng=random.Random(0))
+    assert order == ["near"]
@@ -0,0 +1,30 @@
+# tests/test_tile_prefetcher.py
+import threading
+import time
+
+import pygame
+
+import tile_prefetcher
+from tile_prefetcher import TilePrefetcher
+
+def test_shutdown_waits_for_running_loads_and_drops_queued_ones(tmp_path, monkeypatch):
+    started = threading.Event()
+    loads = []
+    def slow_load(path):
+        started.set()
+        time.sleep(0.2)
+        loads.append(path)
+        return pygame.Surface((1, 1))
+    monkeypatch.setattr(tile_prefetcher.pygame.image, "load", slow_load)
+
+    prefetcher = TilePrefetcher(str(tmp_path), max_workers=1)
+    for i in range(5):
+        prefetcher.request(f"tile_0_{i}.png")
+    started.wait(1.0)
+    prefetcher.shutdown()
+
+    # The load in progress finished before shutdown returned; the queued ones never ran
+    assert len(loads) == 1
+    assert [name for name, _ in prefetcher.collect_finished()] == ["tile_0_0.png"]
+    time.sleep(0.3)
+    assert len(loads) == 1
@@ -0,0 +1,60 @@
+# tests/test_tiled_importer.py
+import json
+import os
+
+import pytest
+
+from tiled_importer import COLLISION_GRID_FILENAME, decode_layer_data, import_collision_from_tiled, read_tiled_map
+
+TILED_MAPS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tiled_maps")
+# Walls of the CollisionLayer in every fixture map (5x4; one GID carries a flip flag)
+EXPECTED_ROWS = [[0, 1, 1, 0, 0],
+                 [0, 1, 0, 0, 1],
+                 [0, 0, 0, 1, 1],
+                 [1, 0, 0, 0, 0]]
+FIXTURE_MAPS = ["csv_list.json", "base64.json", "base64_zlib.json", "base64_gzip.json",
+                "csv.tmx", "base64.tmx", "base64_zlib.tmx", "base64_gzip.tmx", "xml_tiles.tmx"]
+
+def _import(tmp_path, map_name):
+    """Imports a fixture map into a fresh map_meta.json; returns (metadata, packed grid bytes)."""
+    directory = tmp_path / map_name.replace(".", "_")
+    directory.mkdir(exist_ok=True)
+    meta_path = directory / "map_meta.json"
+    with open(meta_path, 'w') as f:
+        json.dump({"tile_pixel_width": 32, "tile_pixel_height": 32, "grid_width_in_tiles": 5, "grid_height_in_tiles": 4,
+                   "tile_filenames_grid": [[f"tile_{y}_{x}.png" for x in range(5)] for y in range(4)],
+                   "collision_grid_data": []}, f)
+    assert import_collision_from_tiled(os.path.join(TILED_MAPS_DIR, map_name), str(meta_path))
+    with open(meta_path, 'r') as f:
+        metadata = json.load(f)
+    with open(directory / COLLISION_GRID_FILENAME, 'rb') as f:
+        return metadata, f.read()
+
+def test_baseline_json_import(tmp_path):
+    metadata, _ = _import(tmp_path, "baseline.json")
+    assert metadata["collision_grid_data"] == EXPECTED_ROWS
+    assert metadata["collision_grid_file"] == COLLISION_GRID_FILENAME
+
+@pytest.mark.parametrize("map_name", FIXTURE_MAPS)
+def test_import_matches_baseline_json_import(tmp_path, map_name):
+    assert _import(tmp_path, map_name) == _import(tmp_path, "baseline.json")
+
+@pytest.mark.parametrize("map_name", ["baseline.json"] + FIXTURE_MAPS)
+def test_read_tiled_map(map_name):
+    map_info, layer = read_tiled_map(os.path.join(TILED_MAPS_DIR, map_name), "CollisionLayer")
+    assert map_info == {"width": 5, "height": 4, "tilewidth": 32, "tileheight": 32, "infinite": False}
+    cells = decode_layer_data(layer["data"], layer["encoding"], layer["compression"], 20)
+    assert [list(cells[y * 5:(y + 1) * 5]) for y in range(4)] == EXPECTED_ROWS
+
+def test_read_tiled_map_missing_layer():
+    _, layer = read_tiled_map(os.path.join(TILED_MAPS_DIR, "csv.tmx"), "NoSuchLayer")
+    assert layer is None
+
+def test_unsupported_compression_is_rejected(tmp_path):
+    tmx_path = tmp_path / "zstd.tmx"
+    with open(os.path.join(TILED_MAPS_DIR, "base64_zlib.tmx"), 'r') as f:
+        tmx_path.write_text(f.read().replace('compression="zlib"', 'compression="zstd"'))
+    meta_path = tmp_path / "map_meta.json"
+    meta_path.write_text(json.dumps({"tile_pixel_width": 32, "tile_pixel_height": 32,
+                                     "grid_width_in_tiles": 5, "grid_height_in_tiles": 4}))
+    assert not import_collision_from_tiled(str(tmx_path), str(meta_path))
@@ -0,0 +1,71 @@
+# text_cache.py
+import pygame
+from collections import OrderedDict
+
+class TextRenderCache:
+    """
+    Bounded LRU cache of rendered text. The HUD and info panel only change a few
+    times per session, so each distinct (font, text, width, colour) combination is
+    laid out and rendered once and then just blitted every frame.
+    """
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def _get(self, key):
+        surface = self.entries.get(key)
+        if surface is not None:
+            self.entries.move_to_end(key) # Mark as most recently used
+        return surface
+
+    def _put(self, key, surface):
+        self.entries[key] = surface
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return surface
+
+    def render(self, font, text, color, antialias=True):
+        """Cached equivalent of font.render(text, antialias, color)."""
+        key = ("text", font, text, color, antialias)
+        surface = self._get(key)
+        if surface is None:
+            surface = self._put(key, font.render(text, antialias, color))
+        return surface
+
+    def render_panel(self, font, text, max_width, text_color, background_color, border_color, padding=10):
+        """
+        Returns a ready-to-blit panel: text word-wrapped to max_width, each line centred,
+        on a background sized to the longest line, with a 1px border.
+        """
+        key = ("panel", font, text, max_width, text_color, background_color, border_color, padding)
+        surface = self._get(key)
+        if surface is not None:
+            return surface
+
+        words = text.split(' ')
+        lines = []
+        current_line_text = ""
+        for word in words:
+            test_line_text = current_line_text + word + " "
+            if font.size(test_line_text)[0] <= max_width:
+                current_line_text = test_line_text
+            else:
+                lines.append(current_line_text)
+                current_line_text = word + " "
+        lines.append(current_line_text)
+
+        line_height = font.get_linesize()
+        panel_height = len(lines) * line_height + (2 * padding)
+        # Get width of longest line for better fitting background
+        panel_width = max(font.size(line_text.strip())[0] for line_text in lines) + (2 * padding)
+
+        surface = pygame.Surface((panel_width, panel_height))
+        panel_rect = surface.get_rect()
+        surface.fill(background_color)
+        pygame.draw.rect(surface, border_color, panel_rect, 1)
+        for i, line_text in enumerate(lines):
+            line_surface = font.render(line_text.strip(), True, text_color)
+            # Center each line of text within the background box
+            line_rect = line_surface.get_rect(centerx=panel_rect.centerx, top=padding + i * line_height)
+            surface.blit(line_surface, line_rect)
+        return self._put(key, surface)
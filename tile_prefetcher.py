@@ -0,0 +1,51 @@
+# tile_prefetcher.py
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+class TilePrefetcher:
+    """
+    Decodes tile images on background worker threads so Map.draw never has to wait
+    for a PNG to load. Finished images are handed back through collect_finished();
+    convert_alpha() must still be called on the main thread (it needs the display).
+    """
+    def __init__(self, tile_directory, max_workers=2):
+        self.tile_dir = tile_directory
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tile_prefetch")
+        self.requested = set() # Tile filenames submitted and not yet collected
+        self._finished = [] # (tile_filename, pygame.Surface or None) waiting for the main thread
+        self._finished_lock = threading.Lock()
+
+    def request(self, tile_filename):
+        """Queues a tile for decoding unless it is already queued."""
+        if not tile_filename or tile_filename in self.requested:
+            return
+        self.requested.add(tile_filename)
+        self.executor.submit(self._decode_tile, tile_filename)
+
+    def _decode_tile(self, tile_filename):
+        tile_path = os.path.join(self.tile_dir, tile_filename)
+        try:
+            image = pygame.image.load(tile_path)
+        except (pygame.error, FileNotFoundError) as e:
+            print(f"Error loading tile image: {tile_filename} from {tile_path} - {e}")
+            image = None
+        with self._finished_lock:
+            self._finished.append((tile_filename, image))
+
+    def collect_finished(self):
+        """Returns the list of (tile_filename, surface) decoded since the last call."""
+        with self._finished_lock:
+            finished, self._finished = self._finished, []
+        for tile_filename, _ in finished:
+            self.requested.discard(tile_filename)
+        return finished
+
+    def shutdown(self):
+        """
+        Drops the queued tiles and waits for the ones being decoded, so no worker is still
+        inside pygame.image.load when the caller goes on to pygame.quit().
+        """
+        self.executor.shutdown(wait=True, cancel_futures=True)
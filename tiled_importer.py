@@ -1,19 +1,122 @@
 # tiled_importer.py
+import base64
 import json
 import os
+import sys
+import xml.etree.ElementTree as ET
+import zlib
+from array import array
 
-def import_collision_from_tiled(tiled_json_path, existing_meta_path, collision_layer_name="CollisionLayer"):
+from collision_grid import NORMALIZE_TABLE, CollisionGrid
+from map_binary import MAP_BINARY_FILENAME, save_map_binary
+
+COLLISION_GRID_FILENAME = "collision_grid.bin" # Bit-packed copy of collision_grid_data
+
+# 0/1 cell byte -> its ASCII digit, for writing collision rows
+_CELL_DIGIT_TABLE = b"01" + bytes(254)
+
+def walls_from_gid_bytes(gid_bytes, cell_count):
+    """
+    Thresholds a layer's GIDs, given as packed 32-bit integers (the form of Tiled's base64
+    layers), to one byte per cell: 0 for an empty tile (GID 0, walkable), 1 for any tile
+    (wall). Works a byte plane at a time instead of per cell.
+    """
+    if len(gid_bytes) != cell_count * 4:
+        raise ValueError(f"layer has {len(gid_bytes) // 4} tiles, expected {cell_count}")
+    walls = 0 # A GID is a wall if any of its four bytes is non-zero
+    for k in range(4):
+        # Each plane is 0/1 bytes, so OR-ing them as big integers ORs them cell by cell
+        walls |= int.from_bytes(gid_bytes[k::4].translate(NORMALIZE_TABLE), "little")
+    return bytearray(walls.to_bytes(cell_count, "little"))
+
+def decode_layer_data(data, encoding, compression, cell_count):
+    """
+    Returns the wall cells (see walls_from_gid_bytes) of a tile layer's data: a list of
+    GIDs (JSON), CSV text (TMX) or base64 text, optionally zlib or gzip compressed.
+    Raises ValueError for data it can't decode.
+    """
+    if encoding == "base64":
+        try:
+            raw = base64.b64decode(data.strip() if isinstance(data, str) else data)
+            if compression in ("zlib", "gzip"):
+                raw = zlib.decompress(raw, 47) # 32 + 15: accept a zlib or a gzip header
+            elif compression:
+                raise ValueError(f"'{compression}' compression is not supported; use zlib, gzip or none")
+        except (TypeError, ValueError, zlib.error) as e:
+            raise ValueError(f"could not decode base64 layer data: {e}") from e
+        return walls_from_gid_bytes(raw, cell_count)
+    if encoding == "csv":
+        if isinstance(data, str): # TMX; a JSON layer may say "csv" but still hold a list of GIDs
+            data = data.split(",")
+    elif encoding:
+        raise ValueError(f"'{encoding}' layer encoding is not supported")
+    gids = array('I', map(int, data))
+    return walls_from_gid_bytes(gids.tobytes(), cell_count)
+
+def read_tiled_map(tiled_map_path, layer_name):
+    """
+    Reads a Tiled map saved as TMX (.tmx) or exported as JSON (.json/.tmj). Returns
+    (map_info, layer), where map_info has the map's "width", "height", "tilewidth" and
+    "tileheight", and layer is the named tile layer as a dict with "data", "encoding" and
+    "compression", or None if there is no such layer.
+    """
+    if os.path.splitext(tiled_map_path)[1].lower() in (".tmx", ".xml"):
+        root = ET.parse(tiled_map_path).getroot()
+        map_info = {key: int(root.get(key, 0)) for key in ("width", "height", "tilewidth", "tileheight")}
+        map_info["infinite"] = root.get("infinite") == "1"
+        for layer in root.iter("layer"): # Also finds layers inside group layers
+            data = layer.find("data")
+            if layer.get("name") != layer_name or data is None:
+                continue
+            encoding = data.get("encoding")
+            if encoding is None: # Oldest TMX form: one <tile gid="..."/> element per cell
+                return map_info, {"data": [int(tile.get("gid", 0)) for tile in data.iter("tile")],
+                                  "encoding": None, "compression": None}
+            return map_info, {"data": data.text or "", "encoding": encoding, "compression": data.get("compression")}
+        return map_info, None
+
+    with open(tiled_map_path, 'r') as f:
+        tiled_data = json.load(f)
+    map_info = {key: tiled_data.get(key) for key in ("width", "height", "tilewidth", "tileheight")}
+    map_info["infinite"] = bool(tiled_data.get("infinite"))
+    layers = list(tiled_data.get("layers", []))
+    while layers:
+        layer = layers.pop(0)
+        if layer.get("type") == "group":
+            layers.extend(layer.get("layers", []))
+        elif layer.get("name") == layer_name and layer.get("type") == "tilelayer":
+            return map_info, {"data": layer.get("data", []), "encoding": layer.get("encoding"),
+                              "compression": layer.get("compression")}
+    return map_info, None
+
+def write_metadata_with_collision(meta_data, collision_grid, meta_path):
+    """
+    Writes map_meta.json with collision_grid_data taken from collision_grid, streaming the
+    grid out one row per line instead of building nested lists for json.dump.
     """
-    Reads collision data from a Tiled JSON export and updates an existing map_meta.json.
+    other_keys = {key: value for key, value in meta_data.items() if key != "collision_grid_data"}
+    header = json.dumps(other_keys, indent=4)
+    width = collision_grid.width
+    digits = collision_grid.cells.translate(_CELL_DIGIT_TABLE).decode("ascii")
+    with open(meta_path, 'w') as f:
+        f.write(header[:-2] + ",\n" if other_keys else "{\n") # Reopen the object after the last key
+        f.write('    "collision_grid_data": [')
+        for y in range(collision_grid.height):
+            f.write(("\n" if y == 0 else ",\n") + "        [" + ",".join(digits[y * width:(y + 1) * width]) + "]")
+        f.write("\n    ]\n}" if collision_grid.height else "]\n}")
+
+def import_collision_from_tiled(tiled_map_path, existing_meta_path, collision_layer_name="CollisionLayer"):
+    """
+    Reads collision data from a Tiled map (TMX, or a JSON export) and updates an existing
+    map_meta.json. Layers may be plain, CSV or base64 (uncompressed, zlib or gzip) encoded.
     """
     try:
-        with open(tiled_json_path, 'r') as f:
-            tiled_data = json.load(f)
+        map_info, collision_layer = read_tiled_map(tiled_map_path, collision_layer_name)
     except FileNotFoundError:
-        print(f"Error: Tiled JSON file not found at {tiled_json_path}")
+        print(f"Error: Tiled map file not found at {tiled_map_path}")
         return False
-    except json.JSONDecodeError as e:
-        print(f"Error decoding Tiled JSON file {tiled_json_path}: {e}")
+    except (json.JSONDecodeError, ET.ParseError, ValueError) as e:
+        print(f"Error reading Tiled map file {tiled_map_path}: {e}")
         return False
 
     try:
@@ -27,78 +130,83 @@ def import_collision_from_tiled(tiled_json_path, existing_meta_path, collision_l
         return False
 
     # --- Validate Tiled data and consistency with existing metadata ---
-    if tiled_data.get("tilewidth") != meta_data.get("tile_pixel_width") or \
-       tiled_data.get("tileheight") != meta_data.get("tile_pixel_height"):
-        print("Error: Tile dimensions in Tiled JSON and map_meta.json do not match!")
-        print(f"Tiled: {tiled_data.get('tilewidth')}x{tiled_data.get('tileheight')}, Meta: {meta_data.get('tile_pixel_width')}x{meta_data.get('tile_pixel_height')}")
+    if map_info["infinite"]:
+        print("Error: Infinite Tiled maps are not supported. Turn off 'Infinite' in the map properties.")
         return False
 
-    if tiled_data.get("width") != meta_data.get("grid_width_in_tiles") or \
-       tiled_data.get("height") != meta_data.get("grid_height_in_tiles"):
-        print("Error: Map grid dimensions in Tiled JSON and map_meta.json do not match!")
-        print(f"Tiled: {tiled_data.get('width')}x{tiled_data.get('height')}, Meta: {meta_data.get('grid_width_in_tiles')}x{meta_data.get('grid_height_in_tiles')}")
+    if map_info["tilewidth"] != meta_data.get("tile_pixel_width") or \
+       map_info["tileheight"] != meta_data.get("tile_pixel_height"):
+        print("Error: Tile dimensions in the Tiled map and map_meta.json do not match!")
+        print(f"Tiled: {map_info['tilewidth']}x{map_info['tileheight']}, Meta: {meta_data.get('tile_pixel_width')}x{meta_data.get('tile_pixel_height')}")
         return False
-    
-    map_width_in_tiles = tiled_data["width"]
-    map_height_in_tiles = tiled_data["height"]
-
-    # --- Find the collision layer and extract its data ---
-    collision_layer = None
-    for layer in tiled_data.get("layers", []):
-        if layer.get("name") == collision_layer_name and layer.get("type") == "tilelayer":
-            collision_layer = layer
-            break
-    
-    if not collision_layer:
-        print(f"Error: Collision layer named '{collision_layer_name}' not found in {tiled_json_path}")
+
+    if map_info["width"] != meta_data.get("grid_width_in_tiles") or \
+       map_info["height"] != meta_data.get("grid_height_in_tiles"):
+        print("Error: Map grid dimensions in the Tiled map and map_meta.json do not match!")
+        print(f"Tiled: {map_info['width']}x{map_info['height']}, Meta: {meta_data.get('grid_width_in_tiles')}x{meta_data.get('grid_height_in_tiles')}")
         return False
 
-    tiled_collision_data_1d = collision_layer.get("data", [])
-    if len(tiled_collision_data_1d) != map_width_in_tiles * map_height_in_tiles:
-        print(f"Error: Collision data length in Tiled JSON ({len(tiled_collision_data_1d)}) does not match expected map size ({map_width_in_tiles * map_height_in_tiles}).")
+    map_width_in_tiles = map_info["width"]
+    map_height_in_tiles = map_info["height"]
+
+    if not collision_layer:
+        print(f"Error: Collision layer named '{collision_layer_name}' not found in {tiled_map_path}")
         return False
 
-    # --- Convert Tiled 1D GID array to our 2D collision_grid_data format ---
+    # --- Convert the layer's GIDs to our collision grid ---
     # In Tiled, a GID of 0 on a tile layer means the tile is empty (walkable for our collision layer).
     # Any GID > 0 means a tile is present (non-walkable/wall for our collision layer).
-    new_collision_grid = []
-    for y in range(map_height_in_tiles):
-        row = []
-        for x in range(map_width_in_tiles):
-            gid_index = y * map_width_in_tiles + x
-            gid = tiled_collision_data_1d[gid_index]
-            if gid > 0: # Any tile on the collision layer is a wall
-                row.append(1) # Non-walkable
-            else: # GID is 0 (empty)
-                row.append(0) # Walkable
-        new_collision_grid.append(row)
-
-    # --- Update the metadata with the new collision grid ---
-    meta_data["collision_grid_data"] = new_collision_grid
-    
     try:
-        with open(existing_meta_path, 'w') as f:
-            json.dump(meta_data, f, indent=4)
+        cells = decode_layer_data(collision_layer["data"], collision_layer["encoding"], collision_layer["compression"],
+                                  map_width_in_tiles * map_height_in_tiles)
+    except (ValueError, OverflowError) as e:
+        print(f"Error: Could not read collision layer '{collision_layer_name}' in {tiled_map_path}: {e}")
+        return False
+    collision_grid = CollisionGrid(map_width_in_tiles, map_height_in_tiles, cells)
+
+    # Also write the bit-packed form next to the metadata; Map loads it in preference to the lists
+    collision_grid_path = os.path.join(os.path.dirname(existing_meta_path), COLLISION_GRID_FILENAME)
+    try:
+        collision_grid.save_packed(collision_grid_path)
+        meta_data["collision_grid_file"] = COLLISION_GRID_FILENAME
+    except IOError as e:
+        print(f"Warning: Could not write packed collision grid to {collision_grid_path}: {e}")
+        meta_data.pop("collision_grid_file", None)
+
+    try:
+        write_metadata_with_collision(meta_data, collision_grid, existing_meta_path)
         print(f"Successfully updated '{existing_meta_path}' with collision data from Tiled.")
+        binary_path = os.path.join(os.path.dirname(existing_meta_path), MAP_BINARY_FILENAME)
+        try:
+            save_map_binary(meta_data, binary_path, collision_grid)
+        except (IOError, KeyError, TypeError, ValueError) as e:
+            # Map falls back to the (newer) JSON, so this only costs load time
+            print(f"Warning: Could not update binary map file {binary_path}: {e}")
         print("Collision Grid (sample top-left 5x5 or less - 0 is walkable, 1 is wall):")
         for i in range(min(5, map_height_in_tiles)):
-            print(new_collision_grid[i][:min(5, map_width_in_tiles)])
+            print(list(cells[i * map_width_in_tiles:i * map_width_in_tiles + min(5, map_width_in_tiles)]))
         return True
     except IOError as e:
         print(f"Error writing updated metadata to {existing_meta_path}: {e}")
         return False
 
 if __name__ == "__main__":
-    tiled_exported_json_file = "tiled_campus_map.json" # Your Tiled export
+    # python tiled_importer.py [tiled_map_file]; defaults to the TMX saved by Tiled, or its JSON export
+    if len(sys.argv) > 1:
+        tiled_map_file = sys.argv[1]
+    elif os.path.exists("tiled_campus_map.tmx"):
+        tiled_map_file = "tiled_campus_map.tmx"
+    else:
+        tiled_map_file = "tiled_campus_map.json" # Your Tiled export
     metadata_file_to_update = os.path.join("tiles", "map_meta.json") # Generated by convert_map_to_tiles.py
 
-    if not os.path.exists(tiled_exported_json_file):
-        print(f"Tiled export '{tiled_exported_json_file}' not found. Please export it from Tiled first.")
+    if not os.path.exists(tiled_map_file):
+        print(f"Tiled map '{tiled_map_file}' not found. Please save or export it from Tiled first.")
     elif not os.path.exists(metadata_file_to_update):
         print(f"Base metadata file '{metadata_file_to_update}' not found. Please run 'convert_map_to_tiles.py' first.")
     else:
-        if import_collision_from_tiled(tiled_exported_json_file, metadata_file_to_update):
+        if import_collision_from_tiled(tiled_map_file, metadata_file_to_update):
             print("Process complete. Your map_meta.json should now have accurate collision data.")
             print("You can now run your main.py game.")
         else:
-            print("Failed to import collision data from Tiled.")
\ No newline at end of file
+            print("Failed to import collision data from Tiled.")